@@ -0,0 +1,82 @@
+# bench/bench_aplicar_status.py
+# ---------------------------------------------------------------
+# Micro-benchmark: aplicar_status_existentes antigo (loop nome × coluna com
+# máscara booleana) vs. o atual (pivot + alinhamento por id).
+# Rode com: python bench/bench_aplicar_status.py [--dias 31] [--tamanhos 100 1000 10000]
+# (usa o ambiente da aplicação: requirements.txt + DB_supabase; não abre conexão)
+# ---------------------------------------------------------------
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import cadastro_hc as app  # noqa: E402
+
+
+def aplicar_status_existentes_legado(base, presencas, mapa_id_por_nome):
+    """Implementação anterior, mantida aqui só para comparação."""
+    for nome, cid in mapa_id_por_nome.items():
+        for col in base.columns:
+            if col in ("Colaborador", "Setor", "Turno"):
+                continue
+            key = (cid, col)
+            if key in presencas:
+                base.loc[base["Colaborador"] == nome, col] = presencas[key]
+    return base
+
+
+def gerar_cenario(n: int, dias: int, preenchimento: float = 0.7, seed: int = 42):
+    rnd = random.Random(seed)
+    inicio = date(2025, 1, 16)
+    isos = [(inicio + timedelta(days=i)).isoformat() for i in range(dias)]
+    ids = list(range(1, n + 1))
+    nomes = [f"COLABORADOR {i:05d}" for i in ids]
+    status = [s for s in app.STATUS_OPCOES if s]
+    presencas = {
+        (cid, iso): rnd.choice(status)
+        for cid in ids for iso in isos if rnd.random() < preenchimento
+    }
+    base = pd.DataFrame({"Colaborador": nomes, "Setor": "Distribuição", "Turno": "1°"}, dtype="object")
+    base = base.assign(**{iso: "" for iso in isos})
+    return base, presencas, dict(zip(nomes, ids)), ids
+
+
+def medir(fn, repeticoes: int = 3) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[100, 1000, 10000])
+    ap.add_argument("--dias", type=int, default=31)
+    ap.add_argument("--max-legado", type=int, default=1000,
+                    help="acima deste nº de colaboradores o legado não roda (O(N²×D))")
+    args = ap.parse_args()
+
+    print(f"{'colaboradores':>13} {'dias':>5} {'legado (s)':>12} {'novo (s)':>10} {'ganho':>8}")
+    for n in args.tamanhos:
+        base, pres, mapa, ids = gerar_cenario(n, args.dias)
+        t_novo = medir(lambda: app.aplicar_status_existentes(base.copy(), pres, mapa, ids=ids))
+        if n <= args.max_legado:
+            t_leg = medir(lambda: aplicar_status_existentes_legado(base.copy(), pres, mapa), repeticoes=1)
+            esperado = aplicar_status_existentes_legado(base.copy(), pres, mapa)
+            obtido = app.aplicar_status_existentes(base.copy(), pres, mapa, ids=ids)
+            assert esperado.equals(obtido), "resultados divergentes"
+            print(f"{n:>13} {args.dias:>5} {t_leg:>12.3f} {t_novo:>10.4f} {t_leg / t_novo:>7.0f}x")
+        else:
+            print(f"{n:>13} {args.dias:>5} {'(pulado)':>12} {t_novo:>10.4f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/bench_exportacao.py
+# ---------------------------------------------------------------
+# Benchmark da exportação em blocos (CSV/Parquet) com N linhas sintéticas
+# de presença, registrando tempo e pico de memória (tracemalloc).
+# Opcionalmente compara com o caminho antigo (DataFrame inteiro + to_csv).
+# Rode com: python bench/bench_exportacao.py [--linhas 1000000] [--legado]
+# (usa o ambiente da aplicação: requirements.txt + DB_supabase; não abre conexão)
+# ---------------------------------------------------------------
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import cadastro_hc as app  # noqa: E402
+
+
+def blocos_sinteticos(linhas: int, tamanho: int, seed: int = 7):
+    """Simula o cursor nomeado: devolve blocos de tuplas no formato de COLUNAS_RELATORIO."""
+    rnd = random.Random(seed)
+    status = [s for s in app.STATUS_OPCOES if s]
+    inicio = date(2024, 1, 1)
+    emitidas = 0
+    while emitidas < linhas:
+        n = min(tamanho, linhas - emitidas)
+        bloco = []
+        for i in range(emitidas, emitidas + n):
+            bloco.append((
+                f"COLABORADOR {i // 730:05d}",
+                inicio + timedelta(days=i % 730),
+                rnd.choice(status),
+                rnd.choice(app.OPCOES_SETORES),
+                rnd.choice(app.OPCOES_TURNOS),
+                "Lider Sintetico",
+            ))
+        emitidas += n
+        yield bloco
+
+
+def medir(nome: str, fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    total = fn()
+    dt = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nome:<28} {total:>10} linhas {dt:>8.2f}s  pico {pico / 2**20:>8.1f} MiB")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--linhas", type=int, default=1_000_000)
+    ap.add_argument("--bloco", type=int, default=app.TAMANHO_BLOCO_EXPORTACAO)
+    ap.add_argument("--legado", action="store_true", help="mede também DataFrame inteiro + to_csv")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "presencas.csv")
+        pq_path = os.path.join(tmp, "presencas.parquet")
+
+        def csv_blocos():
+            with open(csv_path, "wb") as f:
+                return app.escrever_csv_em_blocos(blocos_sinteticos(args.linhas, args.bloco), f)
+
+        def parquet_blocos():
+            with open(pq_path, "wb") as f:
+                return app.escrever_parquet_em_blocos(blocos_sinteticos(args.linhas, args.bloco), f)
+
+        def csv_legado():
+            linhas = [r for b in blocos_sinteticos(args.linhas, args.bloco) for r in b]
+            df = pd.DataFrame(linhas, columns=app.COLUNAS_RELATORIO)
+            payload = df.to_csv(index=False).encode("utf-8-sig")
+            return len(df) if payload else 0
+
+        medir("CSV em blocos", csv_blocos)
+        medir("Parquet em blocos", parquet_blocos)
+        if args.legado:
+            medir("CSV legado (to_csv)", csv_legado)
+        print(f"tamanho: CSV {os.path.getsize(csv_path) / 2**20:.1f} MiB, "
+              f"Parquet {os.path.getsize(pq_path) / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench/bench_matriz.py
+# ---------------------------------------------------------------
+# Memória e tempo de conversão das representações de um período
+# (colaboradores × dias): dict {(id, iso): status} de carregar_presencas,
+# grade de strings dtype=object (como o editor recebia) e MatrizPresencas.
+# Sem banco: os status são sorteados em memória.
+# Rode com: python bench/bench_matriz.py [--colaboradores 1000] [--dias 365]
+# ---------------------------------------------------------------
+
+import argparse
+import logging
+import random
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import date, timedelta
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+
+def medir(fn):
+    """(resultado, MB alocados e ainda vivos, segundos). O tempo é medido fora do tracemalloc."""
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    res = fn()
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, atual / 1e6, dt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--colaboradores", type=int, default=1000)
+    ap.add_argument("--dias", type=int, default=365)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    warnings.filterwarnings("ignore")
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import cadastro_hc as app  # noqa: E402
+    import pandas as pd
+
+    rnd = random.Random(args.seed)
+    inicio = date(2025, 1, 1)
+    fim = inicio + timedelta(days=args.dias - 1)
+    ids = list(range(1, args.colaboradores + 1))
+    isos = [(inicio + timedelta(days=i)).isoformat() for i in range(args.dias)]
+    status = app.STATUS_OPCOES[1:]
+    # strings novas por célula, como chegam do driver do banco
+    fonte = [(cid, iso, "".join(rnd.choice(status))) for cid in ids for iso in isos]
+    df_cols = pd.DataFrame({"id": ids, "nome": [f"Colaborador {i}" for i in ids], "setor": "PAF", "turno": "1°"})
+
+    pres, mb_dict, t_dict = medir(lambda: {(cid, iso): s for cid, iso, s in fonte})
+
+    def grade_objeto():
+        base = pd.DataFrame(index=range(len(ids)), columns=isos, dtype="object")
+        return app.aplicar_status_existentes(base, pres, {}, ids)
+
+    _, mb_grade, t_grade = medir(grade_objeto)
+    m, mb_matriz, t_matriz = medir(lambda: app.MatrizPresencas.de_dict(ids, inicio, fim, pres))
+    grade, _, t_para = medir(lambda: m.para_grade(df_cols))
+    _, _, t_da = medir(lambda: app.MatrizPresencas.da_grade(grade, ids, inicio, fim))
+    assert m.para_dict() == pres
+
+    print(f"{args.colaboradores} colaboradores × {args.dias} dias ({len(pres)} células)")
+    print(f"{'representação':<36} {'memória (MB)':>13} {'montagem (s)':>13}")
+    print(f"{'dict (id, iso) -> status':<36} {mb_dict:>13.2f} {t_dict:>13.3f}")
+    print(f"{'grade dtype=object':<36} {mb_grade:>13.2f} {t_grade:>13.3f}")
+    print(f"{'MatrizPresencas (int8)':<36} {m.nbytes / 1e6:>13.3f} {t_matriz:>13.3f}")
+    print(f"  (alocação total na conversão: {mb_matriz:.2f} MB)")
+    print(f"\nmatriz -> grade do editor: {t_para:.3f}s   grade -> matriz: {t_da:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/bench_rerun.py
+# ---------------------------------------------------------------
+# Custo fixo de um rerun sem presenças gravadas: cada página roda N vezes no
+# AppTest do Streamlit sobre um SQLite temporário (ARMAZENAMENTO=sqlite),
+# sem rede. Só o cadastro inicial de colaboradores é carregado, para que as
+# grades do dia e do período (16..15) sejam de fato montadas. Antes, compara os metadados memoizados (calendário, column_config,
+# listas de acesso) com o cálculo feito do zero a cada chamada.
+# Rode com: python bench/bench_rerun.py [--reruns 20] [--chamadas 10000]
+# ---------------------------------------------------------------
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import date
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+ADMIN = "projetos.logistica@somagrupo.com.br"
+PAGINAS = ["Lançamento diário", "Período", "Colaboradores", "Relatórios", "DB", "Perf"]
+
+
+def is_admin_legado(app, email: str) -> bool:
+    """Implementação anterior (conjuntos remontados de st.secrets a cada chamada), só para comparação."""
+    try:
+        admins_extra = set([e.lower() for e in app.st.secrets.get("admins", [])])
+    except Exception:
+        admins_extra = set()
+    return email in (app.ADMIN_EMAILS | admins_extra)
+
+
+def por_chamada_us(fn, chamadas: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(chamadas):
+        fn()
+    return (time.perf_counter() - t0) / chamadas * 1e6
+
+
+def metadados(app, chamadas: int):
+    hoje = date.today()
+    ini, fim = app.periodo_por_data(hoje)
+    casos = [
+        ("periodo_por_data", lambda: app.periodo_por_data(hoje),
+         lambda: app.periodo_por_data.__wrapped__(hoje)),
+        ("datas_do_periodo", lambda: app.datas_do_periodo(ini, fim),
+         lambda: app.datas_do_periodo.__wrapped__(ini, fim)),
+        ("listar_periodos(12)", lambda: app.listar_periodos(12),
+         lambda: app._listar_periodos.__wrapped__(hoje, 12)),
+        ("coluna_config_datas (período)", lambda: app.coluna_config_datas(ini, fim),
+         lambda: app._coluna_config_datas.__wrapped__(ini, fim)),
+        ("is_admin", lambda: ADMIN in app._acesso_secrets().atual().admins,
+         lambda: is_admin_legado(app, ADMIN)),
+    ]
+    print(f"{'função':<32} {'do zero (µs)':>13} {'memoizada (µs)':>15} {'ganho':>7}")
+    for nome, memo, zero in casos:
+        t_memo = por_chamada_us(memo, chamadas)
+        t_zero = por_chamada_us(zero, chamadas)
+        print(f"{nome:<32} {t_zero:>13.2f} {t_memo:>15.2f} {t_zero / t_memo:>6.1f}x")
+
+
+def reruns(n: int):
+    from streamlit.testing.v1 import AppTest
+
+    print(f"\n{'página':<20} {'1º rerun (ms)':>14} {'mediana (ms)':>13} {'p95 (ms)':>10}")
+    for pagina in PAGINAS:
+        at = AppTest.from_file(str(RAIZ / "cadastro_hc.py"), default_timeout=120)
+        at.session_state["auth"] = True
+        at.session_state["user_email"] = ADMIN
+        at.run()
+        t0 = time.perf_counter()
+        at.sidebar.radio[0].set_value(pagina).run()
+        primeiro = (time.perf_counter() - t0) * 1000
+        tempos = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            at.run()
+            tempos.append((time.perf_counter() - t0) * 1000)
+        if at.exception:
+            raise RuntimeError(f"{pagina}: {at.exception[0].value}")
+        tempos.sort()
+        p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+        print(f"{pagina:<20} {primeiro:>14.1f} {statistics.median(tempos):>13.1f} {p95:>10.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reruns", type=int, default=20)
+    ap.add_argument("--chamadas", type=int, default=10_000)
+    args = ap.parse_args()
+
+    warnings.filterwarnings("ignore")
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        # antes do import: o armazenamento é escolhido na carga do módulo (também pelo AppTest)
+        os.environ["ARMAZENAMENTO"] = "sqlite"
+        os.environ["ARMAZENAMENTO_SQLITE"] = os.path.join(tmp, "bench.sqlite3")
+        os.environ.pop("FILA_OFFLINE", None)
+        import cadastro_hc as app  # noqa: E402
+
+        app.init_db()
+        app.seed_colaboradores_iniciais()
+        metadados(app, args.chamadas)
+        reruns(args.reruns)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,45 @@
 #   pip install -r requirements.txt
 #   (inclua: psycopg2-binary, SQLAlchemy, pandas, streamlit, openpyxl etc.)
 # Rode com: streamlit run cadastro_hc.py
+# Offline/local: ARMAZENAMENTO=sqlite [ARMAZENAMENTO_SQLITE=arquivo.sqlite3]
+#   streamlit run cadastro_hc.py   (dispensa DB_supabase e rede)
+# Banco instável: FILA_OFFLINE=fila_presencas.sqlite3 (o "Salvar dia" grava num
+#   diário no disco do servidor do app e uma thread sincroniza com o Postgres em
+#   segundo plano). Só protege o tablet sem Wi-Fi com um servidor do app por tablet.
 # ---------------------------------------------------------------
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import csv
+import io
+import functools
+import glob
+import json
+import logging
 import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 from typing import List, Tuple, Dict
 
-# Conexão com Supabase/Postgres
-from DB_supabase import get_conn, test_connection, get_config
+# Conexão com Supabase/Postgres (opcional com ARMAZENAMENTO=sqlite)
+try:
+    from DB_supabase import get_conn, test_connection, get_config
+except ImportError:
+    get_conn = test_connection = get_config = None
+try:
+    import psycopg2  # só para classificar erros (a conexão vem do DB_supabase)
+except ImportError:
+    psycopg2 = None
 
 # ------------------------------
 # Config Básica
@@ -26,6 +54,9 @@ STATUS_OPCOES = ["", "PRESENTE", "BH", "ATRASADO", "FALTA", "FÉRIAS",
                  "SIN ECOM", "SIN DIST", "SIN AVI", "SIN REC", "SIN EXP",
                  "SIN ALM", "SIN TEC", "DSR", "CURSO", "DESLIGADO", "-"]
 
+# status gravados como intervalo (presencas_periodos) em vez de uma linha por dia
+STATUS_PERIODO = ("FÉRIAS", "AFASTADO", "ATESTADO")
+
 OPCOES_SETORES = [
     "Aviamento",
     "Tecido",
@@ -73,25 +104,63 @@ ADMIN_EMAILS = {
     "projetos.logistica@somagrupo.com.br",
 }
 
+class AcessoSecrets:
+    """
+    Snapshot por processo das listas de acesso (padrão + st.secrets), em vez
+    de remontar os conjuntos a cada chamada de is_admin(). É refeito quando o
+    st.secrets avisa (file_change_listener) que releu os arquivos — o mesmo
+    sinal que as conexões do Streamlit usam; conferir a data dos arquivos por
+    conta própria podia reler o st.secrets antes dele e guardar a lista velha.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sujo = True  # força a primeira leitura
+        self.permitidos: frozenset = frozenset()
+        self.admins: frozenset = frozenset()
+        st.secrets.file_change_listener.connect(self._secrets_recarregados)
+
+    def _secrets_recarregados(self, *_):
+        self._sujo = True
+
+    def atual(self) -> "AcessoSecrets":
+        if self._sujo:
+            with self._lock:
+                if self._sujo:
+                    # antes de ler: um aviso que chegue durante a leitura vale para a próxima
+                    self._sujo = False
+                    self._ler()
+        return self
+
+    def _ler(self):
+        emails = {e.lower() for e in ALLOWED_EMAILS_DEFAULT}
+        try:
+            secret_users = st.secrets.get("users", {})
+            if isinstance(secret_users, dict):
+                emails |= {k.lower() for k in secret_users.keys()}
+            elif isinstance(secret_users, (list, set, tuple)):
+                emails |= {str(e).lower() for e in secret_users}
+        except Exception:
+            pass
+        try:
+            admins_extra = {e.lower() for e in st.secrets.get("admins", [])}
+        except Exception:
+            admins_extra = set()
+        self.permitidos = frozenset(emails)
+        self.admins = frozenset(ADMIN_EMAILS | admins_extra)
+
+
+@st.cache_resource(show_spinner=False)
+def _acesso_secrets() -> AcessoSecrets:
+    return AcessoSecrets()
+
+
 def _allowed_emails():
-    emails = {e.lower() for e in ALLOWED_EMAILS_DEFAULT}
-    try:
-        secret_users = st.secrets.get("users", {})
-        if isinstance(secret_users, dict):
-            emails |= {k.lower() for k in secret_users.keys()}
-        elif isinstance(secret_users, (list, set, tuple)):
-            emails |= {str(e).lower() for e in secret_users}
-    except Exception:
-        pass
-    return emails
+    return _acesso_secrets().atual().permitidos
 
 def is_admin() -> bool:
     email = (st.session_state.get("user_email") or "").lower()
-    try:
-        admins_extra = set([e.lower() for e in st.secrets.get("admins", [])])
-    except Exception:
-        admins_extra = set()
-    return email in (ADMIN_EMAILS | admins_extra)
+    return email in _acesso_secrets().atual().admins
 
 def display_name_from_email(email: str) -> str:
     local = (email or "").split("@")[0]
@@ -101,350 +170,2757 @@ def display_name_from_email(email: str) -> str:
     parts = [p for p in parts if p]
     return " ".join(w.capitalize() for w in parts)
 
-def show_login():
-    st.markdown("<h2 style='text-align:center;'>Login</h2>", unsafe_allow_html=True)
-    with st.form("login_somente_email"):
-        email = st.text_input("E-mail").strip().lower()
-        ok = st.form_submit_button("Entrar")
+def show_login():
+    st.markdown("<h2 style='text-align:center;'>Login</h2>", unsafe_allow_html=True)
+    with st.form("login_somente_email"):
+        email = st.text_input("E-mail").strip().lower()
+        ok = st.form_submit_button("Entrar")
+
+    if ok:
+        allowed = _allowed_emails()
+        if email in allowed:
+            st.session_state["auth"] = True
+            st.session_state["user_email"] = email
+            st.success("Acesso liberado!")
+            st.rerun()
+        else:
+            st.error("E-mail não autorizado.")
+    st.stop()
+
+# ------------------------------
+# Pool de conexões (compartilhado entre sessões)
+# ------------------------------
+class PoolConexoes:
+    """
+    Pool thread-safe de conexões abertas via get_conn().
+    - minimo: conexões mantidas abertas mesmo ociosas;
+    - maximo: teto de conexões simultâneas (acima disso o checkout espera);
+    - idle_timeout: segundos que uma conexão excedente pode ficar ociosa;
+    - health_check: segundos de ociosidade a partir dos quais o checkout
+      valida a conexão com SELECT 1 (0 = sempre, None = nunca).
+    """
+
+    def __init__(self, fabrica, minimo: int = 1, maximo: int = 10,
+                 idle_timeout: float = 300.0, health_check: float | None = 30.0,
+                 timeout_espera: float = 30.0):
+        self._fabrica = fabrica
+        self.minimo = max(0, int(minimo))
+        self.maximo = max(1, int(maximo), self.minimo)
+        self.idle_timeout = float(idle_timeout)
+        self.health_check = health_check
+        self.timeout_espera = float(timeout_espera)
+
+        self._cond = threading.Condition()
+        self._livres: List[Tuple[object, float]] = []  # (conexão, monotonic da devolução)
+        self._em_uso = 0
+        self.checkouts = 0
+        self.esperas = 0
+        self.descartadas = 0
+        self._latencias = deque(maxlen=1000)
+
+    @staticmethod
+    def _fechar(cn):
+        try:
+            cn.close()
+        except Exception:
+            pass
+
+    def _saudavel(self, cn, ociosa_desde: float) -> bool:
+        if getattr(cn, "closed", 0):
+            return False
+        if self.health_check is None or time.monotonic() - ociosa_desde < self.health_check:
+            return True
+        try:
+            with cn.cursor() as cur:
+                cur.execute("SELECT 1")
+            cn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _expirar_ociosas(self) -> list:
+        """Retira do pool as conexões excedentes ociosas há mais de idle_timeout (chamar com o lock)."""
+        agora = time.monotonic()
+        expiradas = []
+        while (self._livres
+               and len(self._livres) + self._em_uso > self.minimo
+               and agora - self._livres[0][1] > self.idle_timeout):
+            expiradas.append(self._livres.pop(0)[0])
+        return expiradas
+
+    def checkout(self):
+        t0 = time.perf_counter()
+        limite = time.monotonic() + self.timeout_espera
+        esperou = False
+        with self._cond:
+            while True:
+                if self._livres:
+                    cn, ociosa_desde = self._livres.pop()  # LIFO: reaproveita a mais "quente"
+                    break
+                if self._em_uso < self.maximo:
+                    cn, ociosa_desde = None, 0.0
+                    break
+                if not esperou:
+                    self.esperas += 1
+                    esperou = True
+                restante = limite - time.monotonic()
+                if restante <= 0 or not self._cond.wait(timeout=restante):
+                    raise TimeoutError(
+                        f"Pool de conexões esgotado ({self.maximo} em uso) após {self.timeout_espera:.0f}s."
+                    )
+            self._em_uso += 1
+
+        # abrir/validar fora do lock para não travar as outras sessões
+        try:
+            if cn is not None and not self._saudavel(cn, ociosa_desde):
+                self._fechar(cn)
+                cn = None
+                with self._cond:
+                    self.descartadas += 1
+            if cn is None:
+                cn = self._fabrica()
+        except Exception:
+            with self._cond:
+                self._em_uso -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.checkouts += 1
+            self._latencias.append(time.perf_counter() - t0)
+        return cn
+
+    def checkin(self, cn):
+        reaproveitar = not getattr(cn, "closed", 0)
+        if reaproveitar:
+            try:
+                cn.rollback()  # nunca devolve conexão com transação aberta
+            except Exception:
+                reaproveitar = False
+        if not reaproveitar:
+            self._fechar(cn)
+        with self._cond:
+            self._em_uso -= 1
+            if reaproveitar:
+                self._livres.append((cn, time.monotonic()))
+            else:
+                self.descartadas += 1
+            expiradas = self._expirar_ociosas()
+            self._cond.notify()
+        for velha in expiradas:
+            self._fechar(velha)
+
+    @contextmanager
+    def conexao(self):
+        cn = self.checkout()
+        try:
+            yield cn
+        finally:
+            self.checkin(cn)
+
+    def fechar_tudo(self):
+        with self._cond:
+            livres, self._livres = self._livres, []
+        for cn, _ in livres:
+            self._fechar(cn)
+
+    def estatisticas(self) -> Dict[str, float]:
+        with self._cond:
+            lat = sorted(self._latencias)
+            livres = len(self._livres)
+            em_uso = self._em_uso
+            checkouts, esperas, descartadas = self.checkouts, self.esperas, self.descartadas
+        p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else 0.0
+        return {
+            "em_uso": em_uso,
+            "livres": livres,
+            "abertas": em_uso + livres,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "checkouts": checkouts,
+            "esperas": esperas,
+            "descartadas": descartadas,
+            "checkout_medio_ms": (sum(lat) / len(lat) * 1000) if lat else 0.0,
+            "checkout_p95_ms": p95 * 1000,
+            "checkout_max_ms": (lat[-1] * 1000) if lat else 0.0,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def _pool() -> PoolConexoes:
+    """Um único pool por processo (o cache_resource é compartilhado entre sessões)."""
+    if get_config is None:
+        raise RuntimeError("Módulo DB_supabase não encontrado: instale-o ou use ARMAZENAMENTO=sqlite.")
+    cfg = get_config()
+    hc = cfg.get("POOL_HEALTH_CHECK", 30)
+    return PoolConexoes(
+        get_conn,
+        minimo=int(cfg.get("POOL_MIN", 1)),
+        maximo=int(cfg.get("POOL_MAX", 10)),
+        idle_timeout=float(cfg.get("POOL_IDLE_TIMEOUT", 300)),
+        health_check=None if hc is None or hc is False or hc == "" else float(hc),
+        timeout_espera=float(cfg.get("POOL_TIMEOUT", 30)),
+    )
+
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão do pool do processo; devolve (com rollback do que não foi commitado) ao sair."""
+    medicoes = _medicoes_ativas()
+    if not medicoes:
+        with _pool().conexao() as cn:
+            yield cn
+        return
+    t0 = time.perf_counter()
+    with _pool().conexao() as cn:
+        espera = time.perf_counter() - t0
+        for m in medicoes:
+            m.conexao_s += espera
+        yield ConexaoMedida(cn)
+
+# ------------------------------
+# Armazenamento (Postgres ou SQLite embutido)
+# ------------------------------
+# ARMAZENAMENTO=sqlite troca a camada de dados por um arquivo SQLite local
+# (ArmazenamentoSQLite, mais abaixo) e o app sobe sem DB_supabase nem rede:
+# tablet offline no armazém, benchmarks e testes de carga locais. Cada função
+# marcada com @armazenavel é desviada para o método de mesmo nome; feed de
+# alterações, EXPLAIN, tabela de resumo e migrações existem só no Postgres.
+ARMAZENAMENTO = os.getenv("ARMAZENAMENTO", "postgres").strip().lower()
+ARQUIVO_SQLITE = os.getenv("ARMAZENAMENTO_SQLITE", "cadastro_hc.sqlite3")
+
+if ARMAZENAMENTO not in ("postgres", "sqlite"):
+    raise ValueError(f"ARMAZENAMENTO={ARMAZENAMENTO!r}: use 'postgres' ou 'sqlite'.")
+
+
+def embutido() -> bool:
+    return ARMAZENAMENTO == "sqlite"
+
+
+@st.cache_resource(show_spinner=False)
+def _armazenamento_sqlite() -> "ArmazenamentoSQLite":
+    return ArmazenamentoSQLite(ARQUIVO_SQLITE)
+
+
+def armazenavel(fn):
+    """Com ARMAZENAMENTO=sqlite, desvia a função para o método de mesmo nome do ArmazenamentoSQLite."""
+    if not embutido():
+        return fn
+
+    @functools.wraps(fn)
+    def desviada(*args, **kwargs):
+        return getattr(_armazenamento_sqlite(), fn.__name__)(*args, **kwargs)
+    return desviada
+
+# ------------------------------
+# Instrumentação da camada de dados
+# ------------------------------
+# Cada função decorada com @instrumentado vira uma medição (nome, linhas,
+# idas ao banco, tempo total e tempo esperando conexão) guardada num buffer
+# circular do processo. Chamadas acima do limiar vão para o log com os
+# parâmetros mascarados. Medições aninhadas somam também na de fora.
+LIMIAR_LENTA_MS = float(os.getenv("LIMIAR_CONSULTA_LENTA_MS", "500"))
+TAMANHO_BUFFER_PERF = int(os.getenv("PERF_BUFFER", "5000"))
+PARAMETROS_SENSIVEIS = {"nome", "nomes", "nomes_colaboradores", "leader_nome", "usuario",
+                        "email", "senha", "password", "mapa_id_por_nome", "arquivo"}
+
+log_perf = logging.getLogger("cadastro_hc.perf")
+_medindo = threading.local()
+
+
+class Medicao:
+    __slots__ = ("nome", "linhas", "idas", "conexao_s")
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.linhas = 0
+        self.idas = 0
+        self.conexao_s = 0.0
+
+
+def _medicoes_ativas() -> list:
+    return getattr(_medindo, "pilha", [])
+
+
+def _contar(idas: int = 0, linhas: int = 0):
+    for m in _medicoes_ativas():
+        m.idas += idas
+        m.linhas += linhas
+
+
+class CursorMedido:
+    """Repassa tudo ao cursor real, contando idas ao banco e linhas lidas/afetadas."""
+
+    def __init__(self, cur):
+        object.__setattr__(self, "_cur", cur)
+
+    def __getattr__(self, nome):
+        return getattr(self._cur, nome)
+
+    def __setattr__(self, nome, valor):
+        setattr(self._cur, nome, valor)
+
+    def __enter__(self):
+        self._cur.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cur.__exit__(*exc)
+
+    def __iter__(self):
+        for linha in self._cur:
+            _contar(linhas=1)
+            yield linha
+
+    def execute(self, *args, **kwargs):
+        r = self._cur.execute(*args, **kwargs)
+        nomeado = getattr(self._cur, "name", None)
+        # SELECT em cursor nomeado só abre o portal; as linhas vêm nos fetch
+        afetadas = self._cur.rowcount if self._cur.description is None and self._cur.rowcount > 0 else 0
+        _contar(idas=0 if nomeado else 1, linhas=afetadas)
+        return r
+
+    def fetchone(self):
+        r = self._cur.fetchone()
+        _contar(idas=1 if getattr(self._cur, "name", None) else 0, linhas=int(r is not None))
+        return r
+
+    def fetchmany(self, *args, **kwargs):
+        r = self._cur.fetchmany(*args, **kwargs)
+        _contar(idas=1 if getattr(self._cur, "name", None) else 0, linhas=len(r))
+        return r
+
+    def fetchall(self):
+        r = self._cur.fetchall()
+        _contar(idas=1 if getattr(self._cur, "name", None) else 0, linhas=len(r))
+        return r
+
+
+class ConexaoMedida:
+    """Conexão emprestada durante uma medição: cursores medidos, commit conta como ida."""
+
+    def __init__(self, cn):
+        object.__setattr__(self, "_cn", cn)
+
+    def __getattr__(self, nome):
+        return getattr(self._cn, nome)
+
+    def __setattr__(self, nome, valor):
+        setattr(self._cn, nome, valor)
+
+    def cursor(self, *args, **kwargs):
+        return CursorMedido(self._cn.cursor(*args, **kwargs))
+
+    def commit(self):
+        self._cn.commit()
+        _contar(idas=1)
+
+
+class RegistroPerf:
+    """Buffer circular thread-safe com as últimas medições do processo."""
+
+    def __init__(self, tamanho: int = TAMANHO_BUFFER_PERF):
+        self._lock = threading.Lock()
+        self._itens = deque(maxlen=tamanho)
+
+    def registrar(self, item: dict):
+        with self._lock:
+            self._itens.append(item)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def itens(self) -> pd.DataFrame:
+        with self._lock:
+            itens = list(self._itens)
+        return pd.DataFrame(itens, columns=["quando", "nome", "linhas", "idas", "total_ms",
+                                            "conexao_ms", "lenta", "parametros"])
+
+    def percentis(self) -> pd.DataFrame:
+        df = self.itens()
+        if df.empty:
+            return pd.DataFrame(columns=["nome", "chamadas", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+                                         "conexao_p95_ms", "idas_media", "linhas_media", "lentas"])
+        g = df.groupby("nome")
+        return pd.DataFrame({
+            "chamadas": g.size(),
+            "p50_ms": g["total_ms"].quantile(0.50),
+            "p95_ms": g["total_ms"].quantile(0.95),
+            "p99_ms": g["total_ms"].quantile(0.99),
+            "max_ms": g["total_ms"].max(),
+            "conexao_p95_ms": g["conexao_ms"].quantile(0.95),
+            "idas_media": g["idas"].mean(),
+            "linhas_media": g["linhas"].mean(),
+            "lentas": g["lenta"].sum(),
+        }).sort_values("p95_ms", ascending=False).reset_index()
+
+
+@st.cache_resource(show_spinner=False)
+def _registro_perf() -> RegistroPerf:
+    return RegistroPerf()
+
+
+def _mascarar(nome: str, valor) -> str:
+    """Representação curta do parâmetro para o log, sem dados pessoais."""
+    if nome in PARAMETROS_SENSIVEIS:
+        return "<oculto>"
+    if isinstance(valor, pd.DataFrame):
+        return f"<DataFrame {valor.shape[0]}x{valor.shape[1]}>"
+    if isinstance(valor, (list, tuple, set, dict)):
+        return f"<{type(valor).__name__} len={len(valor)}>"
+    if isinstance(valor, str) and "@" in valor:
+        return "<oculto>"
+    texto = repr(valor)
+    return texto if len(texto) <= 80 else texto[:77] + "..."
+
+
+def instrumentado(fn):
+    """Mede cada chamada de uma função da camada de dados (ver RegistroPerf)."""
+    @functools.wraps(fn)
+    def medida(*args, **kwargs):
+        m = Medicao(fn.__name__)
+        pilha = _medicoes_ativas()
+        _medindo.pilha = pilha + [m]
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            total_ms = (time.perf_counter() - t0) * 1000
+            _medindo.pilha = pilha
+            lenta = total_ms >= LIMIAR_LENTA_MS
+            parametros = None
+            if lenta:
+                codigo = getattr(fn, "__wrapped__", fn).__code__
+                nomes = codigo.co_varnames[:codigo.co_argcount]
+                pares = list(zip(nomes, args)) + list(kwargs.items())
+                parametros = ", ".join(f"{k}={_mascarar(k, v)}" for k, v in pares)
+                log_perf.warning("consulta lenta: %s %.0f ms (%d idas, %d linhas, conexão %.0f ms) %s",
+                                 m.nome, total_ms, m.idas, m.linhas, m.conexao_s * 1000, parametros)
+            _registro_perf().registrar({
+                "quando": pd.Timestamp.now(), "nome": m.nome, "linhas": m.linhas, "idas": m.idas,
+                "total_ms": total_ms, "conexao_ms": m.conexao_s * 1000, "lenta": lenta,
+                "parametros": parametros,
+            })
+    return medida
+
+# ------------------------------
+# Banco (Postgres/Supabase) - Tabelas
+# ------------------------------
+DDL_BASE = """
+create table if not exists public.leaders (
+  id          bigserial primary key,
+  nome        varchar(200) not null,
+  setor       varchar(100) not null,
+  turno       varchar(20)  not null,
+  created_at  timestamptz  not null default now()
+);
+
+create table if not exists public.colaboradores (
+  id          bigserial primary key,
+  nome        varchar(200) not null,
+  setor       varchar(100) not null,
+  turno       varchar(20)  not null,
+  ativo       boolean      not null default true,
+  created_at  timestamptz  not null default now()
+);
+
+create table if not exists public.presencas (
+  id              bigserial primary key,
+  colaborador_id  bigint      not null,
+  data            date        not null,
+  status          varchar(20),
+  setor           varchar(100) not null,
+  turno           varchar(20)  not null,
+  leader_nome     varchar(200),
+  created_at      timestamptz  not null default now(),
+  updated_at      timestamptz,
+  constraint uq_presenca unique (colaborador_id, data),
+  constraint fk_presenca_colab
+    foreign key (colaborador_id) references public.colaboradores(id)
+);
+"""
+
+
+# Os triggers usam tabelas de transição (uma por comando, não por linha) e
+# aplicam só o delta das linhas afetadas: +1 para as novas, -1 para as antigas.
+# O upsert em ordem de chave evita deadlock entre gravações concorrentes.
+DDL_RESUMO = """
+create table if not exists public.presencas_resumo (
+  data    date         not null,
+  setor   varchar(100) not null,
+  turno   varchar(20)  not null,
+  status  varchar(20)  not null,
+  qtd     integer      not null,
+  primary key (data, setor, turno, status)
+);
+
+create or replace function public.presencas_resumo_delta() returns trigger
+language plpgsql as $$
+begin
+  if TG_OP = 'INSERT' then
+    insert into public.presencas_resumo as r (data, setor, turno, status, qtd)
+    select data, setor, turno, coalesce(status, ''), count(*)
+      from novos
+     group by 1, 2, 3, 4
+     order by 1, 2, 3, 4
+    on conflict (data, setor, turno, status) do update set qtd = r.qtd + excluded.qtd;
+  elsif TG_OP = 'DELETE' then
+    insert into public.presencas_resumo as r (data, setor, turno, status, qtd)
+    select data, setor, turno, coalesce(status, ''), -count(*)
+      from antigos
+     group by 1, 2, 3, 4
+     order by 1, 2, 3, 4
+    on conflict (data, setor, turno, status) do update set qtd = r.qtd + excluded.qtd;
+  else
+    insert into public.presencas_resumo as r (data, setor, turno, status, qtd)
+    select data, setor, turno, status, sum(delta)
+      from (
+        select data, setor, turno, coalesce(status, '') as status, -1 as delta from antigos
+        union all
+        select data, setor, turno, coalesce(status, ''), 1 from novos
+      ) d
+     group by 1, 2, 3, 4
+    having sum(delta) <> 0
+     order by 1, 2, 3, 4
+    on conflict (data, setor, turno, status) do update set qtd = r.qtd + excluded.qtd;
+  end if;
+  return null;
+end $$;
+
+create or replace trigger trg_presencas_resumo_ins
+  after insert on public.presencas
+  referencing new table as novos
+  for each statement execute function public.presencas_resumo_delta();
+
+create or replace trigger trg_presencas_resumo_upd
+  after update on public.presencas
+  referencing old table as antigos new table as novos
+  for each statement execute function public.presencas_resumo_delta();
+
+create or replace trigger trg_presencas_resumo_del
+  after delete on public.presencas
+  referencing old table as antigos
+  for each statement execute function public.presencas_resumo_delta();
+"""
+
+
+def _reconstruir_resumo(cur, inicio: date | None = None, fim: date | None = None) -> int:
+    """Recalcula o resumo a partir de public.presencas (todo o histórico ou só [inicio, fim])."""
+    where, params = "true", []
+    if inicio is not None:
+        where += " AND data >= %s"
+        params.append(inicio)
+    if fim is not None:
+        where += " AND data <= %s"
+        params.append(fim)
+    # SHARE bloqueia gravações em presencas enquanto o intervalo é refeito
+    cur.execute("LOCK TABLE public.presencas IN SHARE MODE")
+    cur.execute(f"DELETE FROM public.presencas_resumo WHERE {where}", params)
+    cur.execute(
+        f"""
+        INSERT INTO public.presencas_resumo (data, setor, turno, status, qtd)
+        SELECT data, setor, turno, coalesce(status, ''), count(*)
+          FROM public.presencas
+         WHERE {where}
+         GROUP BY 1, 2, 3, 4
+        """,
+        params,
+    )
+    return cur.rowcount
+
+
+@instrumentado
+def reconstruir_resumo(inicio: date | None = None, fim: date | None = None) -> int:
+    """Backfill/reparo do resumo; retorna quantas linhas de resumo foram gravadas."""
+    with conexao() as cn, cn.cursor() as cur:
+        n = _reconstruir_resumo(cur, inicio, fim)
+        cn.commit()
+    return n
+
+# ------------------------------
+# Migrações de schema (versionadas)
+# ------------------------------
+# Índices das consultas quentes:
+# - relatório/exportação: presencas por data (+ setor/turno), inclusive o dia de um setor;
+# - listas de colaboradores por (setor, turno, ativo);
+# - buscas por nome em upsert_colaborador_turno e get_or_create_leader.
+DDL_INDICES = """
+create index if not exists ix_presencas_data_setor_turno
+  on public.presencas (data, setor, turno) include (colaborador_id, status, leader_nome);
+create index if not exists ix_colaboradores_setor_turno_ativo
+  on public.colaboradores (setor, turno, ativo) include (id, nome);
+create index if not exists ix_colaboradores_nome_setor
+  on public.colaboradores (nome, setor);
+create index if not exists ix_leaders_nome_setor_turno
+  on public.leaders (nome, setor, turno);
+"""
+
+
+def _migracao_resumo(cur):
+    cur.execute(DDL_RESUMO)
+    _reconstruir_resumo(cur)  # backfill do histórico existente
+
+
+DDL_JOBS = """
+create table if not exists public.jobs (
+  id           bigserial    primary key,
+  tipo         varchar(60)  not null,
+  usuario      varchar(200) not null default '',
+  processo     varchar(200) not null default '',
+  estado       varchar(20)  not null default 'pendente'
+               check (estado in ('pendente','executando','concluido','erro')),
+  progresso    real,
+  mensagem     text,
+  resultado    jsonb,
+  criado_em    timestamptz  not null default now(),
+  iniciado_em  timestamptz,
+  concluido_em timestamptz
+);
+create index if not exists ix_jobs_usuario_tipo
+  on public.jobs (usuario, tipo, criado_em desc);
+"""
+
+
+# Férias/afastamentos/atestados ficam como intervalo (uma linha por período);
+# a exclusão impede dois períodos sobrepostos para o mesmo colaborador (o id
+# entra como int8range de um ponto para usar só o GiST nativo, sem btree_gist).
+# presencas_resolvidas(ini, fim) é a leitura "por dia": as linhas diárias
+# e os dias dos períodos que não têm linha diária (a diária tem precedência).
+DDL_PERIODOS = """
+create table if not exists public.presencas_periodos (
+  id              bigserial    primary key,
+  colaborador_id  bigint       not null references public.colaboradores(id),
+  periodo         daterange    not null check (not isempty(periodo)),
+  status          varchar(20)  not null check (status in ('FÉRIAS','AFASTADO','ATESTADO')),
+  setor           varchar(100) not null,
+  turno           varchar(20)  not null,
+  leader_nome     varchar(200),
+  created_at      timestamptz  not null default now(),
+  constraint ex_presencas_periodos_sobrepostos
+    exclude using gist (int8range(colaborador_id, colaborador_id, '[]') with =, periodo with &&)
+);
+
+create or replace function public.presencas_periodos_dias(ini date, fim date)
+returns table (colaborador_id bigint, data date, status varchar, setor varchar, turno varchar, leader_nome varchar)
+language sql stable as $$
+  select r.colaborador_id, g.dia::date, r.status, r.setor, r.turno, r.leader_nome
+    from public.presencas_periodos r
+   cross join lateral generate_series(
+         greatest(lower(r.periodo), ini)::timestamp,
+         least(upper(r.periodo) - 1, fim)::timestamp,
+         interval '1 day') as g(dia)
+   where r.periodo && daterange(ini, fim, '[]')
+     and not exists (
+         select 1 from public.presencas p
+          where p.colaborador_id = r.colaborador_id and p.data = g.dia::date)
+$$;
+
+create or replace function public.presencas_resolvidas(ini date, fim date)
+returns table (colaborador_id bigint, data date, status varchar, setor varchar, turno varchar, leader_nome varchar)
+language sql stable as $$
+  select p.colaborador_id, p.data, p.status, p.setor, p.turno, p.leader_nome
+    from public.presencas p
+   where p.data between ini and fim
+  union all
+  select * from public.presencas_periodos_dias(ini, fim)
+$$;
+"""
+
+# Feed de alterações: cada insert/update/delete em presencas e em
+# presencas_periodos vira uma linha aqui (delete inclusive, com os valores
+# antigos). A marca d'água é o xid da transação: como os xids abaixo de
+# pg_snapshot_xmin já terminaram, a janela [marca, xmin) nunca perde uma
+# transação que comitou "atrasada" (o que aconteceria usando só o seq).
+DDL_ALTERACOES = """
+create table if not exists public.presencas_alteracoes (
+  seq             bigserial    primary key,
+  xid             xid8         not null default pg_current_xact_id(),
+  alterado_em     timestamptz  not null default now(),
+  origem          varchar(10)  not null check (origem in ('dia','periodo')),
+  operacao        char(1)      not null check (operacao in ('I','U','D')),
+  colaborador_id  bigint       not null,
+  data            date         not null,
+  ate             date         not null,
+  status          varchar(20),
+  setor           varchar(100),
+  turno           varchar(20),
+  leader_nome     varchar(200)
+);
+create index if not exists ix_presencas_alteracoes_xid on public.presencas_alteracoes (xid);
+create index if not exists ix_presencas_alteracoes_alterado_em on public.presencas_alteracoes (alterado_em);
+
+create or replace function public.presencas_registrar_alteracao() returns trigger
+language plpgsql as $$
+begin
+  if TG_OP = 'DELETE' then
+    insert into public.presencas_alteracoes
+           (origem, operacao, colaborador_id, data, ate, status, setor, turno, leader_nome)
+    select 'dia', 'D', colaborador_id, data, data, status, setor, turno, leader_nome
+      from antigos;
+  else
+    insert into public.presencas_alteracoes
+           (origem, operacao, colaborador_id, data, ate, status, setor, turno, leader_nome)
+    select 'dia', left(TG_OP, 1), colaborador_id, data, data, status, setor, turno, leader_nome
+      from novos;
+  end if;
+  return null;
+end $$;
+
+create or replace function public.presencas_periodos_registrar_alteracao() returns trigger
+language plpgsql as $$
+begin
+  if TG_OP = 'DELETE' then
+    insert into public.presencas_alteracoes
+           (origem, operacao, colaborador_id, data, ate, status, setor, turno, leader_nome)
+    select 'periodo', 'D', colaborador_id, lower(periodo), upper(periodo) - 1, status, setor, turno, leader_nome
+      from antigos;
+  else
+    insert into public.presencas_alteracoes
+           (origem, operacao, colaborador_id, data, ate, status, setor, turno, leader_nome)
+    select 'periodo', left(TG_OP, 1), colaborador_id, lower(periodo), upper(periodo) - 1, status, setor, turno, leader_nome
+      from novos;
+  end if;
+  return null;
+end $$;
+
+create or replace trigger trg_presencas_alteracoes_ins
+  after insert on public.presencas
+  referencing new table as novos
+  for each statement execute function public.presencas_registrar_alteracao();
+
+create or replace trigger trg_presencas_alteracoes_upd
+  after update on public.presencas
+  referencing new table as novos
+  for each statement execute function public.presencas_registrar_alteracao();
+
+create or replace trigger trg_presencas_alteracoes_del
+  after delete on public.presencas
+  referencing old table as antigos
+  for each statement execute function public.presencas_registrar_alteracao();
+
+create or replace trigger trg_presencas_periodos_alteracoes_ins
+  after insert on public.presencas_periodos
+  referencing new table as novos
+  for each statement execute function public.presencas_periodos_registrar_alteracao();
+
+create or replace trigger trg_presencas_periodos_alteracoes_upd
+  after update on public.presencas_periodos
+  referencing new table as novos
+  for each statement execute function public.presencas_periodos_registrar_alteracao();
+
+create or replace trigger trg_presencas_periodos_alteracoes_del
+  after delete on public.presencas_periodos
+  referencing old table as antigos
+  for each statement execute function public.presencas_periodos_registrar_alteracao();
+"""
+
+DDL_SINCRONIZACOES = """
+-- uma linha por célula recebida da fila offline de um servidor do app (FilaGravacoes)
+create table if not exists public.sincronizacoes (
+  chave       text        primary key,
+  aplicada_em timestamptz not null default now()
+);
+create index if not exists ix_sincronizacoes_aplicada_em on public.sincronizacoes (aplicada_em);
+"""
+
+DDL_JOBS_BATIMENTO = """
+-- prova de vida do processo dono do job (ExecutorJobs._laco_batimento)
+alter table public.jobs add column if not exists batimento_em timestamptz;
+create index if not exists ix_jobs_ativos
+  on public.jobs (batimento_em) where estado in ('pendente','executando');
+"""
+
+# versao_dados: alterações que tocam um intervalo de datas
+DDL_ALTERACOES_INTERVALO = """
+create index if not exists ix_presencas_alteracoes_intervalo
+  on public.presencas_alteracoes (ate, data);
+"""
+
+# origem das leituras por dia; recebe (início, fim) antes dos demais parâmetros
+ORIGEM_PRESENCAS = "public.presencas_resolvidas(%s, %s) p"
+
+
+# (versão, descrição, SQL ou função que recebe o cursor). Nunca altere uma
+# migração já publicada: acrescente uma nova versão no fim da lista.
+MIGRACOES: List[Tuple[int, str, object]] = [
+    (1, "tabelas base (leaders, colaboradores, presencas)", DDL_BASE),
+    (2, "resumo diário de presenças", _migracao_resumo),
+    (3, "índices das consultas quentes", DDL_INDICES),
+    (4, "tarefas em segundo plano (jobs)", DDL_JOBS),
+    (5, "períodos de férias/afastamento como intervalo", DDL_PERIODOS),
+    (6, "feed de alterações de presenças", DDL_ALTERACOES),
+    (7, "chaves de idempotência da fila offline", DDL_SINCRONIZACOES),
+    (8, "batimento dos jobs (detecção de órfãos)", DDL_JOBS_BATIMENTO),
+    (9, "índice do feed por intervalo (versão das exportações)", DDL_ALTERACOES_INTERVALO),
+]
+
+# chave do advisory lock que serializa init_db entre processos/réplicas
+LOCK_MIGRACOES = 4_812_001
+
+
+@instrumentado
+@armazenavel
+def init_db():
+    """Aplica as migrações pendentes, em ordem e numa única transação (seguro para rodar várias vezes)."""
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_MIGRACOES,))
+        cur.execute("""
+        create table if not exists public.schema_migrations (
+          versao      integer      primary key,
+          descricao   varchar(200) not null,
+          aplicada_em timestamptz  not null default now()
+        );
+        """)
+        cur.execute("SELECT versao FROM public.schema_migrations")
+        aplicadas = {r[0] for r in cur.fetchall()}
+        for versao, descricao, passo in MIGRACOES:
+            if versao in aplicadas:
+                continue
+            if callable(passo):
+                passo(cur)
+            else:
+                cur.execute(passo)
+            cur.execute(
+                "INSERT INTO public.schema_migrations (versao, descricao) VALUES (%s, %s)",
+                (versao, descricao),
+            )
+        cn.commit()
+
+
+@instrumentado
+def listar_migracoes() -> pd.DataFrame:
+    with conexao() as cn:
+        aplicadas = pd.read_sql(
+            "SELECT versao, descricao, aplicada_em FROM public.schema_migrations ORDER BY versao", cn
+        )
+    pendentes = [
+        {"versao": v, "descricao": d, "aplicada_em": None}
+        for v, d, _ in MIGRACOES if v not in set(aplicadas["versao"])
+    ]
+    return pd.concat([aplicadas, pd.DataFrame(pendentes)], ignore_index=True) if pendentes else aplicadas
+
+
+# ------------------------------
+# Auto-verificação de planos (EXPLAIN) das consultas quentes
+# ------------------------------
+def _consultas_quentes() -> List[Tuple[str, str, tuple]]:
+    ini, fim = periodo_por_data(date.today())
+    setor, turno = OPCOES_SETORES[0], OPCOES_TURNOS[0]
+    relatorio = f"""
+        SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome
+          FROM {ORIGEM_PRESENCAS} JOIN public.colaboradores c ON c.id = p.colaborador_id
+         WHERE p.data BETWEEN %s AND %s {{filtro}}
+         ORDER BY p.setor, p.turno, c.nome, p.colaborador_id, p.data
+         LIMIT 101
+    """
+    return [
+        ("Relatório (período)", relatorio.format(filtro=""), (ini, fim, ini, fim)),
+        ("Relatório (período + setor/turno)",
+         relatorio.format(filtro="AND p.setor = %s AND p.turno = %s"), (ini, fim, ini, fim, setor, turno)),
+        ("Exportação do dia (setor + data)",
+         f"SELECT c.nome, p.data, p.status FROM {ORIGEM_PRESENCAS} "
+         "JOIN public.colaboradores c ON c.id = p.colaborador_id WHERE p.setor = %s",
+         (ini, ini, setor)),
+        ("carregar_presencas",
+         f"SELECT colaborador_id, data, status FROM {ORIGEM_PRESENCAS} WHERE colaborador_id = ANY(%s)",
+         (ini, fim, [1, 2, 3])),
+        ("Colaboradores por setor/turno",
+         "SELECT id, nome, setor, turno, ativo FROM public.colaboradores WHERE setor=%s AND turno=%s AND ativo=true",
+         (setor, turno)),
+        ("Colaboradores por setor",
+         "SELECT id, nome, setor, turno, ativo FROM public.colaboradores WHERE setor=%s AND ativo=true",
+         (setor,)),
+        ("upsert_colaborador_turno (nome + setor)",
+         "SELECT id, turno FROM public.colaboradores WHERE nome=%s AND setor=%s", ("FULANO", setor)),
+        ("get_or_create_leader",
+         "SELECT id FROM public.leaders WHERE nome=%s AND setor=%s AND turno=%s", ("FULANO", setor, turno)),
+        ("Resumo (período)",
+         "SELECT data, setor, turno, status, qtd FROM public.presencas_resumo WHERE data BETWEEN %s AND %s",
+         (ini, fim)),
+    ]
+
+
+def _seq_scans(no: dict) -> List[str]:
+    achados = [no.get("Relation Name", "?")] if no.get("Node Type") == "Seq Scan" else []
+    for filho in no.get("Plans", []):
+        achados += _seq_scans(filho)
+    return achados
+
+
+@instrumentado
+def verificar_planos() -> pd.DataFrame:
+    """
+    Roda EXPLAIN nas consultas quentes. Com tabelas pequenas o planejador
+    prefere Seq Scan mesmo havendo índice, então cada consulta é explicada de
+    novo com enable_seqscan=off: se o Seq Scan continuar, falta índice.
+    """
+    linhas = []
+    with conexao() as cn, cn.cursor() as cur:
+        for nome, sql, params in _consultas_quentes():
+            cur.execute("SET LOCAL enable_seqscan = on")
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plano = cur.fetchone()[0][0]["Plan"]
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            forcado = cur.fetchone()[0][0]["Plan"]
+            seq, seq_forcado = _seq_scans(plano), _seq_scans(forcado)
+            if seq_forcado:
+                situacao = "⚠️ sem índice utilizável"
+            elif seq:
+                situacao = "Seq Scan por custo (tabela pequena)"
+            else:
+                situacao = "OK"
+            linhas.append({
+                "consulta": nome,
+                "situacao": situacao,
+                "seq_scan": ", ".join(seq) or "-",
+                "seq_scan_sem_alternativa": ", ".join(seq_forcado) or "-",
+                "custo_estimado": plano.get("Total Cost"),
+            })
+    return pd.DataFrame(linhas)
+
+# ------------------------------
+# Tarefas em segundo plano (jobs)
+# ------------------------------
+# Gravações longas rodam num pool de threads do próprio processo; o estado,
+# o progresso e o resultado ficam na tabela jobs, então a página só consulta
+# o andamento (e um refresh do navegador não interrompe o trabalho).
+# Cada processo renova batimento_em dos seus jobs ativos a cada
+# JOBS_BATIMENTO segundos; job ativo sem batimento há JOBS_ORFAO_APOS
+# segundos é de um processo que morreu (vale entre máquinas, réplicas e
+# contêineres reiniciados com o mesmo hostname/pid).
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_BATIMENTO = float(os.getenv("JOBS_BATIMENTO", "15"))
+JOBS_ORFAO_APOS = float(os.getenv("JOBS_ORFAO_APOS", "90"))
+ESTADOS_JOB_ATIVOS = ("pendente", "executando")
+
+_job_atual = threading.local()
+
+
+def reportar_progresso(mensagem: str, fracao: float | None = None):
+    """Atualiza o progresso do job em execução nesta thread (no-op fora de um job)."""
+    job_id = getattr(_job_atual, "id", None)
+    if job_id is None:
+        return
+    agora = time.monotonic()
+    if agora - getattr(_job_atual, "ultimo", 0.0) < 0.5:  # no máximo 2 escritas/s
+        return
+    _job_atual.ultimo = agora
+    _executor_jobs().progresso(job_id, mensagem, fracao)
+
+
+class ExecutorJobs:
+    """Executa funções num ThreadPoolExecutor e registra cada execução na tabela jobs."""
+
+    def __init__(self, workers: int = JOBS_WORKERS):
+        # o sufixo aleatório distingue um contêiner reiniciado com o mesmo hostname/pid
+        self.processo = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+
+    def iniciar_batimento(self):
+        threading.Thread(target=self._laco_batimento, name="jobs-batimento", daemon=True).start()
+
+    def _laco_batimento(self):
+        while True:
+            try:
+                self.bater()
+                self.marcar_orfaos()
+            except Exception:
+                pass  # banco fora do ar ou tabela ainda não migrada: tenta no próximo ciclo
+            time.sleep(JOBS_BATIMENTO)
+
+    def bater(self):
+        """Renova batimento_em dos jobs ativos deste processo."""
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute(
+                "UPDATE public.jobs SET batimento_em = now() "
+                "WHERE processo = %s AND estado IN ('pendente', 'executando')",
+                (self.processo,),
+            )
+            cn.commit()
+
+    def marcar_orfaos(self) -> int:
+        """Jobs ativos sem batimento recente são de um processo que morreu: nunca vão terminar."""
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute("""
+            UPDATE public.jobs
+               SET estado = 'erro', mensagem = 'Interrompido (servidor reiniciado).', concluido_em = now()
+             WHERE estado IN ('pendente', 'executando')
+               AND coalesce(batimento_em, criado_em) < now() - make_interval(secs => %s)
+            """, (JOBS_ORFAO_APOS,))
+            n = cur.rowcount
+            cn.commit()
+        return n
+
+    def submeter(self, tipo: str, usuario: str, fn, *args, **kwargs) -> int:
+        job_id = self._criar(tipo, usuario)
+        self._pool.submit(self._rodar, job_id, fn, args, kwargs)
+        return job_id
+
+    def _rodar(self, job_id: int, fn, args, kwargs):
+        if not self._iniciar(job_id):
+            return  # já dado como órfão (e o usuário avisado): não roda mais
+        _job_atual.id, _job_atual.ultimo = job_id, 0.0
+        try:
+            resultado = fn(*args, **kwargs)
+            estado, mensagem = "concluido", None
+        except Exception as e:
+            resultado, estado, mensagem = None, "erro", str(e)
+        finally:
+            _job_atual.id = None
+        self._finalizar(job_id, estado, mensagem, resultado)
+
+    def _criar(self, tipo: str, usuario: str) -> int:
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO public.jobs (tipo, usuario, processo, batimento_em) "
+                "VALUES (%s, %s, %s, now()) RETURNING id",
+                (tipo, usuario or "", self.processo),
+            )
+            job_id = cur.fetchone()[0]
+            cn.commit()
+        return job_id
+
+    def _iniciar(self, job_id: int) -> bool:
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute(
+                "UPDATE public.jobs SET estado = 'executando', iniciado_em = now(), batimento_em = now() "
+                "WHERE id = %s AND estado = 'pendente'",
+                (job_id,),
+            )
+            cn.commit()
+            return cur.rowcount == 1
+
+    def progresso(self, job_id: int, mensagem: str, fracao: float | None):
+        # conexão própria: a transação do job ainda não foi commitada
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute(
+                "UPDATE public.jobs SET mensagem = %s, progresso = %s WHERE id = %s",
+                (mensagem, fracao, job_id),
+            )
+            cn.commit()
+
+    def _finalizar(self, job_id: int, estado: str, mensagem: str | None, resultado):
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute("""
+            UPDATE public.jobs
+               SET estado = %s, mensagem = %s, resultado = %s::jsonb,
+                   progresso = CASE WHEN %s = 'concluido' THEN 1 ELSE progresso END,
+                   concluido_em = now()
+             WHERE id = %s AND estado IN ('pendente', 'executando')
+            """, (estado, mensagem, json.dumps(resultado), estado, job_id))
+            cn.commit()
+
+    @staticmethod
+    def _linha(cur) -> dict | None:
+        r = cur.fetchone()
+        return dict(zip([d[0] for d in cur.description], r)) if r else None
+
+    def obter(self, job_id: int) -> dict | None:
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute("SELECT * FROM public.jobs WHERE id = %s", (job_id,))
+            return self._linha(cur)
+
+    def ativo(self, usuario: str, tipo: str) -> dict | None:
+        """Job do usuário/tipo ainda em andamento (para retomar o acompanhamento após um refresh)."""
+        with conexao() as cn, cn.cursor() as cur:
+            cur.execute("""
+            SELECT * FROM public.jobs
+             WHERE usuario = %s AND tipo = %s AND estado IN ('pendente', 'executando')
+             ORDER BY criado_em DESC LIMIT 1
+            """, (usuario or "", tipo))
+            return self._linha(cur)
+
+    def listar(self, usuario: str | None = None, limite: int = 20) -> pd.DataFrame:
+        filtro, params = ("WHERE usuario = %s", [usuario]) if usuario else ("", [])
+        with conexao() as cn:
+            return pd.read_sql(
+                f"SELECT id, tipo, usuario, estado, progresso, mensagem, resultado, criado_em, concluido_em "
+                f"FROM public.jobs {filtro} ORDER BY criado_em DESC LIMIT %s",
+                cn, params=params + [limite],
+            )
+
+
+class ExecutorJobsMemoria(ExecutorJobs):
+    """Mesma interface, com os jobs num dicionário do processo (armazenamento embutido, sem tabela jobs)."""
+
+    def __init__(self, workers: int = JOBS_WORKERS):
+        super().__init__(workers)
+        self._lock = threading.Lock()
+        self._jobs: Dict[int, dict] = {}
+
+    def iniciar_batimento(self):
+        pass  # os jobs não sobrevivem ao processo
+
+    def marcar_orfaos(self) -> int:
+        return 0
+
+    def _criar(self, tipo: str, usuario: str) -> int:
+        with self._lock:
+            job_id = len(self._jobs) + 1
+            self._jobs[job_id] = {
+                "id": job_id, "tipo": tipo, "usuario": usuario or "", "processo": self.processo,
+                "estado": "pendente", "progresso": None, "mensagem": None, "resultado": None,
+                "criado_em": pd.Timestamp.now(), "iniciado_em": None, "concluido_em": None,
+            }
+        return job_id
+
+    def _alterar(self, job_id: int, **campos):
+        with self._lock:
+            self._jobs[job_id].update(campos)
+
+    def _iniciar(self, job_id: int) -> bool:
+        self._alterar(job_id, estado="executando", iniciado_em=pd.Timestamp.now())
+        return True
+
+    def progresso(self, job_id: int, mensagem: str, fracao: float | None):
+        self._alterar(job_id, mensagem=mensagem, progresso=fracao)
+
+    def _finalizar(self, job_id: int, estado: str, mensagem: str | None, resultado):
+        campos = {"estado": estado, "mensagem": mensagem, "concluido_em": pd.Timestamp.now(),
+                  "resultado": json.loads(json.dumps(resultado))}  # mesmo formato do jsonb
+        if estado == "concluido":
+            campos["progresso"] = 1.0
+        self._alterar(job_id, **campos)
+
+    def obter(self, job_id: int) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def ativo(self, usuario: str, tipo: str) -> dict | None:
+        with self._lock:
+            ativos = [j for j in self._jobs.values()
+                      if j["usuario"] == (usuario or "") and j["tipo"] == tipo
+                      and j["estado"] in ESTADOS_JOB_ATIVOS]
+            return dict(max(ativos, key=lambda j: j["id"])) if ativos else None
+
+    def listar(self, usuario: str | None = None, limite: int = 20) -> pd.DataFrame:
+        colunas = ["id", "tipo", "usuario", "estado", "progresso", "mensagem", "resultado",
+                   "criado_em", "concluido_em"]
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if not usuario or j["usuario"] == usuario]
+        jobs = sorted(jobs, key=lambda j: j["id"], reverse=True)[:limite]
+        return pd.DataFrame([{c: j[c] for c in colunas} for j in jobs], columns=colunas)
+
+
+@st.cache_resource(show_spinner=False)
+def _executor_jobs() -> ExecutorJobs:
+    """Um executor por processo; o batimento também encerra jobs órfãos de processos mortos."""
+    ex = ExecutorJobsMemoria() if embutido() else ExecutorJobs()
+    ex.iniciar_batimento()
+    return ex
+
+
+@st.fragment(run_every=2)
+def _progresso_job(chave: str):
+    """Consulta o job a cada 2s; quando termina, reroda a página inteira para mostrar o resultado."""
+    job = _executor_jobs().obter(st.session_state[chave])
+    if job is None or job["estado"] not in ESTADOS_JOB_ATIVOS:
+        st.rerun()
+    texto = job["mensagem"] or ("Na fila…" if job["estado"] == "pendente" else "Executando…")
+    if job["progresso"] is not None:
+        st.progress(float(job["progresso"]), text=texto)
+    else:
+        st.info(f"⏳ {texto}")
+
+
+def acompanhar_job(chave: str, tipo: str, formatar, ao_concluir=None) -> bool:
+    """
+    Mostra o andamento/resultado do job guardado em st.session_state[chave].
+    Sem job na sessão (ex.: depois de um refresh), retoma o job ativo do usuário
+    para esse tipo. 'formatar' transforma o resultado na mensagem de sucesso;
+    'ao_concluir' (opcional) roda uma vez quando o job termina com sucesso.
+    Retorna True enquanto o job estiver em andamento.
+    """
+    ex = _executor_jobs()
+    if chave not in st.session_state:
+        job = ex.ativo(st.session_state.get("user_email", ""), tipo)
+        if job is None:
+            return False
+        st.session_state[chave] = job["id"]
+    job = ex.obter(st.session_state[chave])
+    if job is None:
+        st.session_state.pop(chave, None)
+        return False
+    if job["estado"] in ESTADOS_JOB_ATIVOS:
+        _progresso_job(chave)
+        return True
+    if job["estado"] == "concluido":
+        if ao_concluir is not None:
+            ao_concluir()
+        st.success(formatar(job["resultado"]))
+    else:
+        st.error(f"Falhou: {job['mensagem']}")
+    st.session_state.pop(chave, None)  # mostrado uma vez
+    return False
+
+
+def _try_auto_import_seed():
+    caminhos = [
+        "Turno Colaboradores.xlsx",
+        "turnos.xlsx",
+        "turnos.csv",
+        "/mnt/data/Turno Colaboradores.xlsx",
+    ]
+    for p in caminhos:
+        try:
+            if os.path.exists(p):
+                with open(p, "rb") as f:
+                    importar_turnos_de_arquivo(f, setor_padrao=None)
+                break
+        except Exception:
+            pass
+
+# ------------------------------
+# Utilitários de período (16..15)
+# ------------------------------
+MESES_PT = ["jan","fev","mar","abr","mai","jun","jul","ago","set","out","nov","dez"]
+
+@st.cache_resource(show_spinner=False)
+def _memo_processo() -> dict:
+    return {}
+
+
+def memo_processo(maxsize: int):
+    """
+    lru_cache que sobrevive aos reruns. O Streamlit reexecuta o script a cada
+    rerun, e um lru_cache comum nasceria vazio toda vez; aqui a função
+    memoizada fica guardada no processo, por nome e código (editar a função
+    gera um cache novo).
+    """
+    def decorar(fn):
+        loja = _memo_processo()
+        chave = (fn.__qualname__, fn.__code__)
+        if chave not in loja:
+            loja[chave] = functools.lru_cache(maxsize=maxsize)(fn)
+        return loja[chave]
+    return decorar
+
+
+# funções puras de calendário: memoizadas por processo (chamadas várias vezes por rerun)
+@memo_processo(maxsize=1024)
+def periodo_por_data(ref: date) -> Tuple[date, date]:
+    if ref.day >= 16:
+        inicio = ref.replace(day=16)
+    else:
+        inicio = (ref.replace(day=1) - relativedelta(months=1)).replace(day=16)
+    fim = (inicio + relativedelta(months=1)).replace(day=15)
+    return inicio, fim
+
+def listar_periodos(n: int = 12) -> List[Tuple[str, date, date]]:
+    return list(_listar_periodos(date.today(), n))
+
+@memo_processo(maxsize=32)
+def _listar_periodos(hoje: date, n: int) -> Tuple[Tuple[str, date, date], ...]:
+    inicio_atual, _ = periodo_por_data(hoje)
+    periodos = []
+    for i in range(n):
+        ini = inicio_atual - relativedelta(months=i)
+        fim = (ini + relativedelta(months=1)).replace(day=15)
+        rotulo = f"{ini.day} {MESES_PT[ini.month-1]} {ini.year} – {fim.day} {MESES_PT[fim.month-1]} {fim.year}"
+        periodos.append((rotulo, ini, fim))
+    return tuple(periodos)
+
+@memo_processo(maxsize=256)
+def datas_do_periodo(inicio: date, fim: date) -> Tuple[date, ...]:
+    n = (fim - inicio).days + 1
+    return tuple(inicio + timedelta(days=i) for i in range(n))
+
+def data_minima_preenchimento(hoje: date | None = None) -> date:
+    h = hoje or date.today()
+    inicio, _ = periodo_por_data(h)
+    return inicio
+
+# ------------------------------
+# Matriz compacta de presenças (colaborador × dia)
+# ------------------------------
+class MatrizPresencas:
+    """
+    Status de um conjunto de colaboradores num intervalo como uma matriz int8
+    (linha = colaborador, coluna = dia) de códigos que indexam 'rotulos':
+    STATUS_OPCOES e, no fim, qualquer status fora da lista vindo do banco.
+    Código 0 = "" (sem registro). 1.000 × 365 ocupa ~365 KB, contra dezenas
+    de MB do dict {(id, iso): status} ou de uma grade de strings.
+    """
+
+    def __init__(self, ids, inicio: date, fim: date):
+        self.ids = np.asarray(list(ids), dtype=np.int64)
+        self.inicio, self.fim = inicio, fim
+        self.rotulos: List[str] = list(STATUS_OPCOES)
+        self.codigos = np.zeros((len(self.ids), (fim - inicio).days + 1), dtype=np.int8)
+        self._linhas = pd.Index(self.ids)
+
+    @classmethod
+    def de_dict(cls, ids, inicio: date, fim: date,
+                presencas: Dict[Tuple[int, str], str]) -> "MatrizPresencas":
+        """Converte o dict de carregar_presencas."""
+        m = cls(ids, inicio, fim)
+        if presencas:
+            cids, isos = zip(*presencas.keys())
+            m.gravar(cids, isos, list(presencas.values()))
+        return m
+
+    @classmethod
+    def da_grade(cls, grade: pd.DataFrame, ids, inicio: date, fim: date) -> "MatrizPresencas":
+        """Lê a grade do editor (uma coluna ISO por dia, linhas alinhadas a 'ids')."""
+        m = cls(ids, inicio, fim)
+        m.codigos[:] = m.codigos_da_grade(grade)
+        return m
+
+    @property
+    def datas(self) -> Tuple[date, ...]:
+        return datas_do_periodo(self.inicio, self.fim)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codigos.nbytes + self.ids.nbytes
+
+    def codigos_de(self, status) -> np.ndarray:
+        """Códigos dos status (None/NaN = ""); status desconhecidos ganham código novo."""
+        valores = pd.Series(status, dtype="object").fillna("")
+        novos = [s for s in valores.unique() if s not in self.rotulos]
+        if len(self.rotulos) + len(novos) > 127:
+            raise ValueError("Status distintos demais para a matriz int8.")
+        self.rotulos.extend(novos)
+        return pd.Categorical(valores, categories=self.rotulos).codes.astype(np.int8)
+
+    def codigos_da_grade(self, grade: pd.DataFrame) -> np.ndarray:
+        """Códigos da grade do editor no formato de 'codigos' (linhas alinhadas a ids), sem gravar."""
+        isos = [d.isoformat() for d in self.datas]
+        valores = grade.reindex(columns=isos).to_numpy(dtype=object).ravel()
+        return self.codigos_de(valores).reshape(self.codigos.shape)
+
+    def recorte(self, ids) -> "MatrizPresencas":
+        """Cópia só com as linhas de 'ids', na ordem dada; id fora da matriz vem vazio."""
+        m = MatrizPresencas(ids, self.inicio, self.fim)
+        m.rotulos = list(self.rotulos)
+        linhas = self._linhas.get_indexer(m.ids)
+        if (linhas >= 0).any():
+            m.codigos[:] = np.where((linhas >= 0)[:, None], self.codigos[linhas], 0)
+        return m
+
+    def gravar_codigos(self, cids, dias, codigos):
+        """Grava códigos já numéricos; 'dias' = deslocamento em dias a partir de inicio. Fora da matriz é ignorado."""
+        linhas = self._linhas.get_indexer(np.asarray(cids, dtype=np.int64))
+        dias = np.asarray(dias, dtype=np.int64)
+        ok = (linhas >= 0) & (dias >= 0) & (dias < self.codigos.shape[1])
+        self.codigos[linhas[ok], dias[ok]] = np.asarray(codigos, dtype=np.int8)[ok]
+
+    def gravar(self, cids, datas, status):
+        """Grava status ("" apaga) por (colaborador, data); datas como date ou ISO."""
+        if len(cids) == 0:
+            return
+        dias = (np.asarray(list(datas), dtype="datetime64[D]")
+                - np.datetime64(self.inicio, "D")).astype(np.int64)
+        self.gravar_codigos(cids, dias, self.codigos_de(status))
+
+    def para_dict(self, ids=None, inicio: date | None = None,
+                  fim: date | None = None) -> Dict[Tuple[int, str], str]:
+        """Formato de carregar_presencas (só células com status), opcionalmente recortado."""
+        ids = self.ids if ids is None else np.asarray(list(ids), dtype=np.int64)
+        linhas = self._linhas.get_indexer(ids)
+        ids, linhas = ids[linhas >= 0], linhas[linhas >= 0]
+        j0 = 0 if inicio is None else max((inicio - self.inicio).days, 0)
+        j1 = self.codigos.shape[1] if fim is None else min((fim - self.inicio).days + 1, self.codigos.shape[1])
+        bloco = self.codigos[linhas, j0:j1]
+        i, j = np.nonzero(bloco)
+        isos = [d.isoformat() for d in self.datas[j0:j1]]
+        return {(int(ids[a]), isos[b]): self.rotulos[c] for a, b, c in zip(i, j, bloco[i, j])}
+
+    def para_grade(self, df_cols: pd.DataFrame, fixas=("Colaborador", "Setor", "Turno"),
+                   indice_por_id: bool = True) -> pd.DataFrame:
+        """
+        Grade do editor: colunas fixas (de df_cols: nome, setor, turno) e uma
+        coluna ISO de strings por dia, só agora expandidas a partir dos códigos.
+        """
+        linhas = self._linhas.get_indexer(df_cols["id"].to_numpy(dtype=np.int64))
+        codigos = np.where((linhas >= 0)[:, None], self.codigos[linhas], 0)
+        origem = {"Colaborador": "nome", "Setor": "setor", "Turno": "turno"}
+        fixas_df = pd.DataFrame({c: df_cols[origem[c]].tolist() for c in fixas}, dtype="object")
+        dias = pd.DataFrame(np.asarray(self.rotulos, dtype=object)[codigos],
+                            columns=[d.isoformat() for d in self.datas])
+        grade = pd.concat([fixas_df, dias], axis=1)
+        if indice_por_id:
+            grade.index = pd.Index(df_cols["id"].tolist(), name="id")
+        return grade
+
+# ------------------------------
+# Camada de dados (Postgres)
+# ------------------------------
+@instrumentado
+@armazenavel
+def get_or_create_leader(nome: str, setor: str, turno: str) -> int:
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            "SELECT id FROM public.leaders WHERE nome=%s AND setor=%s AND turno=%s",
+            (nome.strip(), setor, turno)
+        )
+        row = cur.fetchone()
+        if row:
+            return int(row[0])  # <-- r[0] em vez de row["id"]
+
+        cur.execute(
+            "INSERT INTO public.leaders (nome, setor, turno) VALUES (%s, %s, %s) RETURNING id",
+            (nome.strip(), setor, turno),
+        )
+        new_id = cur.fetchone()[0]  # <-- índice 0
+        cn.commit()
+    return int(new_id)
+
+
+# ------------------------------
+# Cache de colaboradores (compartilhado entre sessões)
+# ------------------------------
+CACHE_COLABORADORES_TTL = float(os.getenv("CACHE_COLABORADORES_TTL", "300"))
+
+class CacheColaboradores:
+    """
+    Cache das listas de colaboradores por (setor, turno, somente_ativos).
+    turno=None representa a lista do setor inteiro e setor=None a lista geral.
+    Cada escrita invalida só as chaves afetadas; o TTL limita a defasagem
+    em relação a outros processos/réplicas. Cada chave tem uma geração,
+    incrementada na invalidação: uma leitura que estava em andamento quando
+    a chave foi invalidada não é guardada (seria a lista de antes da escrita).
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._dados: Dict[Tuple, Tuple[float, pd.DataFrame]] = {}
+        self._geracoes: Dict[Tuple, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+
+    def obter(self, chave: Tuple, carregar) -> pd.DataFrame:
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is not None and time.monotonic() - item[0] < self.ttl:
+                self.hits += 1
+                return item[1].copy()
+            self.misses += 1
+            geracao = self._geracoes.setdefault(chave, 0)
+        df = carregar()
+        with self._lock:
+            if self._geracoes.get(chave) == geracao:
+                self._dados[chave] = (time.monotonic(), df)
+        return df.copy()
+
+    def invalidar(self, pares) -> int:
+        """Remove as chaves afetadas por escritas em cada (setor, turno); turno=None = setor inteiro."""
+        removidas = 0
+        with self._lock:
+            for setor, turno in pares:
+                for chave in list(self._geracoes):
+                    c_setor, c_turno, _ = chave
+                    if (c_setor is None
+                            or (c_setor == setor and (turno is None or c_turno is None or c_turno == turno))):
+                        self._geracoes[chave] += 1
+                        if self._dados.pop(chave, None) is not None:
+                            removidas += 1
+            self.invalidacoes += removidas
+        return removidas
+
+    def limpar(self):
+        with self._lock:
+            self.invalidacoes += len(self._dados)
+            self._dados.clear()
+            for chave in self._geracoes:
+                self._geracoes[chave] += 1
+
+    def estatisticas(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._dados),
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": (self.hits / total) if total else 0.0,
+                "invalidacoes": self.invalidacoes,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def _cache_colaboradores() -> CacheColaboradores:
+    return CacheColaboradores(ttl=CACHE_COLABORADORES_TTL)
+
+
+@instrumentado
+@armazenavel
+def _ler_colaboradores(setor: str | None, turno: str | None, somente_ativos: bool) -> pd.DataFrame:
+    query = "SELECT id, nome, setor, turno, ativo FROM public.colaboradores WHERE true"
+    params = []
+    if setor is not None:
+        query += " AND setor=%s"
+        params.append(setor)
+    if turno is not None:
+        query += " AND turno=%s"
+        params.append(turno)
+    if somente_ativos:
+        query += " AND ativo=true"
+    with conexao() as cn:
+        return pd.read_sql(query, cn, params=params)
+
+
+def _listar_cacheado(setor: str | None, turno: str | None, somente_ativos) -> pd.DataFrame:
+    chave = (setor, turno, bool(somente_ativos))
+    return _cache_colaboradores().obter(chave, lambda: _ler_colaboradores(*chave))
+
+
+@instrumentado
+def listar_colaboradores(setor: str, turno: str, somente_ativos=True) -> pd.DataFrame:
+    return _listar_cacheado(setor, turno, somente_ativos)
+
+@instrumentado
+def listar_colaboradores_por_setor(setor: str, somente_ativos=True) -> pd.DataFrame:
+    return _listar_cacheado(setor, None, somente_ativos)
+
+@instrumentado
+def listar_colaboradores_setor_turno(setor: str, turno: str, somente_ativos=True) -> pd.DataFrame:
+    return _listar_cacheado(setor, turno, somente_ativos)
+
+@instrumentado
+def listar_todos_colaboradores(somente_ativos: bool = False) -> pd.DataFrame:
+    return _listar_cacheado(None, None, somente_ativos)
+
+@instrumentado
+@armazenavel
+def adicionar_colaborador(nome: str, setor: str, turno: str):
+    turno = normaliza_turno(turno)
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO public.colaboradores (nome, setor, turno, ativo) VALUES (%s, %s, %s, true)",
+            (nome.strip(), setor, turno),
+        )
+        cn.commit()
+    _cache_colaboradores().invalidar([(setor, turno)])
+
+@instrumentado
+@armazenavel
+def atualizar_turno_colaborador(colab_id: int, novo_turno: str):
+    novo_turno = normaliza_turno(novo_turno)
+    with conexao() as cn, cn.cursor() as cur:
+        # o self-join devolve o turno anterior para invalidar as duas listas
+        cur.execute(
+            """
+            UPDATE public.colaboradores c SET turno=%s
+              FROM public.colaboradores antes
+             WHERE c.id=%s AND antes.id=c.id
+            RETURNING c.setor, antes.turno
+            """,
+            (novo_turno, colab_id),
+        )
+        row = cur.fetchone()
+        cn.commit()
+    if row:
+        _cache_colaboradores().invalidar([(row[0], row[1]), (row[0], novo_turno)])
+
+@instrumentado
+@armazenavel
+def upsert_colaborador_turno(nome: str, setor: str, turno: str):
+    turno = normaliza_turno(turno)
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute("SELECT id, turno FROM public.colaboradores WHERE nome=%s AND setor=%s", (nome.strip(), setor))
+        row = cur.fetchone()
+        if row:
+            cur.execute("UPDATE public.colaboradores SET turno=%s, ativo=true WHERE id=%s", (turno, int(row[0])))  # r[0]
+        else:
+            cur.execute(
+                "INSERT INTO public.colaboradores (nome, setor, turno, ativo) VALUES (%s, %s, %s, true)",
+                (nome.strip(), setor, turno),
+            )
+        cn.commit()
+    _cache_colaboradores().invalidar([(setor, turno)] + ([(setor, row[1])] if row else []))
+
+
+@instrumentado
+@armazenavel
+def atualizar_ativo_colaboradores(ids_para_inativar: List[int], ids_para_ativar: List[int]):
+    afetados = []
+    with conexao() as cn, cn.cursor() as cur:
+        if ids_para_inativar:
+            cur.execute("UPDATE public.colaboradores SET ativo=false WHERE id = ANY(%s) RETURNING setor, turno",
+                        (ids_para_inativar,))
+            afetados += cur.fetchall()
+        if ids_para_ativar:
+            cur.execute("UPDATE public.colaboradores SET ativo=true  WHERE id = ANY(%s) RETURNING setor, turno",
+                        (ids_para_ativar,))
+            afetados += cur.fetchall()
+        cn.commit()
+    _cache_colaboradores().invalidar(set(afetados))
+
+@instrumentado
+@armazenavel
+def carregar_presencas(colab_ids: List[int], inicio: date, fim: date) -> Dict[Tuple[int, str], str]:
+    if not colab_ids:
+        return {}
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT colaborador_id, data, status
+              FROM {ORIGEM_PRESENCAS}
+             WHERE colaborador_id = ANY(%s)
+            """,
+            (inicio, fim, colab_ids),
+        )
+        rows = cur.fetchall()
+    # r[0]=colaborador_id, r[1]=data (date), r[2]=status
+    return {(int(r[0]), r[1].isoformat()): (r[2] or "") for r in rows}
+
+
+@instrumentado
+@armazenavel
+def carregar_matriz(colab_ids: List[int], inicio: date, fim: date) -> MatrizPresencas:
+    """
+    Como carregar_presencas, mas direto para a MatrizPresencas: o banco já
+    devolve (colaborador, dia, código) numéricos; só status fora de
+    STATUS_OPCOES vêm como texto.
+    """
+    matriz = MatrizPresencas(colab_ids, inicio, fim)
+    if not len(matriz.ids):
+        return matriz
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT p.colaborador_id, p.data - %s,
+                   coalesce(array_position(%s::text[], p.status) - 1, 0),
+                   CASE WHEN array_position(%s::text[], p.status) IS NULL THEN p.status END
+              FROM {ORIGEM_PRESENCAS}
+             WHERE p.colaborador_id = ANY(%s)
+            """,
+            (inicio, STATUS_OPCOES, STATUS_OPCOES, inicio, fim, matriz.ids.tolist()),
+        )
+        df = pd.DataFrame(cur.fetchall(), columns=["colaborador_id", "dia", "codigo", "outro"])
+    outros = df["outro"].notna()
+    if outros.any():
+        df.loc[outros, "codigo"] = matriz.codigos_de(df.loc[outros, "outro"])
+    matriz.gravar_codigos(df["colaborador_id"], df["dia"], df["codigo"])
+    return matriz
+
+
+# ------------------------------
+# Cache de presenças do período (por sessão)
+# ------------------------------
+# O lançamento diário busca o período 16..15 inteiro do setor numa consulta e
+# serve a troca de dia da memória da sessão. Depois de salvar, só as linhas
+# com updated_at (ou created_at) posterior à última leitura são relidas.
+# Os períodos de férias/afastamento/atestado do setor vêm junto, na mesma
+# leitura, e são relidos quando um salvamento apaga células (pode recortá-los).
+CACHE_PERIODO_TTL = float(os.getenv("CACHE_PERIODO_TTL", "300"))
+# folga na marca de tempo: pega gravações de transações que já estavam abertas na leitura
+FOLGA_INCREMENTAL = timedelta(seconds=60)
+
+
+def _cache_periodo() -> dict:
+    return st.session_state.setdefault("cache_periodo", {})
+
+
+def _carregar_periodo(setor: str, ids: List[int], ref: date) -> dict:
+    inicio, fim = periodo_por_data(ref)
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute("SELECT now()")
+        marca = cur.fetchone()[0]
+    entrada = {"ids": set(ids), "inicio": inicio, "fim": fim, "marca": marca,
+               "lido_em": time.monotonic(), "matriz": carregar_matriz(ids, inicio, fim),
+               "periodos": listar_periodos_colaboradores(ids, inicio, fim)}
+    _cache_periodo()[(setor, inicio)] = entrada
+    return entrada
+
+
+def _entrada_periodo(setor: str, ids: List[int], dia: date) -> dict:
+    """Período de 'dia' no cache; relê o setor inteiro se faltar, expirou ou não cobre 'ids'."""
+    entrada = _cache_periodo().get((setor, periodo_por_data(dia)[0]))
+    if (entrada is None
+            or not set(ids) <= entrada["ids"]
+            or time.monotonic() - entrada["lido_em"] > CACHE_PERIODO_TTL):
+        todos = listar_colaboradores_por_setor(setor, somente_ativos=True)["id"].tolist()
+        entrada = _carregar_periodo(setor, sorted(set(todos) | set(ids)), dia)
+    return entrada
+
+
+@instrumentado
+@armazenavel
+def presencas_do_dia(setor: str, ids: List[int], dia: date) -> Dict[Tuple[int, str], str]:
+    """Mesmo formato de carregar_presencas(ids, dia, dia), servido do cache do período."""
+    res = _entrada_periodo(setor, ids, dia)["matriz"].para_dict(ids, dia, dia)
+    fila = _fila_gravacoes()
+    if fila is not None:
+        # o que ainda está na fila do servidor do app vale por cima do banco
+        for chave, status in fila.pendentes(ids, dia, dia).items():
+            if status:
+                res[chave] = status
+            else:
+                res.pop(chave, None)
+    return res
+
+
+@instrumentado
+@armazenavel
+def matriz_do_periodo(setor: str, ids: List[int], ref: date) -> MatrizPresencas:
+    """Período 16..15 de 'ref' com as linhas na ordem de 'ids', servido do cache do período."""
+    matriz = _entrada_periodo(setor, ids, ref)["matriz"].recorte(ids)
+    fila = _fila_gravacoes()
+    if fila is not None:
+        pendentes = fila.pendentes(ids, matriz.inicio, matriz.fim)
+        if pendentes:
+            cids, isos = zip(*pendentes.keys())
+            matriz.gravar(cids, isos, list(pendentes.values()))
+    return matriz
+
+
+@instrumentado
+@armazenavel
+def afastamentos_do_periodo(setor: str, ids: List[int], inicio: date, fim: date) -> pd.DataFrame:
+    """
+    Mesmo formato de listar_periodos_colaboradores(ids, inicio, fim), servido
+    do cache do período de 'inicio' ([inicio, fim] dentro de um período 16..15).
+    """
+    periodos = _entrada_periodo(setor, ids, inicio)["periodos"]
+    return periodos[periodos["colaborador_id"].isin(ids)
+                    & (periodos["inicio"] <= fim) & (periodos["fim"] >= inicio)].reset_index(drop=True)
+
+
+@instrumentado
+@armazenavel
+def atualizar_cache_periodo(setor: str, dia: date, gravadas: pd.DataFrame):
+    """
+    Atualiza o período em cache depois de salvar: relê só as linhas alteradas
+    desde a última leitura (updated_at/created_at) e, para as células apagadas
+    — que não aparecem nessa consulta —, o dia do período de férias/afastamento
+    que volta a valer, se houver.
+    """
+    entrada = _cache_periodo().get((setor, periodo_por_data(dia)[0]))
+    if entrada is None:
+        return
+    ids, inicio, fim = sorted(entrada["ids"]), entrada["inicio"], entrada["fim"]
+    apagadas = gravadas[gravadas["status"] == ""]
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute("SELECT now()")
+        marca = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT colaborador_id, data, status
+              FROM public.presencas
+             WHERE colaborador_id = ANY(%s) AND data BETWEEN %s AND %s
+               AND coalesce(updated_at, created_at) > %s
+            """,
+            (ids, inicio, fim, entrada["marca"] - FOLGA_INCREMENTAL),
+        )
+        alteradas = cur.fetchall()
+        restauradas = []
+        if not apagadas.empty:
+            cur.execute(
+                """
+                SELECT colaborador_id, data, status
+                  FROM public.presencas_periodos_dias(%s, %s)
+                 WHERE (colaborador_id, data) IN (
+                       SELECT * FROM unnest(%s::bigint[], %s::date[]))
+                """,
+                (inicio, fim, apagadas["colaborador_id"].astype(int).tolist(), apagadas["data"].tolist()),
+            )
+            restauradas = cur.fetchall()
+
+    matriz = entrada["matriz"]
+    matriz.gravar(apagadas["colaborador_id"].tolist(), apagadas["data"].tolist(), [""] * len(apagadas))
+    for linhas in (restauradas, alteradas):
+        if linhas:
+            cids, datas, status = zip(*linhas)
+            matriz.gravar(cids, datas, status)
+    if not apagadas.empty:
+        entrada["periodos"] = listar_periodos_colaboradores(ids, inicio, fim)
+    entrada["marca"] = marca
+
+
+def registrar_no_cache_periodo(setor: str, dia: date, celulas: pd.DataFrame):
+    """Aplica ao período em cache células gravadas só na fila offline (o banco ainda não as tem)."""
+    entrada = _cache_periodo().get((setor, periodo_por_data(dia)[0]))
+    if entrada is None:
+        return
+    entrada["matriz"].gravar(celulas["colaborador_id"].tolist(), celulas["data"].tolist(),
+                             celulas["status"].tolist())
+
+
+def invalidar_cache_periodo():
+    """Descarta os períodos em cache (ex.: depois de gravar ou remover férias/afastamentos)."""
+    _cache_periodo().clear()
+
+
+def _grade_para_celulas(df_editado: pd.DataFrame, mapa_id_por_nome: Dict[str, int],
+                        setor: str, turno: str, ids=None) -> pd.DataFrame:
+    """
+    Converte a grade larga (Colaborador/Setor/Turno + uma coluna por data) em
+    células longas: colaborador_id, data, status, setor, turno — já com o
+    setor sobrescrito pelos status "SIN_*".
+    'ids' (alinhado às linhas) tem precedência sobre o mapa por nome.
+    """
+    date_cols = [c for c in df_editado.columns if c not in ("Colaborador", "Setor", "Turno")]
+    if ids is None:
+        ids = df_editado["Colaborador"].map(mapa_id_por_nome)
+    melt = df_editado.assign(colaborador_id=list(ids)).melt(
+        id_vars=[c for c in ("Colaborador", "Setor", "Turno") if c in df_editado.columns] + ["colaborador_id"],
+        value_vars=date_cols,
+        var_name="data",
+        value_name="status"
+    )
+
+    melt["colaborador_id"] = pd.to_numeric(melt["colaborador_id"], errors="coerce")
+    melt = melt.dropna(subset=["colaborador_id"])
+
+    status = melt["status"].fillna("").astype(str).str.strip()
+    setor_base = melt["Setor"].fillna(setor) if "Setor" in melt.columns else pd.Series(setor, index=melt.index)
+    turno_base = melt["Turno"].fillna(turno) if "Turno" in melt.columns else pd.Series(turno, index=melt.index)
+
+    return pd.DataFrame({
+        "colaborador_id": melt["colaborador_id"].astype("int64"),
+        "data": pd.to_datetime(melt["data"]).dt.date,
+        "status": status,
+        "setor": status.map(SIN_TO_SETOR).fillna(setor_base),
+        "turno": turno_base,
+    })
+
+
+def _recortar_periodos(linhas) -> Tuple[List[int], List[tuple]]:
+    """
+    Tira dias apagados de períodos (férias/afastamento/atestado). 'linhas' traz
+    uma tupla (id, colaborador_id, inicio, fim, status, setor, turno,
+    leader_nome, dia) por dia apagado dentro de um período. Devolve os ids dos
+    períodos a remover e os pedaços que sobram de cada um, como
+    (colaborador_id, inicio, fim, status, setor, turno, leader_nome).
+    """
+    por_id: Dict[int, Tuple[tuple, set]] = {}
+    for pid, *dados, dia in linhas:
+        por_id.setdefault(int(pid), (tuple(dados), set()))[1].add(dia)
+    pedacos = []
+    for (cid, inicio, fim, *resto), dias in por_id.values():
+        for d in sorted(dias):
+            if d > inicio:
+                pedacos.append((cid, inicio, d - timedelta(days=1), *resto))
+            inicio = d + timedelta(days=1)
+        if inicio <= fim:
+            pedacos.append((cid, inicio, fim, *resto))
+    return list(por_id), pedacos
+
+
+def _gravar_celulas(cur, celulas: pd.DataFrame, leader_nome: str) -> Dict[str, int]:
+    """
+    Grava as células com um número constante de comandos (DELETE e INSERT ...
+    ON CONFLICT sobre arrays), independente do tamanho da grade.
+    Célula apagada ("") num dia coberto por um período de férias/afastamento/
+    atestado — sem marcação diária por cima, ou com a mesma do período — tira
+    esse dia do período (que é dividido ou encurtado); uma marcação diária
+    diferente apagada volta a mostrar o período, como antes.
+    Não faz commit: quem chama controla a transação.
+    """
+    res = {"inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0}
+    if celulas.empty:
+        return res
+    # a mesma (colaborador, data) duas vezes no lote: vale a última
+    celulas = celulas.drop_duplicates(subset=["colaborador_id", "data"], keep="last")
+
+    remover = celulas[celulas["status"] == ""]
+    gravar = celulas[celulas["status"] != ""]
+
+    if not remover.empty:
+        chaves = (remover["colaborador_id"].tolist(), remover["data"].tolist())
+        cur.execute(
+            """
+            SELECT r.id, r.colaborador_id, lower(r.periodo), upper(r.periodo) - 1,
+                   r.status, r.setor, r.turno, r.leader_nome, u.data, p.status IS NULL
+              FROM unnest(%s::bigint[], %s::date[]) AS u(colaborador_id, data)
+              JOIN public.presencas_periodos r
+                ON r.colaborador_id = u.colaborador_id AND r.periodo @> u.data
+              LEFT JOIN public.presencas p
+                ON p.colaborador_id = u.colaborador_id AND p.data = u.data
+             WHERE p.status IS NULL OR p.status = r.status
+               FOR UPDATE OF r
+            """,
+            chaves,
+        )
+        cortes = cur.fetchall()
+        ids, pedacos = _recortar_periodos([c[:9] for c in cortes])
+        if ids:
+            cur.execute("DELETE FROM public.presencas_periodos WHERE id = ANY(%s)", (ids,))
+        if pedacos:
+            cur.execute(
+                """
+                INSERT INTO public.presencas_periodos (colaborador_id, periodo, status, setor, turno, leader_nome)
+                SELECT u.colaborador_id, daterange(u.inicio, u.fim, '[]'), u.status, u.setor, u.turno, u.leader_nome
+                  FROM unnest(%s::bigint[], %s::date[], %s::date[], %s::text[], %s::text[], %s::text[], %s::text[])
+                       AS u(colaborador_id, inicio, fim, status, setor, turno, leader_nome)
+                """,
+                tuple(map(list, zip(*pedacos))),
+            )
+        cur.execute(
+            """
+            DELETE FROM public.presencas
+             WHERE (colaborador_id, data) IN (
+                   SELECT * FROM unnest(%s::bigint[], %s::date[]))
+            """,
+            chaves,
+        )
+        # dia só do período conta como removido; com marcação igual por cima, já contou no DELETE
+        res["removidos"] = cur.rowcount + sum(1 for c in cortes if c[9])
+        res["inalterados"] += len(remover) - res["removidos"]
+
+    if not gravar.empty:
+        cur.execute(
+            """
+            INSERT INTO public.presencas
+              (colaborador_id, data, status, setor, turno, leader_nome, created_at, updated_at)
+            SELECT u.colaborador_id, u.data, u.status, u.setor, u.turno, %s, now(), now()
+              FROM unnest(%s::bigint[], %s::date[], %s::text[], %s::text[], %s::text[])
+                   AS u(colaborador_id, data, status, setor, turno)
+            ON CONFLICT (colaborador_id, data) DO UPDATE
+              SET status      = EXCLUDED.status,
+                  setor       = EXCLUDED.setor,
+                  turno       = EXCLUDED.turno,
+                  leader_nome = EXCLUDED.leader_nome,
+                  updated_at  = now()
+              -- só atualiza se houve mudança de algum campo relevante
+              WHERE presencas.status IS DISTINCT FROM EXCLUDED.status
+                 OR presencas.setor  IS DISTINCT FROM EXCLUDED.setor
+                 OR presencas.turno  IS DISTINCT FROM EXCLUDED.turno
+            RETURNING (xmax = 0) AS inserido
+            """,
+            (
+                leader_nome,
+                gravar["colaborador_id"].tolist(),
+                gravar["data"].tolist(),
+                gravar["status"].tolist(),
+                gravar["setor"].tolist(),
+                gravar["turno"].tolist(),
+            ),
+        )
+        afetadas = cur.fetchall()
+        inseridos = sum(1 for r in afetadas if r[0])
+        res["inseridos"] = inseridos
+        res["atualizados"] = len(afetadas) - inseridos
+        res["inalterados"] += len(gravar) - len(afetadas)
+
+    return res
+
+
+def celulas_alteradas(celulas: pd.DataFrame, anteriores: Dict[Tuple[int, str], str]) -> pd.DataFrame:
+    """
+    Compara as células da grade com o snapshot de carregar_presencas e
+    devolve só as que mudaram (coluna extra 'status_anterior').
+    Célula vazia sem registro anterior não é mudança.
+    """
+    chaves = zip(celulas["colaborador_id"].tolist(), [d.isoformat() for d in celulas["data"]])
+    antes = pd.Series([anteriores.get(k, "") for k in chaves], index=celulas.index, dtype="object")
+    out = celulas.assign(status_anterior=antes)
+    return out[out["status"] != out["status_anterior"]]
+
+
+def celulas_alteradas_periodo(grade: pd.DataFrame, matriz: MatrizPresencas,
+                              df_cols: pd.DataFrame) -> pd.DataFrame:
+    """
+    Equivalente a _grade_para_celulas + celulas_alteradas para a grade do
+    período: compara os códigos da grade (linhas alinhadas a df_cols e a
+    matriz.ids) com a matriz carregada e só monta as células que mudaram.
+    Setor e turno gravados são os do cadastro (o setor do SIN, se for o caso).
+    """
+    novos = matriz.codigos_da_grade(grade)
+    i, j = np.nonzero(novos != matriz.codigos)
+    rotulos = np.asarray(matriz.rotulos, dtype=object)
+    status = pd.Series(rotulos[novos[i, j]], dtype="object")
+    return pd.DataFrame({
+        "colaborador_id": matriz.ids[i],
+        "data": np.asarray(matriz.datas, dtype=object)[j],
+        "status": status,
+        "setor": status.map(SIN_TO_SETOR).fillna(pd.Series(df_cols["setor"].to_numpy()[i], dtype="object")),
+        "turno": df_cols["turno"].to_numpy()[i],
+        "status_anterior": rotulos[matriz.codigos[i, j]],
+    })
+
+
+@instrumentado
+@armazenavel
+def salvar_celulas(celulas: pd.DataFrame, leader_nome: str) -> Dict[str, int]:
+    """Grava células longas (ver _grade_para_celulas) em uma única transação."""
+    with conexao() as cn, cn.cursor() as cur:
+        res = _gravar_celulas(cur, celulas, leader_nome)
+        cn.commit()
+    _versoes_dados().marcar(celulas["data"].unique())
+    return res
+
+
+@instrumentado
+def salvar_presencas(df_editado: pd.DataFrame, mapa_id_por_nome: Dict[str, int],
+                     inicio: date, fim: date, setor: str, turno: str, leader_nome: str,
+                     anteriores: Dict[Tuple[int, str], str] | None = None) -> Dict[str, int]:
+    """
+    Salva as presenças do período. Se o status for um dos "SIN_*",
+    o setor gravado para aquele dia é sobrescrito pelo setor do SIN.
+    O turno gravado, se existir a coluna 'Turno' na grade, vem da própria linha;
+    caso contrário, usa o turno selecionado no topo (parâmetro 'turno').
+    Se 'anteriores' (snapshot de carregar_presencas) for informado, grava
+    apenas as células cujo status mudou.
+    Tudo em uma transação; retorna as contagens de inseridos, atualizados,
+    removidos e inalterados.
+    """
+    celulas = _grade_para_celulas(df_editado, mapa_id_por_nome, setor, turno)
+    ignoradas = 0
+    if anteriores is not None:
+        total = len(celulas)
+        celulas = celulas_alteradas(celulas, anteriores)
+        ignoradas = total - len(celulas)
+    res = salvar_celulas(celulas, leader_nome)
+    res["inalterados"] += ignoradas
+    return res
+
+@instrumentado
+def aplicar_status_em_periodo(
+    colab_ids: List[int],
+    df_cols: pd.DataFrame,
+    inicio: date,
+    fim: date,
+    status: str,
+    setor: str,
+    turno_selecao: str,
+    leader_nome: str,
+) -> Dict[str, int]:
+    """
+    Aplica 'status' de inicio a fim para os colaboradores (por id). Cada um
+    grava o próprio turno, vindo de df_cols; 'turno_selecao' só vale para
+    quem não estiver lá.
+    """
+    if not colab_ids:
+        return {"inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0}
+
+    ids = [int(c) for c in colab_ids]
+    turnos_por_id = dict(zip(df_cols["id"].astype("int64"), df_cols["turno"]))
+    turnos = [turnos_por_id.get(cid) or turno_selecao for cid in ids]
+
+    if status in STATUS_PERIODO:
+        return aplicar_periodo(ids, inicio, fim, status, setor, turnos, leader_nome or "")
+
+    dias = datas_do_periodo(inicio, fim)
+    df = pd.DataFrame({"Setor": [setor] * len(ids), "Turno": turnos})
+    df = df.assign(**{d.isoformat(): status for d in dias})
+    reportar_progresso(f"Gravando {len(dias)} dia(s) para {len(ids)} colaborador(es)…")
+
+    return salvar_celulas(_grade_para_celulas(df, {}, setor, turno_selecao, ids=ids), leader_nome or "")
+
+ERRO_PERIODO_SOBREPOSTO = ("Já existe férias/afastamento/atestado sobreposto a este período "
+                           "para algum dos colaboradores selecionados.")
+
+@instrumentado
+@armazenavel
+def aplicar_periodo(colab_ids: List[int], inicio: date, fim: date, status: str,
+                    setor: str, turnos: List[str], leader_nome: str) -> Dict[str, int]:
+    """
+    Grava o status como intervalo: uma linha por colaborador em presencas_periodos,
+    qualquer que seja o tamanho do período, com o turno de cada um ('turnos',
+    alinhado a 'colab_ids'). Marcações diárias com o mesmo status
+    dentro do intervalo ficam redundantes e são removidas; as demais continuam
+    valendo por cima do período. Sobreposição com outro período do mesmo
+    colaborador é barrada pela constraint de exclusão.
+    """
+    if status not in STATUS_PERIODO:
+        raise ValueError(f"Status {status!r} não é gravado como período.")
+    if fim < inicio:
+        raise ValueError("O fim do período é anterior ao início.")
+    if not colab_ids:
+        return {"inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0}
+    if len(turnos) != len(colab_ids):
+        raise ValueError("'turnos' deve ter um turno por colaborador.")
+    with conexao() as cn, cn.cursor() as cur:
+        try:
+            cur.execute(
+                """
+                INSERT INTO public.presencas_periodos (colaborador_id, periodo, status, setor, turno, leader_nome)
+                SELECT u.id, daterange(%s, %s, '[]'), %s, %s, u.turno, %s
+                  FROM unnest(%s::bigint[], %s::text[]) AS u(id, turno)
+                """,
+                (inicio, fim, status, setor, leader_nome, list(colab_ids), list(turnos)),
+            )
+        except Exception as e:
+            if getattr(e, "pgcode", None) == "23P01":  # exclusion_violation
+                raise ValueError(ERRO_PERIODO_SOBREPOSTO) from e
+            raise
+        inseridos = cur.rowcount
+        cur.execute(
+            "DELETE FROM public.presencas WHERE colaborador_id = ANY(%s) AND data BETWEEN %s AND %s AND status = %s",
+            (list(colab_ids), inicio, fim, status),
+        )
+        removidos = cur.rowcount
+        cn.commit()
+    _versoes_dados().marcar(datas_do_periodo(inicio, fim))
+    return {"inseridos": inseridos, "atualizados": 0, "removidos": removidos, "inalterados": 0}
+
+
+@instrumentado
+@armazenavel
+def listar_periodos_colaboradores(colab_ids: List[int], inicio: date, fim: date) -> pd.DataFrame:
+    """Períodos (férias/afastamento/atestado) dos colaboradores que tocam [inicio, fim]."""
+    if not colab_ids:
+        return pd.DataFrame(columns=["id", "colaborador_id", "inicio", "fim", "status"])
+    with conexao() as cn:
+        return pd.read_sql(
+            """
+            SELECT id, colaborador_id, lower(periodo) AS inicio, upper(periodo) - 1 AS fim, status
+              FROM public.presencas_periodos
+             WHERE colaborador_id = ANY(%s) AND periodo && daterange(%s, %s, '[]')
+             ORDER BY colaborador_id, lower(periodo)
+            """,
+            cn,
+            params=[list(map(int, colab_ids)), inicio, fim],
+        )
+
+
+@instrumentado
+@armazenavel
+def remover_periodos(periodo_ids: List[int]) -> int:
+    if not periodo_ids:
+        return 0
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM public.presencas_periodos WHERE id = ANY(%s) RETURNING lower(periodo), upper(periodo) - 1",
+            (list(map(int, periodo_ids)),),
+        )
+        intervalos = cur.fetchall()
+        cn.commit()
+    for inicio, fim in intervalos:
+        _versoes_dados().marcar(datas_do_periodo(inicio, fim))
+    return len(intervalos)
+
+# ------------------------------
+# Relatórios (consulta paginada por keyset)
+# ------------------------------
+COLUNAS_RELATORIO = ["colaborador", "data", "status", "setor", "turno", "leader_nome"]
+
+def _filtros_relatorio(dt_ini: date, dt_fim: date, setor: str | None, turno: str | None) -> Tuple[str, list]:
+    where = "p.data BETWEEN %s AND %s"
+    params: list = [dt_ini, dt_fim]
+    if setor:
+        where += " AND p.setor = %s"
+        params.append(setor)
+    if turno:
+        where += " AND p.turno = %s"
+        params.append(turno)
+    return where, params
+
+
+@instrumentado
+@armazenavel
+def contar_relatorio(dt_ini: date, dt_fim: date, setor: str | None = None, turno: str | None = None) -> int:
+    where, params = _filtros_relatorio(dt_ini, dt_fim, setor, turno)
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {ORIGEM_PRESENCAS} WHERE {where}", [dt_ini, dt_fim] + params)
+        return int(cur.fetchone()[0])
+
 
-    if ok:
-        allowed = _allowed_emails()
-        if email in allowed:
-            st.session_state["auth"] = True
-            st.session_state["user_email"] = email
-            st.success("Acesso liberado!")
-            st.rerun()
-        else:
-            st.error("E-mail não autorizado.")
-    st.stop()
+@instrumentado
+@armazenavel
+def relatorio_pagina(dt_ini: date, dt_fim: date, setor: str | None = None, turno: str | None = None,
+                     apos: Tuple | None = None, tamanho: int = 100) -> Tuple[pd.DataFrame, Tuple | None]:
+    """
+    Uma página do relatório, ordenada por (setor, turno, nome, id, data).
+    'apos' é a chave da última linha da página anterior (None = primeira página).
+    Retorna (página, chave para a próxima página ou None se for a última).
+    """
+    where, params = _filtros_relatorio(dt_ini, dt_fim, setor, turno)
+    if apos is not None:
+        where += " AND (p.setor, p.turno, c.nome, p.colaborador_id, p.data) > (%s, %s, %s, %s, %s)"
+        params += list(apos)
+    with conexao() as cn:
+        df = pd.read_sql(
+            f"""
+            SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome,
+                   p.colaborador_id
+              FROM {ORIGEM_PRESENCAS} JOIN public.colaboradores c ON c.id = p.colaborador_id
+             WHERE {where}
+             ORDER BY p.setor, p.turno, c.nome, p.colaborador_id, p.data
+             LIMIT %s
+            """,
+            cn,
+            params=[dt_ini, dt_fim] + params + [int(tamanho) + 1],
+        )
+    proxima = None
+    if len(df) > tamanho:
+        df = df.iloc[:tamanho]
+        u = df.iloc[-1]
+        proxima = (u["setor"], u["turno"], u["colaborador"], int(u["colaborador_id"]), u["data"])
+    return df[COLUNAS_RELATORIO], proxima
+
+@instrumentado
+@armazenavel
+def carregar_resumo(dt_ini: date, dt_fim: date, setor: str | None = None, turno: str | None = None) -> pd.DataFrame:
+    """
+    Contagens por (data, setor, turno, status) lidas da tabela de resumo — sem
+    varrer presencas — somadas aos dias dos períodos (férias etc.) do intervalo.
+    """
+    where, params = _filtros_relatorio(dt_ini, dt_fim, setor, turno)
+    with conexao() as cn:
+        return pd.read_sql(
+            f"""
+            SELECT data, setor, turno, status, sum(qtd)::int AS qtd
+              FROM (
+                SELECT data, setor, turno, status, qtd
+                  FROM public.presencas_resumo p
+                 WHERE {where} AND qtd > 0
+                UNION ALL
+                SELECT data, setor, turno, status, count(*)
+                  FROM public.presencas_periodos_dias(%s, %s) p
+                 WHERE {where}
+                 GROUP BY data, setor, turno, status
+              ) t
+             GROUP BY data, setor, turno, status
+             ORDER BY data, setor, turno, status
+            """,
+            cn,
+            params=params + [dt_ini, dt_fim] + params,
+        )
 
 # ------------------------------
-# Banco (Postgres/Supabase) - Tabelas
+# Feed de alterações (sincronização incremental)
 # ------------------------------
-def init_db():
-    """Cria tabelas caso não existam (seguro para rodar várias vezes)."""
-    with get_conn() as cn, cn.cursor() as cur:
-        cur.execute("""
-        create table if not exists public.leaders (
-          id          bigserial primary key,
-          nome        varchar(200) not null,
-          setor       varchar(100) not null,
-          turno       varchar(20)  not null,
-          created_at  timestamptz  not null default now()
-        );
-        """)
-        cur.execute("""
-        create table if not exists public.colaboradores (
-          id          bigserial primary key,
-          nome        varchar(200) not null,
-          setor       varchar(100) not null,
-          turno       varchar(20)  not null,
-          ativo       boolean      not null default true,
-          created_at  timestamptz  not null default now()
-        );
-        """)
-        cur.execute("""
-        create table if not exists public.presencas (
-          id              bigserial primary key,
-          colaborador_id  bigint      not null,
-          data            date        not null,
-          status          varchar(20),
-          setor           varchar(100) not null,
-          turno           varchar(20)  not null,
-          leader_nome     varchar(200),
-          created_at      timestamptz  not null default now(),
-          updated_at      timestamptz,
-          constraint uq_presenca unique (colaborador_id, data),
-          constraint fk_presenca_colab
-            foreign key (colaborador_id) references public.colaboradores(id)
-        );
-        """)
-        cn.commit()
+COLUNAS_ALTERACOES = ["seq", "alterado_em", "origem", "operacao", "colaborador_id",
+                      "data", "ate", "status", "setor", "turno", "leader_nome"]
 
+def marca_alteracoes_atual() -> int:
+    """Marca d'água "agora": quem acabou de fazer uma carga completa começa daqui."""
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return int(cur.fetchone()[0])
 
-def _try_auto_import_seed():
-    caminhos = [
-        "Turno Colaboradores.xlsx",
-        "turnos.xlsx",
-        "turnos.csv",
-        "/mnt/data/Turno Colaboradores.xlsx",
-    ]
-    for p in caminhos:
-        try:
-            if os.path.exists(p):
-                with open(p, "rb") as f:
-                    importar_turnos_de_arquivo(f, setor_padrao=None)
-                break
-        except Exception:
-            pass
+
+@instrumentado
+def alteracoes_desde(marca: int = 0) -> Tuple[pd.DataFrame, int]:
+    """
+    Alterações em presenças (origem 'dia') e em períodos de férias/afastamento
+    (origem 'periodo', de data até ate) comitadas a partir da marca d'água.
+    operacao: I (inserido), U (alterado, valores novos) ou D (apagado, valores
+    antigos). Retorna (alterações em ordem de gravação, próxima marca).
+    """
+    proxima = marca_alteracoes_atual()
+    with conexao() as cn:
+        df = pd.read_sql(
+            f"""
+            SELECT {", ".join(COLUNAS_ALTERACOES)}
+              FROM public.presencas_alteracoes
+             WHERE xid >= %s::text::xid8 AND xid < %s::text::xid8
+             ORDER BY seq
+            """,
+            cn,
+            params=[str(int(marca)), str(proxima)],
+        )
+    return df, proxima
+
+
+@instrumentado
+def podar_alteracoes(manter_dias: int = 90) -> int:
+    """Apaga do feed as alterações mais antigas que 'manter_dias'."""
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM public.presencas_alteracoes WHERE alterado_em < now() - make_interval(days => %s)",
+            (int(manter_dias),),
+        )
+        n = cur.rowcount
+        cn.commit()
+    return n
 
 # ------------------------------
-# Utilitários de período (16..15)
+# Versões dos dados (invalidação das exportações)
 # ------------------------------
-MESES_PT = ["jan","fev","mar","abr","mai","jun","jul","ago","set","out","nov","dez"]
+# Um arquivo exportado é reaproveitado enquanto a versão do seu intervalo
+# não mudar. No Postgres a versão vem do feed presencas_alteracoes (maior
+# seq e nº de linhas que tocam o intervalo), então gravações de qualquer
+# processo/réplica a mudam — inclusive uma transação que pegou seq menor e
+# comitou depois (a contagem muda). No SQLite embutido (um processo só)
+# cada gravação carimba os dias com um contador crescente do processo.
+@instrumentado
+@armazenavel
+def versao_dados(inicio: date, fim: date) -> Tuple[int, int]:
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            "SELECT coalesce(max(seq), 0), count(*) FROM public.presencas_alteracoes "
+            "WHERE ate >= %s AND data <= %s",
+            (inicio, fim),
+        )
+        maior, n = cur.fetchone()
+    return int(maior), int(n)
 
-def periodo_por_data(ref: date) -> Tuple[date, date]:
-    if ref.day >= 16:
-        inicio = ref.replace(day=16)
-    else:
-        inicio = (ref.replace(day=1) - relativedelta(months=1)).replace(day=16)
-    fim = (inicio + relativedelta(months=1)).replace(day=15)
-    return inicio, fim
 
-def listar_periodos(n: int = 12) -> List[Tuple[str, date, date]]:
-    hoje = date.today()
-    inicio_atual, _ = periodo_por_data(hoje)
-    periodos = []
-    for i in range(n):
-        ini = inicio_atual - relativedelta(months=i)
-        fim = (ini + relativedelta(months=1)).replace(day=15)
-        rotulo = f"{ini.day} {MESES_PT[ini.month-1]} {ini.year} – {fim.day} {MESES_PT[fim.month-1]} {fim.year}"
-        periodos.append((rotulo, ini, fim))
-    return periodos
+class VersoesDados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contador = 0
+        self._por_dia: Dict[date, int] = {}
 
-def datas_do_periodo(inicio: date, fim: date) -> List[date]:
-    n = (fim - inicio).days + 1
-    return [inicio + timedelta(days=i) for i in range(n)]
+    def marcar(self, datas):
+        with self._lock:
+            self._contador += 1
+            for d in datas:
+                self._por_dia[pd.Timestamp(d).date()] = self._contador
 
-def data_minima_preenchimento(hoje: date | None = None) -> date:
-    h = hoje or date.today()
-    inicio, _ = periodo_por_data(h)
-    return inicio
+    def versao(self, inicio: date, fim: date) -> int:
+        with self._lock:
+            if (fim - inicio).days > len(self._por_dia):
+                return max((v for d, v in self._por_dia.items() if inicio <= d <= fim), default=0)
+            return max((self._por_dia.get(d, 0) for d in datas_do_periodo(inicio, fim)), default=0)
+
+
+@st.cache_resource(show_spinner=False)
+def _versoes_dados() -> VersoesDados:
+    return VersoesDados()
 
 # ------------------------------
-# Camada de dados (Postgres)
+# Fila offline de gravações (servidor do app)
 # ------------------------------
-def get_or_create_leader(nome: str, setor: str, turno: str) -> int:
-    cn = get_conn(); cur = cn.cursor()
-    cur.execute(
-        "SELECT id FROM public.leaders WHERE nome=%s AND setor=%s AND turno=%s",
-        (nome.strip(), setor, turno)
-    )
-    row = cur.fetchone()
-    if row:
-        cur.close(); cn.close()
-        return int(row[0])  # <-- r[0] em vez de row["id"]
+# Com FILA_OFFLINE=<arquivo>, "Salvar dia" grava as células num diário SQLite
+# (WAL, synchronous=FULL: durável a cada commit) e volta na hora; uma
+# thread do processo envia a fila ao Postgres em lotes, tentando de novo com
+# backoff enquanto o banco não responde. Cada célula leva uma chave de
+# idempotência (dispositivo, colaborador, data, versão da edição), registrada
+# em public.sincronizacoes na mesma transação da gravação: um lote reenviado
+# depois de um commit cuja resposta se perdeu não é aplicado duas vezes.
+# Só erro de conexão faz esperar; um lote recusado pelo banco (FK, dado
+# inválido...) é reenviado linha a linha e as linhas recusadas vão para
+# fila_rejeitadas (página DB), sem travar as que vêm atrás.
+# O diário fica no disco do servidor Streamlit e é um só para todas as
+# sessões do processo (um 'dispositivo'): cobre queda entre o servidor do app
+# e o Postgres, não a do Wi-Fi do tablet — sem alcançar o servidor, o
+# navegador nem chega ao "Salvar dia". Para o tablet gravar sem rede, cada
+# tablet precisa rodar o próprio servidor do app (um servidor por tablet).
+# As leituras também voltam a depender do banco quando o cache do período
+# (CACHE_PERIODO_TTL) expira.
+FILA_OFFLINE = os.getenv("FILA_OFFLINE", "")
+SINCRONIZACAO_INTERVALO = float(os.getenv("SINCRONIZACAO_INTERVALO", "5"))
+SINCRONIZACAO_BACKOFF_MAX = 300.0
+TAMANHO_LOTE_SINCRONIZACAO = 500
 
-    cur.execute(
-        "INSERT INTO public.leaders (nome, setor, turno) VALUES (%s, %s, %s) RETURNING id",
-        (nome.strip(), setor, turno),
-    )
-    new_id = cur.fetchone()[0]  # <-- índice 0
-    cn.commit(); cur.close(); cn.close()
-    return int(new_id)
+DDL_FILA = """
+create table if not exists fila_meta (
+  chave  text primary key,
+  valor  text not null
+);
 
+create table if not exists fila_presencas (
+  seq            integer primary key autoincrement,
+  chave          text not null unique,
+  colaborador_id integer not null,
+  data           text not null,
+  status         text not null,      -- '' = célula apagada
+  setor          text not null,
+  turno          text not null,
+  leader_nome    text not null,
+  criado_em      text not null default current_timestamp
+);
 
-def listar_colaboradores(setor: str, turno: str, somente_ativos=True) -> pd.DataFrame:
-    cn = get_conn()
-    query = "SELECT id, nome, setor, turno, ativo FROM public.colaboradores WHERE setor=%s AND turno=%s"
-    if somente_ativos:
-        query += " AND ativo=true"
-    df = pd.read_sql(query, cn, params=(setor, turno))
-    cn.close()
-    return df
+create table if not exists fila_rejeitadas (
+  seq            integer primary key,  -- o mesmo da fila_presencas
+  chave          text not null,
+  colaborador_id integer not null,
+  data           text not null,
+  status         text not null,
+  setor          text not null,
+  turno          text not null,
+  leader_nome    text not null,
+  erro           text not null,
+  rejeitada_em   text not null default current_timestamp
+);
+"""
 
-def listar_colaboradores_por_setor(setor: str, somente_ativos=True) -> pd.DataFrame:
-    cn = get_conn()
-    query = "SELECT id, nome, setor, turno, ativo FROM public.colaboradores WHERE setor=%s"
-    params = [setor]
-    if somente_ativos:
-        query += " AND ativo=true"
-    df = pd.read_sql(query, cn, params=params)
-    cn.close()
-    return df
 
-def listar_colaboradores_setor_turno(setor: str, turno: str, somente_ativos=True) -> pd.DataFrame:
-    cn = get_conn()
-    query = "SELECT id, nome, setor, turno, ativo FROM public.colaboradores WHERE setor=%s AND turno=%s"
-    params = [setor, turno]
-    if somente_ativos:
-        query += " AND ativo=true"
-    df = pd.read_sql(query, cn, params=params)
-    cn.close()
-    return df
+def erro_de_conexao(e: Exception) -> bool:
+    """Falha passageira (rede, banco fora do ar, pool esgotado): vale tentar de novo o mesmo lote."""
+    if isinstance(e, OSError):  # socket, TimeoutError do pool, ConnectionError
+        return True
+    return psycopg2 is not None and isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
 
-def listar_todos_colaboradores(somente_ativos: bool = False) -> pd.DataFrame:
-    cn = get_conn()
-    query = "SELECT id, nome, setor, turno, ativo FROM public.colaboradores"
-    if somente_ativos:
-        query += " WHERE ativo=true"
-    df = pd.read_sql(query, cn)
-    cn.close()
-    return df
 
-def adicionar_colaborador(nome: str, setor: str, turno: str):
-    turno = normaliza_turno(turno)
-    cn = get_conn(); cur = cn.cursor()
-    cur.execute(
-        "INSERT INTO public.colaboradores (nome, setor, turno, ativo) VALUES (%s, %s, %s, true)",
-        (nome.strip(), setor, turno),
-    )
-    cn.commit(); cur.close(); cn.close()
+@instrumentado
+def sincronizar_celulas(celulas: pd.DataFrame) -> Dict[str, int]:
+    """
+    Aplica células da fila offline (colunas de _grade_para_celulas mais
+    leader_nome e chave) numa transação. Chaves que já estão em
+    public.sincronizacoes vieram de um envio anterior que foi commitado e
+    são puladas (contadas em 'repetidas').
+    """
+    res = {"inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0, "repetidas": 0}
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO public.sincronizacoes (chave) SELECT unnest(%s::text[]) "
+            "ON CONFLICT DO NOTHING RETURNING chave",
+            (celulas["chave"].tolist(),),
+        )
+        novas = celulas[celulas["chave"].isin({r[0] for r in cur.fetchall()})]
+        for leader_nome, grupo in novas.groupby("leader_nome", sort=False):
+            for k, v in _gravar_celulas(cur, grupo, leader_nome).items():
+                res[k] += v
+        cn.commit()
+    res["repetidas"] = len(celulas) - len(novas)
+    _versoes_dados().marcar(novas["data"].unique())
+    return res
 
-def atualizar_turno_colaborador(colab_id: int, novo_turno: str):
-    novo_turno = normaliza_turno(novo_turno)
-    cn = get_conn(); cur = cn.cursor()
-    cur.execute("UPDATE public.colaboradores SET turno=%s WHERE id=%s", (novo_turno, colab_id))
-    cn.commit(); cur.close(); cn.close()
 
-def upsert_colaborador_turno(nome: str, setor: str, turno: str):
-    turno = normaliza_turno(turno)
-    cn = get_conn(); cur = cn.cursor()
-    cur.execute("SELECT id FROM public.colaboradores WHERE nome=%s AND setor=%s", (nome.strip(), setor))
-    row = cur.fetchone()
-    if row:
-        cur.execute("UPDATE public.colaboradores SET turno=%s, ativo=true WHERE id=%s", (turno, int(row[0])))  # r[0]
-    else:
+@instrumentado
+def podar_sincronizacoes(manter_dias: int = 30) -> int:
+    """Esquece chaves antigas: um reenvio só acontece minutos ou horas depois do original."""
+    with conexao() as cn, cn.cursor() as cur:
         cur.execute(
-            "INSERT INTO public.colaboradores (nome, setor, turno, ativo) VALUES (%s, %s, %s, true)",
-            (nome.strip(), setor, turno),
+            "DELETE FROM public.sincronizacoes WHERE aplicada_em < now() - make_interval(days => %s)",
+            (int(manter_dias),),
         )
-    cn.commit(); cur.close(); cn.close()
+        n = cur.rowcount
+        cn.commit()
+    return n
 
 
-def atualizar_ativo_colaboradores(ids_para_inativar: List[int], ids_para_ativar: List[int]):
-    cn = get_conn(); cur = cn.cursor()
-    if ids_para_inativar:
-        cur.execute("UPDATE public.colaboradores SET ativo=false WHERE id = ANY(%s)", (ids_para_inativar,))
-    if ids_para_ativar:
-        cur.execute("UPDATE public.colaboradores SET ativo=true  WHERE id = ANY(%s)", (ids_para_ativar,))
-    cn.commit(); cur.close(); cn.close()
+class FilaGravacoes:
+    """Diário das células salvas no servidor do app e a thread que o envia ao Postgres."""
 
-def carregar_presencas(colab_ids: List[int], inicio: date, fim: date) -> Dict[Tuple[int, str], str]:
-    if not colab_ids:
-        return {}
-    cn = get_conn(); cur = cn.cursor()
-    cur.execute(
+    COLUNAS = ["seq", "chave", "colaborador_id", "data", "status", "setor", "turno", "leader_nome"]
+
+    def __init__(self, caminho: str, intervalo: float = SINCRONIZACAO_INTERVALO,
+                 lote: int = TAMANHO_LOTE_SINCRONIZACAO):
+        self.caminho = caminho
+        self.intervalo = float(intervalo)
+        self.lote = int(lote)
+        self.falhas = 0
+        self.ultimo_erro: str | None = None
+        self.ultimo_envio: pd.Timestamp | None = None
+        self.enviadas = 0
+        self._podado_em = 0.0
+        self._acordar = threading.Event()
+        with self._conexao() as cn:
+            cn.execute("PRAGMA journal_mode = WAL")
+            cn.executescript(DDL_FILA)
+            # identifica este diário (servidor do app) nas chaves; sobrevive a reinícios junto com a fila
+            cn.execute("INSERT OR IGNORE INTO fila_meta (chave, valor) VALUES ('dispositivo', ?)",
+                       (uuid.uuid4().hex[:12],))
+            self.dispositivo = cn.execute("SELECT valor FROM fila_meta WHERE chave = 'dispositivo'").fetchone()[0]
+        self._thread = threading.Thread(target=self._laco, name="sincronizacao", daemon=True)
+        self._thread.start()
+
+    def _conexao(self):
+        return conexao_sqlite(self.caminho, sincrono="FULL")
+
+    def enfileirar(self, celulas: pd.DataFrame, leader_nome: str) -> int:
+        """Grava as células no diário local e acorda o envio; retorna quantas entraram na fila."""
+        versao = time.time_ns()  # versão da edição: todas as células deste salvamento
+        linhas = [
+            (f"{self.dispositivo}:{cid}:{d.isoformat()}:{versao}", int(cid), d.isoformat(),
+             status, setor, turno, leader_nome)
+            for cid, d, status, setor, turno in zip(celulas["colaborador_id"], celulas["data"],
+                                                    celulas["status"], celulas["setor"], celulas["turno"])
+        ]
+        with self._conexao() as cn:
+            cn.executemany(
+                "INSERT INTO fila_presencas (chave, colaborador_id, data, status, setor, turno, leader_nome) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                linhas,
+            )
+        self._acordar.set()
+        return len(linhas)
+
+    def pendentes(self, colab_ids: List[int], inicio: date, fim: date) -> Dict[Tuple[int, str], str]:
+        """Status ainda não enviados (a última edição de cada célula), no formato de carregar_presencas."""
+        ids = set(map(int, colab_ids))
+        with self._conexao() as cn:
+            linhas = cn.execute(
+                "SELECT colaborador_id, data, status FROM fila_presencas "
+                "WHERE data BETWEEN ? AND ? ORDER BY seq",
+                (inicio.isoformat(), fim.isoformat()),
+            ).fetchall()
+        return {(cid, d): status for cid, d, status in linhas if cid in ids}
+
+    def contar(self) -> int:
+        with self._conexao() as cn:
+            return cn.execute("SELECT count(*) FROM fila_presencas").fetchone()[0]
+
+    def enviar_lote(self) -> int:
+        """Envia o lote mais antigo da fila; retorna quantas linhas saíram dela (0 = fila vazia)."""
+        with self._conexao() as cn:
+            linhas = cn.execute(
+                f"SELECT {', '.join(self.COLUNAS)} FROM fila_presencas ORDER BY seq LIMIT ?",
+                (self.lote,),
+            ).fetchall()
+        if not linhas:
+            return 0
+        df = pd.DataFrame(linhas, columns=self.COLUNAS)
+        df["data"] = df["data"].map(date.fromisoformat)
+        # várias edições da mesma célula no lote: só a última vai ao banco
+        envio = df.drop_duplicates(subset=["colaborador_id", "data"], keep="last")
+        rejeitadas = []
+        try:
+            sincronizar_celulas(envio.drop(columns="seq"))
+        except Exception as e:
+            if erro_de_conexao(e):
+                raise
+            # o banco recusou o lote: isola as linhas culpadas, uma transação por linha
+            log_perf.warning("lote da fila recusado (%s); reenviando linha a linha", e)
+            for i in range(len(envio)):
+                linha = envio.iloc[[i]]
+                try:
+                    sincronizar_celulas(linha.drop(columns="seq"))
+                except Exception as e_linha:
+                    if erro_de_conexao(e_linha):
+                        raise  # as já aplicadas têm chave em sincronizacoes: o reenvio as pula
+                    rejeitadas.append(tuple(linha.iloc[0][self.COLUNAS].astype(object)) + (str(e_linha),))
+        with self._conexao() as cn:
+            cn.executemany(
+                f"INSERT OR REPLACE INTO fila_rejeitadas ({', '.join(self.COLUNAS)}, erro) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(int(r[0]), r[1], int(r[2]), r[3].isoformat(), *r[4:]) for r in rejeitadas],
+            )
+            cn.execute("DELETE FROM fila_presencas WHERE seq <= ?", (int(df["seq"].max()),))
+        self.enviadas += len(df) - len(rejeitadas)
+        self.ultimo_envio = pd.Timestamp.now()
+        return len(df)
+
+    def rejeitadas(self) -> pd.DataFrame:
+        with self._conexao() as cn:
+            return pd.read_sql(
+                f"SELECT {', '.join(self.COLUNAS)}, erro, rejeitada_em FROM fila_rejeitadas ORDER BY seq",
+                cn,
+            )
+
+    def reenfileirar_rejeitadas(self) -> int:
         """
-        SELECT colaborador_id, data, status
-          FROM public.presencas
-         WHERE colaborador_id = ANY(%s)
-           AND data BETWEEN %s AND %s
-        """,
-        (colab_ids, inicio, fim),
-    )
-    rows = cur.fetchall()
-    # r[0]=colaborador_id, r[1]=data (date), r[2]=status
-    out = {(int(r[0]), r[1].isoformat()): (r[2] or "") for r in rows}
-    cur.close(); cn.close()
-    return out
+        Devolve as rejeitadas à fila (ex.: depois de corrigir o cadastro que
+        causava o erro). Entram no fim da fila, como edições novas.
+        """
+        colunas = ", ".join(self.COLUNAS[1:])
+        with self._conexao() as cn:
+            n = cn.execute(
+                f"INSERT OR IGNORE INTO fila_presencas ({colunas}) "
+                f"SELECT {colunas} FROM fila_rejeitadas ORDER BY seq"
+            ).rowcount
+            cn.execute("DELETE FROM fila_rejeitadas")
+        self._acordar.set()
+        return n
 
+    def descartar_rejeitadas(self) -> int:
+        with self._conexao() as cn:
+            return cn.execute("DELETE FROM fila_rejeitadas").rowcount
 
-def salvar_presencas(df_editado: pd.DataFrame, mapa_id_por_nome: Dict[str, int],
-                     inicio: date, fim: date, setor: str, turno: str, leader_nome: str):
-    """
-    Salva as presenças do período. Se o status for um dos "SIN_*",
-    o setor gravado para aquele dia é sobrescrito pelo setor do SIN.
-    O turno gravado, se existir a coluna 'Turno' na grade, vem da própria linha;
-    caso contrário, usa o turno selecionado no topo (parâmetro 'turno').
-    """
-    date_cols = [c for c in df_editado.columns if c not in ("Colaborador", "Setor", "Turno")]
-    melt = df_editado.melt(
-        id_vars=[c for c in ("Colaborador", "Setor", "Turno") if c in df_editado.columns],
-        value_vars=date_cols,
-        var_name="data",
-        value_name="status"
-    )
+    def sincronizar_agora(self):
+        self._acordar.set()
 
-    melt["data_iso"] = pd.to_datetime(melt["data"]).dt.date
-    melt["colaborador_id"] = melt["Colaborador"].map(mapa_id_por_nome)
-    melt = melt.dropna(subset=["colaborador_id"])
+    def _laco(self):
+        espera = 0.0  # ao subir, tenta logo: pode haver fila de antes do reinício
+        while True:
+            self._acordar.wait(espera)
+            self._acordar.clear()
+            try:
+                while self.enviar_lote():
+                    pass
+                if time.monotonic() - self._podado_em > 86_400:
+                    podar_sincronizacoes()
+                    self._podado_em = time.monotonic()
+                self.falhas, self.ultimo_erro = 0, None
+                espera = self.intervalo
+            except Exception as e:
+                # sem rede/banco: a fila continua no disco; tenta de novo com backoff
+                self.falhas += 1
+                self.ultimo_erro = str(e)
+                espera = min(self.intervalo * 2 ** self.falhas, SINCRONIZACAO_BACKOFF_MAX)
+                log_perf.warning("sincronização falhou (%d× seguidas), nova tentativa em %.0fs: %s",
+                                 self.falhas, espera, e)
 
-    cn = get_conn(); cur = cn.cursor()
 
-    for _, r in melt.iterrows():
-        status = (r["status"] or "").strip()
-        cid    = int(r["colaborador_id"])
-        dte    = r["data_iso"]
+@st.cache_resource(show_spinner=False)
+def _fila_gravacoes() -> FilaGravacoes | None:
+    """A fila do processo; None = gravação direta no banco (FILA_OFFLINE vazio ou armazenamento embutido)."""
+    if not FILA_OFFLINE or embutido():
+        return None
+    return FilaGravacoes(FILA_OFFLINE)
 
-        setor_base = r.get("Setor", setor)
-        setor_para_gravar = SIN_TO_SETOR.get(status, setor_base)
-        turno_para_gravar = r.get("Turno", turno)
 
-        if status == "":
-            cur.execute("DELETE FROM public.presencas WHERE colaborador_id=%s AND data=%s", (cid, dte))
-        else:
-            cur.execute(
+@st.fragment(run_every=5)
+def _status_sincronizacao():
+    fila = _fila_gravacoes()
+    n = fila.contar()
+    if n:
+        st.warning(f"⏳ {n} alteração(ões) aguardando sincronização.")
+        if fila.ultimo_erro:
+            st.caption(f"Sem conexão com o banco ({fila.falhas} tentativa(s)); os dados estão salvos no servidor do app.")
+    else:
+        st.caption("✅ Tudo sincronizado.")
+
+# ------------------------------
+# Arquivos temporários do app
+# ------------------------------
+# Arquivos gerados para uma sessão (cProfile, exportações) ficam no diretório
+# temporário com um prefixo fixo; os que sobram de sessões abandonadas
+# são apagados por idade quando o processo sobe.
+TEMPORARIOS_IDADE_MAX = float(os.getenv("TEMPORARIOS_IDADE_MAX", "86400"))
+PREFIXO_PROF = "cadastro_hc_prof_"
+PREFIXO_EXPORTACAO = "cadastro_hc_export_"
+
+
+def arquivo_temporario(prefixo: str, sufixo: str) -> str:
+    return os.path.join(tempfile.gettempdir(), f"{prefixo}{uuid.uuid4().hex}{sufixo}")
+
+
+def varrer_temporarios(prefixos=(PREFIXO_PROF, PREFIXO_EXPORTACAO), idade_max: float = TEMPORARIOS_IDADE_MAX) -> int:
+    """Apaga os arquivos com esses prefixos sem modificação há mais de idade_max segundos."""
+    limite = time.time() - idade_max
+    removidos = 0
+    for prefixo in prefixos:
+        for caminho in glob.glob(os.path.join(tempfile.gettempdir(), prefixo + "*")):
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+                    removidos += 1
+            except OSError:
+                pass  # já removido por outro processo
+    return removidos
+
+
+@st.cache_resource(show_spinner=False)
+def _varredura_inicial() -> int:
+    """Uma varredura por processo, na primeira execução."""
+    return varrer_temporarios()
+
+# ------------------------------
+# Exportação em blocos (cursor no servidor → CSV/Parquet)
+# ------------------------------
+TAMANHO_BLOCO_EXPORTACAO = 10_000
+
+@armazenavel
+def iterar_blocos_presencas(inicio: date, fim: date, where: str = "true", params=(),
+                            ordem: str = "p.setor, p.turno, c.nome, p.colaborador_id, p.data",
+                            tamanho: int = TAMANHO_BLOCO_EXPORTACAO):
     """
-    INSERT INTO public.presencas
-      (colaborador_id, data, status, setor, turno, leader_nome, created_at, updated_at)
-    VALUES (%s, %s, %s, %s, %s, %s, now(), now())
-    ON CONFLICT (colaborador_id, data) DO UPDATE
-      SET status      = EXCLUDED.status,
-          setor       = EXCLUDED.setor,
-          turno       = EXCLUDED.turno,
-          leader_nome = EXCLUDED.leader_nome,
-          updated_at  = now()
-      -- só atualiza se houve mudança de algum campo relevante
-      WHERE presencas.status IS DISTINCT FROM EXCLUDED.status
-         OR presencas.setor  IS DISTINCT FROM EXCLUDED.setor
-         OR presencas.turno  IS DISTINCT FROM EXCLUDED.turno;
-    """,
-    (cid, dte, status, setor_para_gravar, turno_para_gravar, leader_nome),
-)
+    Gera blocos de até 'tamanho' linhas (tuplas em COLUNAS_RELATORIO) de
+    presenças entre inicio e fim (períodos já resolvidos por dia), lidas de
+    um cursor nomeado (server-side): a memória não cresce com o intervalo.
+    """
+    with conexao() as cn, cn.cursor(name="exportacao_presencas") as cur:
+        cur.itersize = tamanho
+        cur.execute(
+            f"""
+            SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome
+              FROM {ORIGEM_PRESENCAS} JOIN public.colaboradores c ON c.id = p.colaborador_id
+             WHERE {where}
+             ORDER BY {ordem}
+            """,
+            [inicio, fim] + list(params),
+        )
+        while True:
+            linhas = cur.fetchmany(tamanho)
+            if not linhas:
+                break
+            yield linhas
 
-    cn.commit()
-    cur.close(); cn.close()
 
-def aplicar_status_em_periodo(
-    nomes_colaboradores: List[str],
-    df_cols: pd.DataFrame,
-    mapa_id_por_nome: Dict[str, int],
-    inicio: date,
-    fim: date,
-    status: str,
-    setor: str,
-    turno_selecao: str,
-    leader_nome: str,
-):
-    if not nomes_colaboradores:
-        return
+def escrever_csv_em_blocos(blocos, destino) -> int:
+    """Escreve os blocos em 'destino' (binário) como o to_csv de antes: utf-8-sig, mesmas colunas."""
+    texto = io.TextIOWrapper(destino, encoding="utf-8-sig", newline="")
+    escritor = csv.writer(texto, lineterminator="\n")
+    escritor.writerow(COLUNAS_RELATORIO)
+    total = 0
+    for linhas in blocos:
+        escritor.writerows(linhas)
+        total += len(linhas)
+    texto.flush()
+    texto.detach()
+    return total
 
-    turnos_por_nome = df_cols.set_index("nome")["turno"].to_dict()
 
-    dias = datas_do_periodo(inicio, fim)
-    df = pd.DataFrame({
-        "Colaborador": nomes_colaboradores,
-        "Setor": [setor] * len(nomes_colaboradores),
-        "Turno": [turnos_por_nome.get(n, turno_selecao) for n in nomes_colaboradores],
-    })
+def escrever_parquet_em_blocos(blocos, destino) -> int:
+    """Escreve os blocos em Parquet, um row group por bloco."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
 
-    for d in dias:
-        df[d.isoformat()] = status
-
-    salvar_presencas(
-        df_editado=df,
-        mapa_id_por_nome=mapa_id_por_nome,
-        inicio=inicio,
-        fim=fim,
-        setor=setor,
-        turno=turno_selecao,
-        leader_nome=leader_nome or "",
+    schema = pa.schema([
+        ("colaborador", pa.string()),
+        ("data", pa.date32()),
+        ("status", pa.string()),
+        ("setor", pa.string()),
+        ("turno", pa.string()),
+        ("leader_nome", pa.string()),
+    ])
+    total = 0
+    with pq.ParquetWriter(destino, schema) as escritor:
+        for linhas in blocos:
+            colunas = list(zip(*linhas))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=campo.type) for col, campo in zip(colunas, schema)],
+                schema=schema,
+            ))
+            total += len(linhas)
+    return total
+
+
+@st.cache_data(show_spinner=False, ttl=CACHE_PERIODO_TTL, max_entries=64)
+def csv_do_dia(setor: str, dia: date, versao: Tuple[int, int]) -> Tuple[bytes, int]:
+    """
+    CSV do dia de um setor. 'versao' (versao_dados) só entra na chave do
+    cache: uma nova gravação do dia muda a versão e o arquivo é refeito.
+    """
+    buf = io.BytesIO()
+    n = escrever_csv_em_blocos(
+        iterar_blocos_presencas(dia, dia, "p.setor = %s", (setor,), ordem="colaborador"),
+        buf,
     )
+    return buf.getvalue(), n
+
+
+@instrumentado
+def exportar_presencas(inicio: date, fim: date, where: str, params, formato: str = "csv",
+                       ordem: str | None = None) -> Tuple[str, int]:
+    """
+    Exporta a consulta para um arquivo temporário, bloco a bloco.
+    Retorna (caminho do arquivo, nº de linhas); quem chama apaga o arquivo.
+    """
+    blocos = iterar_blocos_presencas(inicio, fim, where, params, **({"ordem": ordem} if ordem else {}))
+    sufixo = ".parquet" if formato == "parquet" else ".csv"
+    varrer_temporarios()  # sobras de sessões abandonadas
+    with tempfile.NamedTemporaryFile(prefix=PREFIXO_EXPORTACAO, suffix=sufixo, delete=False) as tmp:
+        if formato == "parquet":
+            total = escrever_parquet_em_blocos(blocos, tmp)
+        else:
+            total = escrever_csv_em_blocos(blocos, tmp)
+    return tmp.name, total
 
 # ------------------------------
 # UI Helpers
 # ------------------------------
-def montar_grid_presencas(df_cols: pd.DataFrame, inicio: date, fim: date) -> pd.DataFrame:
-    dias = datas_do_periodo(inicio, fim)
-    base = pd.DataFrame({"Colaborador": df_cols["nome"].tolist(), "Setor": df_cols["setor"].tolist()})
-    for d in dias:
-        base[d.isoformat()] = ""
-    return base
+def montar_grid_presencas(df_cols: pd.DataFrame, inicio: date, fim: date,
+                          matriz: MatrizPresencas | None = None,
+                          fixas=("Colaborador", "Setor")) -> pd.DataFrame:
+    if matriz is None:
+        matriz = MatrizPresencas(df_cols["id"], inicio, fim)
+    return matriz.para_grade(df_cols, fixas=fixas, indice_por_id=False)
 
 def aplicar_status_existentes(base: pd.DataFrame,
                               presencas: Dict[Tuple[int, str], str],
-                              mapa_id_por_nome: Dict[str, int]):
-    for nome, cid in mapa_id_por_nome.items():
-        for col in base.columns:
-            if col in ("Colaborador", "Setor", "Turno"):
-                continue
-            key = (cid, col)
-            if key in presencas:
-                base.loc[base["Colaborador"] == nome, col] = presencas[key]
+                              mapa_id_por_nome: Dict[str, int],
+                              ids=None):
+    """
+    Preenche a grade com os status já salvos, numa única operação: o dict de
+    carregar_presencas vira um frame longo, é pivotado (colaborador × data) e
+    alinhado às linhas da grade pelo id do colaborador.
+    'ids' é a sequência de ids alinhada às linhas de 'base' (nomes repetidos
+    não colidem); sem ela, o id sai do nome via mapa_id_por_nome.
+    """
+    datas = [c for c in base.columns if c not in ("Colaborador", "Setor", "Turno")]
+    if not presencas or not datas or base.empty:
+        return base
+
+    longo = pd.DataFrame(list(presencas.keys()), columns=["colaborador_id", "data"])
+    longo["status"] = list(presencas.values())
+    largo = longo.pivot(index="colaborador_id", columns="data", values="status")
+
+    if ids is None:
+        ids = base["Colaborador"].map(mapa_id_por_nome)
+    salvos = largo.reindex(index=pd.Index(list(ids)), columns=datas).set_axis(base.index, axis=0)
+    base[datas] = salvos.where(salvos.notna(), base[datas])
     return base
 
 def coluna_config_datas(inicio: date, fim: date) -> Dict[str, st.column_config.Column]:
+    # cópia rasa de cada coluna: o st.data_editor pode ajustar o dicionário recebido
+    return {iso: dict(col) for iso, col in _coluna_config_datas(inicio, fim).items()}
+
+@memo_processo(maxsize=64)
+def _coluna_config_datas(inicio: date, fim: date) -> Dict[str, st.column_config.Column]:
     cfg = {}
     dias = datas_do_periodo(inicio, fim)
     for d in dias:
@@ -535,8 +3011,169 @@ def pagina_colaboradores():
             use_container_width=True
         )
 
-def pagina_preenchimento():
-    return pagina_lancamento_diario()
+def avisar_recortes(alteradas: pd.DataFrame, nome_por_id: Dict[int, str]):
+    """Lista as células de férias/afastamento/atestado apagadas: ao salvar, esses dias saem do período."""
+    recortes = alteradas[(alteradas["status"] == "") & alteradas["status_anterior"].isin(STATUS_PERIODO)]
+    if recortes.empty:
+        return
+    itens = [f"{nome_por_id.get(cid, cid)} — {st_ant} em {d:%d/%m}"
+             for cid, d, st_ant in zip(recortes["colaborador_id"], recortes["data"], recortes["status_anterior"])]
+    st.warning(
+        f"{len(itens)} dia(s) serão retirados de férias/afastamento/atestado ao salvar "
+        "(o período é encurtado ou dividido): " + "; ".join(itens[:20])
+        + (f" e mais {len(itens) - 20}." if len(itens) > 20 else ".")
+    )
+
+def filtrar_terceiros(df_cols: pd.DataFrame, filtro: List[str]) -> pd.DataFrame:
+    """Filtro SOMA/TERCEIROS das páginas de lançamento (terceiro = nome terminado em "- terceiro")."""
+    mask_terceiro = df_cols["nome"].str.contains(r"-\s*terceiro\s*$", case=False, na=False)
+    escolha = set(filtro)
+    if escolha == {"SOMA"}:
+        return df_cols[~mask_terceiro]
+    if escolha == {"TERCEIROS"}:
+        return df_cols[mask_terceiro]
+    return df_cols
+
+def pagina_preenchimento():
+    """
+    Grade do período 16..15 inteiro de um setor: uma leitura do período (cache
+    compartilhado com o lançamento diário), o editor largo e, ao salvar, só as
+    células alteradas numa única transação. Dias anteriores a
+    data_minima_preenchimento() ficam somente leitura.
+    """
+    st.markdown("### Preenchimento do período (por setor)")
+
+    colA, colB, colC, colD = st.columns([1, 1, 2, 1])
+    with colA:
+        setor = st.selectbox("Setor", OPCOES_SETORES, index=0, key="per_setor")
+    with colB:
+        turno_sel = st.selectbox("Turno", ["Todos"] + OPCOES_TURNOS, index=0, key="per_turno")
+    with colC:
+        periodos = listar_periodos(6)
+        idx = st.selectbox("Período", range(len(periodos)), format_func=lambda i: periodos[i][0],
+                           index=0, key="per_periodo")
+        _, inicio, fim = periodos[idx]
+    with colD:
+        filtro_st = st.multiselect("Filtro", options=["SOMA", "TERCEIROS"],
+                                   default=["SOMA", "TERCEIROS"], key="per_filtro_st")
+
+    nome_preenchedor = display_name_from_email(st.session_state.get("user_email", ""))
+
+    with fase("colaboradores"):
+        if turno_sel == "Todos":
+            df_cols = listar_colaboradores_por_setor(setor, somente_ativos=True)
+        else:
+            df_cols = listar_colaboradores_setor_turno(setor, turno_sel, somente_ativos=True)
+        df_cols = filtrar_terceiros(df_cols, filtro_st).reset_index(drop=True)
+
+    if len(df_cols) == 0:
+        st.warning("Nenhum colaborador cadastrado para este filtro.")
+        st.stop()
+
+    with fase("presenças do período"):
+        matriz = matriz_do_periodo(setor, df_cols["id"].tolist(), inicio)
+    with fase("montar grade"):
+        base = montar_grid_presencas(df_cols, inicio, fim, matriz, fixas=("Colaborador", "Turno"))
+
+    min_permitida = data_minima_preenchimento()
+    with fase("column_config"):
+        cfg = {
+            "Colaborador": st.column_config.TextColumn("Colaborador", disabled=True),
+            "Turno": st.column_config.TextColumn("Turno", disabled=True),
+            **coluna_config_datas(inicio, fim),
+        }
+        for d in datas_do_periodo(inicio, fim):
+            if d < min_permitida:
+                cfg[d.isoformat()]["disabled"] = True
+
+    somente_leitura = fim < min_permitida
+    if somente_leitura:
+        st.info("Período fechado: somente consulta.")
+
+    editor_key = f"editor_periodo_{inicio.isoformat()}_{setor}_{turno_sel}_{'-'.join(sorted(filtro_st) or ['TODOS'])}"
+    with fase("data_editor"):
+        editado = st.data_editor(
+            base,
+            use_container_width=True,
+            hide_index=True,
+            num_rows="fixed",
+            column_config=cfg,
+            disabled=somente_leitura,
+            key=editor_key,
+        )
+
+    with fase("células alteradas"):
+        alteradas = celulas_alteradas_periodo(editado, matriz, df_cols)
+        # o editor não deixa mexer nos dias bloqueados, mas a grade não deve gravar fora da janela
+        alteradas = alteradas[alteradas["data"] >= min_permitida]
+
+    nome_por_id = dict(zip(df_cols["id"], df_cols["nome"]))
+    afastamentos = afastamentos_do_periodo(setor, df_cols["id"].tolist(), inicio, fim)
+    if not afastamentos.empty:
+        with st.expander(f"Férias/afastamentos no período ({len(afastamentos)})", expanded=False):
+            afastamentos = afastamentos.assign(colaborador=afastamentos["colaborador_id"].map(nome_por_id))
+            st.dataframe(afastamentos[["colaborador", "status", "inicio", "fim"]],
+                         use_container_width=True, hide_index=True)
+            rotulos = {
+                int(r.id): f"{r.colaborador} — {r.status} de {r.inicio:%d/%m/%Y} a {r.fim:%d/%m/%Y}"
+                for r in afastamentos.itertuples()
+            }
+            remover = st.multiselect("Remover períodos", options=list(rotulos), format_func=rotulos.get,
+                                     key=f"rm_periodos_{editor_key}", disabled=somente_leitura)
+            if remover and st.button("Remover selecionados", key=f"btn_rm_periodos_{editor_key}"):
+                remover_periodos(remover)
+                invalidar_cache_periodo()
+                st.session_state.pop(editor_key, None)
+                st.rerun()
+
+    if alteradas.empty:
+        st.caption("Nenhuma alteração pendente.")
+    else:
+        st.caption(f"{len(alteradas)} célula(s) em {alteradas['data'].nunique()} dia(s) serão gravadas ao salvar.")
+        avisar_recortes(alteradas, nome_por_id)
+
+    if st.button("Salvar período", type="primary", disabled=alteradas.empty, key="btn_salvar_periodo"):
+        fila = _fila_gravacoes()
+        if fila is not None:
+            n = fila.enfileirar(alteradas, nome_preenchedor or "")
+            registrar_no_cache_periodo(setor, inicio, alteradas)
+            st.success(f"{n} alteração(ões) salvas no servidor do app; o envio ao banco é automático.")
+        else:
+            try:
+                res = salvar_celulas(alteradas, leader_nome=nome_preenchedor or "")
+            except Exception as e:
+                st.error(f"Não foi possível salvar (nada foi gravado). Tente de novo. Detalhe: {e}")
+                st.stop()
+            atualizar_cache_periodo(setor, inicio, alteradas)
+            st.success(
+                f"Registros salvos/atualizados! {res['inseridos']} novos, {res['atualizados']} alterados, "
+                f"{res['removidos']} removidos."
+            )
+        st.session_state.pop(editor_key, None)
+        st.rerun()
+
+def _mostrar_resumo(dt_ini: date, dt_fim: date, setor: str | None, turno: str | None):
+    df = carregar_resumo(dt_ini, dt_fim, setor, turno)
+    if df.empty:
+        st.info("Sem dados no intervalo/filtros informados.")
+        return
+    totais = df.groupby("status")["qtd"].sum().sort_values(ascending=False)
+    st.markdown("#### Totais por status no intervalo")
+    st.dataframe(totais.rename("Qtd").to_frame().T, use_container_width=True, hide_index=True)
+
+    st.markdown("#### Por dia, setor e turno")
+    tabela = (
+        df.pivot_table(index=["data", "setor", "turno"], columns="status", values="qtd",
+                       aggfunc="sum", fill_value=0)
+        .reset_index()
+    )
+    st.dataframe(tabela, use_container_width=True, hide_index=True)
+    st.download_button(
+        "Baixar CSV do resumo",
+        data=tabela.to_csv(index=False).encode("utf-8-sig"),
+        file_name=f"resumo_{setor or 'todos_setores'}_{turno or 'todos_turnos'}_{dt_ini}_{dt_fim}.csv",
+        mime="text/csv",
+    )
 
 def pagina_relatorios_globais():
     st.markdown("### Relatórios Globais (todos os setores/turnos)")
@@ -552,38 +3189,80 @@ def pagina_relatorios_globais():
     with col4:
         turno_sel = st.selectbox("Filtrar por Turno", ["Todos"] + OPCOES_TURNOS, index=0)
 
-    if st.button("Gerar relatório"):
-        params = [dt_ini, dt_fim]
-        if setor_sel != "Todos":
-            params.append(setor_sel)
-        if turno_sel != "Todos":
-            params.append(turno_sel)
+    visao = st.radio("Visão", ["Detalhado", "Resumo"], horizontal=True, key="rel_visao")
+    if visao == "Resumo":
+        return _mostrar_resumo(
+            dt_ini, dt_fim,
+            setor_sel if setor_sel != "Todos" else None,
+            turno_sel if turno_sel != "Todos" else None,
+        )
 
-        df = pd.read_sql(
-            f"""
-            SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome
-              FROM public.presencas p JOIN public.colaboradores c ON c.id = p.colaborador_id
-             WHERE p.data BETWEEN %s AND %s
-             {"AND p.setor = %s" if setor_sel != "Todos" else ""}
-             {"AND p.turno = %s" if turno_sel != "Todos" else ""}
-             ORDER BY p.setor, p.turno, c.nome, p.data
-            """,
-            get_conn(),
-            params=params,
+    if st.button("Gerar relatório"):
+        st.session_state["rel_consulta"] = (
+            dt_ini, dt_fim,
+            setor_sel if setor_sel != "Todos" else None,
+            turno_sel if turno_sel != "Todos" else None,
         )
+        st.session_state["rel_cursores"] = [None]   # chave de início de cada página já visitada
+        st.session_state.pop("rel_total", None)
 
-        if df.empty:
-            st.info("Sem dados no intervalo/filtros informados.")
-        else:
-            st.dataframe(df, use_container_width=True, hide_index=True)
-            tag_setor = setor_sel if setor_sel != "Todos" else "todos_setores"
-            tag_turno = turno_sel if turno_sel != "Todos" else "todos_turnos"
-            csv = df.to_csv(index=False).encode("utf-8-sig")
+    consulta = st.session_state.get("rel_consulta")
+    if not consulta:
+        return
+    c_ini, c_fim, c_setor, c_turno = consulta
+
+    if "rel_total" not in st.session_state:
+        st.session_state["rel_total"] = contar_relatorio(c_ini, c_fim, c_setor, c_turno)
+    total = st.session_state["rel_total"]
+    if total == 0:
+        st.info("Sem dados no intervalo/filtros informados.")
+        return
+
+    cursores = st.session_state["rel_cursores"]
+    tamanho = st.selectbox("Linhas por página", [50, 100, 250, 500, 1000], index=1, key="rel_tamanho")
+    if st.session_state.get("rel_tamanho_ant") != tamanho:
+        st.session_state["rel_tamanho_ant"] = tamanho
+        cursores[:] = [None]
+
+    df, proxima = relatorio_pagina(c_ini, c_fim, c_setor, c_turno, apos=cursores[-1], tamanho=tamanho)
+    pagina = len(cursores)
+    n_paginas = max(1, -(-total // tamanho))
+    st.caption(f"{total} registros — página {pagina} de {n_paginas}")
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    nav1, nav2, _ = st.columns([1, 1, 4])
+    if nav1.button("◀ Anterior", disabled=pagina == 1, key="rel_ant"):
+        cursores.pop()
+        st.rerun()
+    if nav2.button("Próxima ▶", disabled=proxima is None, key="rel_prox"):
+        cursores.append(proxima)
+        st.rerun()
+
+    tag_setor = c_setor or "todos_setores"
+    tag_turno = c_turno or "todos_turnos"
+    formato = st.radio("Formato do arquivo", ["CSV", "Parquet"], horizontal=True, key="rel_formato")
+    # o arquivo só é gerado no clique e reaproveitado enquanto filtros, formato e versão não mudarem
+    chave = (c_ini, c_fim, c_setor, c_turno, formato, versao_dados(c_ini, c_fim))
+    pronto = st.session_state.get("rel_arquivo_pronto")
+    if pronto is not None and (pronto[0] != chave or not os.path.exists(pronto[1])):
+        if os.path.exists(pronto[1]):
+            os.remove(pronto[1])
+        st.session_state.pop("rel_arquivo_pronto")
+        pronto = None
+    if pronto is None:
+        if st.button("Preparar arquivo completo", key="rel_arquivo"):
+            where, params = _filtros_relatorio(c_ini, c_fim, c_setor, c_turno)
+            with st.spinner("Exportando..."):
+                caminho, _ = exportar_presencas(c_ini, c_fim, where, params, formato=formato.lower())
+            st.session_state["rel_arquivo_pronto"] = (chave, caminho)
+            st.rerun()
+    else:
+        with open(pronto[1], "rb") as f:
             st.download_button(
-                "Baixar CSV",
-                data=csv,
-                file_name=f"presencas_{tag_setor}_{tag_turno}_{dt_ini}_{dt_fim}.csv",
-                mime="text/csv",
+                f"Baixar {formato}",
+                data=f,
+                file_name=f"presencas_{tag_setor}_{tag_turno}_{c_ini}_{c_fim}.{formato.lower()}",
+                mime="text/csv" if formato == "CSV" else "application/vnd.apache.parquet",
             )
 
 # ------------------------------
@@ -910,79 +3589,771 @@ VITORIA ALVES BRAGA""",
 def _parse_names(blob: str):
     return [n.strip().strip('"').strip("'") for n in blob.splitlines() if n.strip()]
 
-def seed_colaboradores_iniciais(turno_default: str = "1°"):
+@instrumentado
+@armazenavel
+def seed_colaboradores_iniciais(turno_default: str = "1°") -> int:
+    """
+    Insere a lista inicial num único comando (arrays + WHERE NOT EXISTS),
+    somente quem ainda não existe com o mesmo nome/setor/turno.
+    Idempotente; retorna quantos colaboradores foram de fato adicionados.
+    """
+    turno = normaliza_turno(turno_default)
+    nomes, setores = [], []
     for setor, blob in SEED_LISTAS.items():
         for nome in _parse_names(blob):
-            cn = get_conn(); cur = cn.cursor()
-            cur.execute(
-                "SELECT 1 FROM public.colaboradores WHERE nome=%s AND setor=%s AND turno=%s",
-                (nome, setor, turno_default),
-            )
-            exists = cur.fetchone()
-            cur.close(); cn.close()
-            if not exists:
-                adicionar_colaborador(nome, setor, turno_default)
+            nomes.append(nome)
+            setores.append(setor)
+    with conexao() as cn, cn.cursor() as cur:
+        # mesmo lock do importador: dois cliques simultâneos não duplicam a lista
+        cur.execute("LOCK TABLE public.colaboradores IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(
+            """
+            INSERT INTO public.colaboradores (nome, setor, turno, ativo)
+            SELECT DISTINCT s.nome, s.setor, %s, true
+              FROM unnest(%s::text[], %s::text[]) AS s(nome, setor)
+             WHERE NOT EXISTS (
+                   SELECT 1 FROM public.colaboradores c
+                    WHERE c.nome = s.nome AND c.setor = s.setor AND c.turno = %s)
+            """,
+            (turno, nomes, setores, turno),
+        )
+        adicionados = cur.rowcount
+        cn.commit()
+    if adicionados:
+        _cache_colaboradores().invalidar([(setor, turno) for setor in SEED_LISTAS])
+    return adicionados
 
 # ------------------------------
 # Importador de turnos (xlsx/csv)
 # ------------------------------
+MAPA_SETORES_ARQUIVO = {
+    "AVIAMENTO": "Aviamento",
+    "TECIDO": "Tecido",
+    "DISTRIBUICAO": "Distribuição",
+    "DISTRIBUIÇÃO": "Distribuição",
+    "ALMOXARIFADO": "Almoxarifado",
+    "PAF": "PAF",
+    "RECEBIMENTO": "Recebimento",
+    "EXPEDICAO": "Expedição",
+    "EXPEDIÇÃO": "Expedição",
+    "E-COMMERCE": "E-commerce",
+    "ECOMMERCE": "E-commerce",
+    "E COMMERCE": "E-commerce",
+}
+
 def _normalize_setor(nome_sheet: str) -> str:
     s = (nome_sheet or "").strip().upper()
-    mapa = {
-        "AVIAMENTO": "Aviamento",
-        "TECIDO": "Tecido",
-        "DISTRIBUICAO": "Distribuição",
-        "DISTRIBUIÇÃO": "Distribuição",
-        "ALMOXARIFADO": "Almoxarifado",
-        "PAF": "PAF",
-        "RECEBIMENTO": "Recebimento",
-        "EXPEDICAO": "Expedição",
-        "EXPEDIÇÃO": "Expedição",
-        "E-COMMERCE": "E-commerce",
-        "ECOMMERCE": "E-commerce",
-        "E COMMERCE": "E-commerce",
-    }
-    return mapa.get(s, nome_sheet)
-
-def importar_turnos_de_arquivo(arquivo, setor_padrao: str | None = None) -> int:
-    nome = getattr(arquivo, "name", "").lower()
-    total = 0
+    return MAPA_SETORES_ARQUIVO.get(s, nome_sheet)
 
-    def _process_df(df: pd.DataFrame, setor_hint: str | None = None):
-        nonlocal total
-        cols = {c.upper(): c for c in df.columns}
-        nome_col = cols.get("NOME COMPLETO") or cols.get("NOME")
-        turno_col = cols.get("TURNO")
-        setor_col = cols.get("SETOR")
-        if not nome_col or not turno_col:
-            return 0
-        linhas = 0
-        for _, row in df.iterrows():
-            nome_val = str(row[nome_col]).strip()
-            if not nome_val:
+def _normalize_setor_serie(s: pd.Series) -> pd.Series:
+    """Versão vetorizada de _normalize_setor."""
+    s = s.astype("string").str.strip()
+    return s.str.upper().map(MAPA_SETORES_ARQUIVO).fillna(s)
+
+def _normaliza_turno_serie(s: pd.Series) -> pd.Series:
+    """Versão vetorizada de normaliza_turno."""
+    t = s.astype("string").fillna("").str.strip().str.upper().str.replace("º", "°", regex=False)
+    t = t.replace({"UNICO": "ÚNICO", "INTERMEDIÁRIO": "INTERMEDIARIO"})
+    return t.where(t.isin(OPCOES_TURNOS), "1°")
+
+def _normalizar_planilha(df: pd.DataFrame, setor_hint: str | None,
+                         setor_padrao: str | None) -> Tuple[pd.DataFrame, int]:
+    """
+    Reduz uma aba/arquivo às colunas nome, setor, turno já normalizadas.
+    Retorna (linhas válidas, nº de linhas rejeitadas: sem nome ou sem setor).
+    Aba sem colunas NOME/TURNO é ignorada, como antes.
+    """
+    vazio = pd.DataFrame(columns=["nome", "setor", "turno"])
+    cols = {str(c).strip().upper(): c for c in df.columns}
+    nome_col = cols.get("NOME COMPLETO") or cols.get("NOME")
+    turno_col = cols.get("TURNO")
+    setor_col = cols.get("SETOR")
+    if not nome_col or not turno_col:
+        return vazio, 0
+
+    fallback = setor_hint or setor_padrao
+    if not setor_col and not fallback:
+        raise ValueError("Defina o setor (coluna SETOR no arquivo ou selecione na UI para CSV sem SETOR).")
+
+    nomes = df[nome_col].astype("string").str.strip()
+    if setor_col:
+        setores = _normalize_setor_serie(df[setor_col]).replace("", pd.NA)
+        if fallback:
+            setores = setores.fillna(fallback)
+    else:
+        setores = pd.Series(fallback, index=df.index, dtype="string")
+    out = pd.DataFrame({
+        "nome": nomes,
+        "setor": setores,
+        "turno": _normaliza_turno_serie(df[turno_col]),
+    })
+    validas = out["nome"].fillna("").ne("") & out["setor"].notna()
+    return out[validas].astype(str), int((~validas).sum())
+
+
+@armazenavel
+def _importar_lotes(lotes) -> Dict[str, int]:
+    """
+    Aplica lotes (nome, setor, turno) como um único upsert transacional:
+    cada lote vai para uma tabela temporária e, no fim, um só comando
+    atualiza quem já existe (por nome + setor) e insere o resto.
+    'lotes' é um iterável de (frame normalizado, nº de linhas rejeitadas).
+    Nomes repetidos no arquivo: vale a última ocorrência.
+    """
+    res = {"inseridos": 0, "atualizados": 0, "inalterados": 0, "rejeitados": 0}
+    setores = set()
+    lidas = 0
+    with conexao() as cn, cn.cursor() as cur:
+        cur.execute("""
+        create temp table _import_turnos (
+          ordem  bigserial,
+          nome   text not null,
+          setor  text not null,
+          turno  text not null
+        ) on commit drop;
+        """)
+        for lote, rejeitados in lotes:
+            res["rejeitados"] += rejeitados
+            if lote.empty:
                 continue
-            turno_val = normaliza_turno(str(row[turno_col]).strip())
-            setor_val = _normalize_setor(str(row[setor_col]).strip()) if setor_col else setor_hint or setor_padrao
-            if not setor_val:
-                raise ValueError("Defina o setor (coluna SETOR no arquivo ou selecione na UI para CSV sem SETOR).")
-            upsert_colaborador_turno(nome_val, setor_val, turno_val)
-            linhas += 1
-        total += linhas
-        return linhas
-
-    if nome.endswith((".xlsx", ".xls")):
-        xls = pd.ExcelFile(arquivo)
-        for aba in xls.sheet_names:
-            df = xls.parse(aba)
-            _process_df(df, setor_hint=_normalize_setor(aba))
+            setores.update(lote["setor"].unique())
+            cur.execute(
+                "INSERT INTO _import_turnos (nome, setor, turno) "
+                "SELECT * FROM unnest(%s::text[], %s::text[], %s::text[])",
+                (lote["nome"].tolist(), lote["setor"].tolist(), lote["turno"].tolist()),
+            )
+            lidas += len(lote)
+            reportar_progresso(f"{lidas} linhas lidas do arquivo…")
+
+        reportar_progresso(f"Aplicando {lidas} linhas no cadastro…")
+
+        # sem chave única em (nome, setor) — há nomes repetidos no mesmo setor —,
+        # o lock serializa importações/upserts concorrentes durante o merge
+        cur.execute("LOCK TABLE public.colaboradores IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("""
+        WITH entrada AS (
+          SELECT DISTINCT ON (nome, setor) nome, setor, turno
+            FROM _import_turnos
+           ORDER BY nome, setor, ordem DESC
+        ), atualizados AS (
+          UPDATE public.colaboradores c
+             SET turno = e.turno, ativo = true
+            FROM entrada e
+           WHERE c.nome = e.nome AND c.setor = e.setor
+             AND (c.turno IS DISTINCT FROM e.turno OR NOT c.ativo)
+          RETURNING c.nome, c.setor
+        ), inseridos AS (
+          INSERT INTO public.colaboradores (nome, setor, turno, ativo)
+          SELECT e.nome, e.setor, e.turno, true
+            FROM entrada e
+           WHERE NOT EXISTS (
+                 SELECT 1 FROM public.colaboradores c WHERE c.nome = e.nome AND c.setor = e.setor)
+          RETURNING id
+        )
+        SELECT (SELECT count(*) FROM entrada),
+               (SELECT count(DISTINCT (nome, setor)) FROM atualizados),
+               (SELECT count(*) FROM inseridos)
+        """)
+        total, atualizados, inseridos = cur.fetchone()
+        cn.commit()
+
+    res["inseridos"] = int(inseridos)
+    res["atualizados"] = int(atualizados)
+    res["inalterados"] = int(total) - int(atualizados) - int(inseridos)
+    _cache_colaboradores().invalidar([(setor, None) for setor in setores])
+    return res
+
+
+TAMANHO_LOTE_IMPORTACAO = 5_000
+
+def _farejar_csv(arquivo, amostra: int = 64 * 1024) -> Tuple[str, str]:
+    """Descobre encoding e separador a partir de um prefixo do arquivo (uma única leitura curta)."""
+    prefixo = arquivo.read(amostra)
+    arquivo.seek(0)
+    if prefixo.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
     else:
         try:
-            df = pd.read_csv(arquivo)
-        except Exception:
-            df = pd.read_csv(arquivo, encoding="latin1", sep=None, engine="python")
-        _process_df(df, setor_hint=None)
+            prefixo.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # o corte do prefixo pode cair no meio de um caractere multibyte
+            encoding = "utf-8" if e.start >= len(prefixo) - 3 else "latin1"
+    texto = prefixo.decode(encoding, errors="ignore")
+    try:
+        sep = csv.Sniffer().sniff(texto, delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    return encoding, sep
 
-    return total
+
+def _lotes_csv(arquivo, setor_padrao: str | None, tamanho: int):
+    encoding, sep = _farejar_csv(arquivo)
+    for bloco in pd.read_csv(arquivo, encoding=encoding, sep=sep, dtype=str, chunksize=tamanho):
+        yield _normalizar_planilha(bloco, None, setor_padrao)
+
+
+def _lotes_xlsx(arquivo, setor_padrao: str | None, tamanho: int):
+    """Lê as abas linha a linha (openpyxl read_only) e entrega lotes de 'tamanho' linhas."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            linhas = ws.iter_rows(values_only=True)
+            cabecalho = next(linhas, None)
+            if not cabecalho:
+                continue
+            colunas = ["" if c is None else str(c) for c in cabecalho]
+            largura = len(colunas)
+            setor_hint = _normalize_setor(ws.title)
+            buf = []
+            for linha in linhas:
+                buf.append(tuple(linha[:largura]) + (None,) * (largura - len(linha)))
+                if len(buf) >= tamanho:
+                    yield _normalizar_planilha(pd.DataFrame(buf, columns=colunas), setor_hint, setor_padrao)
+                    buf = []
+            if buf:
+                yield _normalizar_planilha(pd.DataFrame(buf, columns=colunas), setor_hint, setor_padrao)
+    finally:
+        wb.close()
+
+
+@instrumentado
+def importar_turnos_de_arquivo(arquivo, setor_padrao: str | None = None,
+                               tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO) -> Dict[str, int]:
+    """
+    Importa (nome, setor, turno) de um xlsx (todas as abas) ou csv numa única
+    transação. xlsx e csv são lidos em lotes (streaming) que vão direto para
+    a tabela de staging do banco, então a memória não cresce com o arquivo.
+    Retorna as contagens de inseridos, atualizados, inalterados e rejeitados.
+    """
+    nome = getattr(arquivo, "name", "").lower()
+
+    if nome.endswith(".xlsx"):
+        return _importar_lotes(_lotes_xlsx(arquivo, setor_padrao, tamanho_lote))
+    if nome.endswith(".xls"):
+        # formato antigo: sem leitor em streaming, carrega aba a aba
+        xls = pd.ExcelFile(arquivo)
+        return _importar_lotes(
+            _normalizar_planilha(xls.parse(aba), _normalize_setor(aba), setor_padrao)
+            for aba in xls.sheet_names
+        )
+    return _importar_lotes(_lotes_csv(arquivo, setor_padrao, tamanho_lote))
+
+# ------------------------------
+# Armazenamento embutido (SQLite)
+# ------------------------------
+# Mesmo esquema lógico do Postgres: datas em texto ISO, ativo como 0/1 e o
+# período de férias/afastamento como (inicio, fim) inclusivos, com a
+# sobreposição barrada por trigger no lugar da constraint de exclusão.
+DDL_SQLITE = """
+create table if not exists leaders (
+  id          integer primary key autoincrement,
+  nome        text not null,
+  setor       text not null,
+  turno       text not null,
+  created_at  text not null default current_timestamp
+);
+
+create table if not exists colaboradores (
+  id          integer primary key autoincrement,
+  nome        text not null,
+  setor       text not null,
+  turno       text not null,
+  ativo       integer not null default 1,
+  created_at  text not null default current_timestamp
+);
+create index if not exists ix_colaboradores_setor_turno_ativo on colaboradores (setor, turno, ativo);
+create index if not exists ix_colaboradores_nome_setor on colaboradores (nome, setor);
+
+create table if not exists presencas (
+  id             integer primary key autoincrement,
+  colaborador_id integer not null references colaboradores(id),
+  data           text not null,
+  status         text,
+  setor          text not null,
+  turno          text not null,
+  leader_nome    text,
+  created_at     text not null default current_timestamp,
+  updated_at     text,
+  unique (colaborador_id, data)
+);
+create index if not exists ix_presencas_data_setor_turno on presencas (data, setor, turno);
+
+create table if not exists presencas_periodos (
+  id             integer primary key autoincrement,
+  colaborador_id integer not null references colaboradores(id),
+  inicio         text not null,
+  fim            text not null check (fim >= inicio),
+  status         text not null check (status in ('FÉRIAS', 'AFASTADO', 'ATESTADO')),
+  setor          text not null,
+  turno          text not null,
+  leader_nome    text,
+  created_at     text not null default current_timestamp
+);
+create index if not exists ix_presencas_periodos_colab on presencas_periodos (colaborador_id, inicio);
+
+create trigger if not exists trg_presencas_periodos_sobrepostos
+  before insert on presencas_periodos
+  when exists (select 1 from presencas_periodos r
+                where r.colaborador_id = new.colaborador_id
+                  and r.inicio <= new.fim and new.inicio <= r.fim)
+begin
+  select raise(abort, 'periodo_sobreposto');
+end;
+"""
+
+# equivalente de presencas_resolvidas(ini, fim) como CTE "p"; parâmetros (ini, fim, ini, fim)
+RESOLVIDAS_SQLITE = """
+with recursive dias(d) as (
+  select ? union all select date(d, '+1 day') from dias where d < ?
+), p as (
+  select colaborador_id, data, status, setor, turno, leader_nome
+    from presencas
+   where data between ? and ?
+  union all
+  select r.colaborador_id, dias.d, r.status, r.setor, r.turno, r.leader_nome
+    from presencas_periodos r join dias on dias.d between r.inicio and r.fim
+   where not exists (select 1 from presencas x
+                      where x.colaborador_id = r.colaborador_id and x.data = dias.d)
+)
+"""
+
+
+@contextmanager
+def conexao_sqlite(caminho: str, sincrono: str = "NORMAL"):
+    """Uma conexão por uso (o SQLite abre em microssegundos); commit ao sair sem erro."""
+    cn = sqlite3.connect(caminho, timeout=30)
+    try:
+        cn.execute("PRAGMA foreign_keys = ON")
+        cn.execute(f"PRAGMA synchronous = {sincrono}")
+        yield cn
+        cn.commit()
+    except BaseException:
+        cn.rollback()
+        raise
+    finally:
+        cn.close()
+
+
+class ArmazenamentoSQLite:
+    """
+    Implementação embutida das funções @armazenavel sobre um arquivo SQLite.
+    Cada método recebe e devolve exatamente o que a função de mesmo nome
+    recebe e devolve no Postgres, inclusive a invalidação dos caches.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+
+    def _conexao(self):
+        return conexao_sqlite(self.caminho)
+
+    @staticmethod
+    def _sql(query: str) -> str:
+        return query.replace("%s", "?")
+
+    @staticmethod
+    def _p(params) -> list:
+        """Parâmetros no formato do SQLite: datas em ISO e escalares numpy como tipos Python."""
+        out = []
+        for v in params:
+            if isinstance(v, date):
+                v = pd.Timestamp(v).date().isoformat()
+            elif hasattr(v, "item"):
+                v = v.item()
+            out.append(v)
+        return out
+
+    @staticmethod
+    def _ids(ids) -> str:
+        """Lista de ids como JSON, lida com json_each (o equivalente do = ANY(%s))."""
+        return json.dumps([int(i) for i in ids])
+
+    @staticmethod
+    def _datas(df: pd.DataFrame, *colunas: str) -> pd.DataFrame:
+        for c in colunas:
+            df[c] = pd.to_datetime(df[c]).dt.date
+        return df
+
+    def init_db(self):
+        with self._conexao() as cn:
+            cn.execute("PRAGMA journal_mode = WAL")  # leitores não esperam o escritor
+            cn.executescript(DDL_SQLITE)
+
+    def contagens(self) -> pd.DataFrame:
+        with self._conexao() as cn:
+            return pd.DataFrame(
+                [(t, cn.execute(f"SELECT count(*) FROM {t}").fetchone()[0])
+                 for t in ("colaboradores", "presencas", "presencas_periodos", "leaders")],
+                columns=["tabela", "linhas"],
+            )
+
+    # --- colaboradores ---------------------------------------------------------
+    def get_or_create_leader(self, nome: str, setor: str, turno: str) -> int:
+        with self._conexao() as cn:
+            row = cn.execute("SELECT id FROM leaders WHERE nome=? AND setor=? AND turno=?",
+                             (nome.strip(), setor, turno)).fetchone()
+            if row:
+                return int(row[0])
+            return int(cn.execute("INSERT INTO leaders (nome, setor, turno) VALUES (?, ?, ?) RETURNING id",
+                                  (nome.strip(), setor, turno)).fetchone()[0])
+
+    def _ler_colaboradores(self, setor: str | None, turno: str | None, somente_ativos: bool) -> pd.DataFrame:
+        query = "SELECT id, nome, setor, turno, ativo FROM colaboradores WHERE true"
+        params = []
+        if setor is not None:
+            query += " AND setor=?"
+            params.append(setor)
+        if turno is not None:
+            query += " AND turno=?"
+            params.append(turno)
+        if somente_ativos:
+            query += " AND ativo"
+        with self._conexao() as cn:
+            df = pd.read_sql(query, cn, params=params)
+        df["ativo"] = df["ativo"].astype(bool)
+        return df
+
+    def adicionar_colaborador(self, nome: str, setor: str, turno: str):
+        turno = normaliza_turno(turno)
+        with self._conexao() as cn:
+            cn.execute("INSERT INTO colaboradores (nome, setor, turno, ativo) VALUES (?, ?, ?, 1)",
+                       (nome.strip(), setor, turno))
+        _cache_colaboradores().invalidar([(setor, turno)])
+
+    def atualizar_turno_colaborador(self, colab_id: int, novo_turno: str):
+        novo_turno = normaliza_turno(novo_turno)
+        with self._conexao() as cn:
+            row = cn.execute("SELECT setor, turno FROM colaboradores WHERE id=?", (int(colab_id),)).fetchone()
+            cn.execute("UPDATE colaboradores SET turno=? WHERE id=?", (novo_turno, int(colab_id)))
+        if row:
+            _cache_colaboradores().invalidar([(row[0], row[1]), (row[0], novo_turno)])
+
+    def upsert_colaborador_turno(self, nome: str, setor: str, turno: str):
+        turno = normaliza_turno(turno)
+        with self._conexao() as cn:
+            row = cn.execute("SELECT id, turno FROM colaboradores WHERE nome=? AND setor=?",
+                             (nome.strip(), setor)).fetchone()
+            if row:
+                cn.execute("UPDATE colaboradores SET turno=?, ativo=1 WHERE id=?", (turno, int(row[0])))
+            else:
+                cn.execute("INSERT INTO colaboradores (nome, setor, turno, ativo) VALUES (?, ?, ?, 1)",
+                           (nome.strip(), setor, turno))
+        _cache_colaboradores().invalidar([(setor, turno)] + ([(setor, row[1])] if row else []))
+
+    def atualizar_ativo_colaboradores(self, ids_para_inativar: List[int], ids_para_ativar: List[int]):
+        afetados = []
+        with self._conexao() as cn:
+            for ativo, ids in ((0, ids_para_inativar), (1, ids_para_ativar)):
+                if ids:
+                    afetados += cn.execute(
+                        "UPDATE colaboradores SET ativo=? WHERE id IN (SELECT value FROM json_each(?)) "
+                        "RETURNING setor, turno",
+                        (ativo, self._ids(ids)),
+                    ).fetchall()
+        _cache_colaboradores().invalidar(set(afetados))
+
+    def seed_colaboradores_iniciais(self, turno_default: str = "1°") -> int:
+        turno = normaliza_turno(turno_default)
+        pares = dict.fromkeys((nome, setor) for setor, blob in SEED_LISTAS.items() for nome in _parse_names(blob))
+        with self._conexao() as cn:
+            cn.execute("BEGIN IMMEDIATE")  # como o LOCK TABLE do Postgres: um seed por vez
+            adicionados = cn.executemany(
+                """
+                INSERT INTO colaboradores (nome, setor, turno, ativo)
+                SELECT ?, ?, ?, 1
+                 WHERE NOT EXISTS (SELECT 1 FROM colaboradores WHERE nome = ? AND setor = ? AND turno = ?)
+                """,
+                [(n, s, turno, n, s, turno) for n, s in pares],
+            ).rowcount
+        if adicionados:
+            _cache_colaboradores().invalidar([(setor, turno) for setor in SEED_LISTAS])
+        return adicionados
+
+    def _importar_lotes(self, lotes) -> Dict[str, int]:
+        """
+        Mesmo merge do Postgres (vale a última ocorrência de nome + setor),
+        com a entrada deduplicada num dicionário em vez da tabela de staging.
+        """
+        res = {"inseridos": 0, "atualizados": 0, "inalterados": 0, "rejeitados": 0}
+        setores = set()
+        entrada: Dict[Tuple[str, str], str] = {}
+        lidas = 0
+        for lote, rejeitados in lotes:
+            res["rejeitados"] += rejeitados
+            if lote.empty:
+                continue
+            setores.update(lote["setor"].unique())
+            entrada.update(zip(zip(lote["nome"], lote["setor"]), lote["turno"]))
+            lidas += len(lote)
+            reportar_progresso(f"{lidas} linhas lidas do arquivo…")
+
+        reportar_progresso(f"Aplicando {lidas} linhas no cadastro…")
+        with self._conexao() as cn:
+            cn.execute("BEGIN IMMEDIATE")
+            for (nome, setor), turno in entrada.items():
+                if cn.execute(
+                    "UPDATE colaboradores SET turno = ?, ativo = 1 "
+                    "WHERE nome = ? AND setor = ? AND (turno IS NOT ? OR NOT ativo)",
+                    (turno, nome, setor, turno),
+                ).rowcount:
+                    res["atualizados"] += 1
+                elif cn.execute(
+                    "INSERT INTO colaboradores (nome, setor, turno, ativo) SELECT ?, ?, ?, 1 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM colaboradores WHERE nome = ? AND setor = ?)",
+                    (nome, setor, turno, nome, setor),
+                ).rowcount:
+                    res["inseridos"] += 1
+                else:
+                    res["inalterados"] += 1
+        _cache_colaboradores().invalidar([(setor, None) for setor in setores])
+        return res
+
+    # --- presenças -------------------------------------------------------------
+    def carregar_presencas(self, colab_ids: List[int], inicio: date, fim: date) -> Dict[Tuple[int, str], str]:
+        if not colab_ids:
+            return {}
+        with self._conexao() as cn:
+            rows = cn.execute(
+                RESOLVIDAS_SQLITE + """
+                SELECT colaborador_id, data, status FROM p
+                 WHERE colaborador_id IN (SELECT value FROM json_each(?))
+                """,
+                self._p([inicio, fim, inicio, fim]) + [self._ids(colab_ids)],
+            ).fetchall()
+        return {(int(r[0]), r[1]): (r[2] or "") for r in rows}
+
+    def carregar_matriz(self, colab_ids: List[int], inicio: date, fim: date) -> MatrizPresencas:
+        matriz = MatrizPresencas(colab_ids, inicio, fim)
+        if not len(matriz.ids):
+            return matriz
+        with self._conexao() as cn:
+            df = pd.read_sql(
+                RESOLVIDAS_SQLITE + """
+                SELECT colaborador_id, CAST(julianday(data) - julianday(?) AS integer) AS dia, status
+                  FROM p
+                 WHERE colaborador_id IN (SELECT value FROM json_each(?))
+                """,
+                cn,
+                params=self._p([inicio, fim, inicio, fim, inicio]) + [self._ids(matriz.ids)],
+            )
+        matriz.gravar_codigos(df["colaborador_id"], df["dia"], matriz.codigos_de(df["status"]))
+        return matriz
+
+    def presencas_do_dia(self, setor: str, ids: List[int], dia: date) -> Dict[Tuple[int, str], str]:
+        # sem cache de período: a leitura local de um dia já é barata
+        return carregar_presencas(ids, dia, dia)
+
+    def matriz_do_periodo(self, setor: str, ids: List[int], ref: date) -> MatrizPresencas:
+        return carregar_matriz(ids, *periodo_por_data(ref))
+
+    def afastamentos_do_periodo(self, setor: str, ids: List[int], inicio: date, fim: date) -> pd.DataFrame:
+        return listar_periodos_colaboradores(ids, inicio, fim)
+
+    def atualizar_cache_periodo(self, setor: str, dia: date, gravadas: pd.DataFrame):
+        pass
+
+    def salvar_celulas(self, celulas: pd.DataFrame, leader_nome: str) -> Dict[str, int]:
+        res = {"inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0}
+        if celulas.empty:
+            return res
+        celulas = celulas.drop_duplicates(subset=["colaborador_id", "data"], keep="last")
+        remover = celulas[celulas["status"] == ""]
+        gravar = celulas[celulas["status"] != ""]
+        with self._conexao() as cn:
+            if not remover.empty:
+                # mesma regra de _gravar_celulas: dia apagado dentro de um período sai do período
+                cortes = []
+                for cid, d in zip(remover["colaborador_id"], remover["data"]):
+                    cortes += cn.execute(
+                        """
+                        SELECT r.id, r.colaborador_id, r.inicio, r.fim, r.status, r.setor, r.turno,
+                               r.leader_nome, ?, p.status IS NULL
+                          FROM presencas_periodos r
+                          LEFT JOIN presencas p ON p.colaborador_id = r.colaborador_id AND p.data = ?
+                         WHERE r.colaborador_id = ? AND ? BETWEEN r.inicio AND r.fim
+                           AND (p.status IS NULL OR p.status = r.status)
+                        """,
+                        self._p([d, d, cid, d]),
+                    ).fetchall()
+                ids, pedacos = _recortar_periodos(
+                    [(*c[:2], date.fromisoformat(c[2]), date.fromisoformat(c[3]), *c[4:8],
+                      date.fromisoformat(c[8])) for c in cortes]
+                )
+                cn.executemany("DELETE FROM presencas_periodos WHERE id = ?", [(i,) for i in ids])
+                cn.executemany(
+                    "INSERT INTO presencas_periodos (colaborador_id, inicio, fim, status, setor, turno, leader_nome) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._p(p) for p in pedacos],
+                )
+                res["removidos"] = cn.executemany(
+                    "DELETE FROM presencas WHERE colaborador_id = ? AND data = ?",
+                    [self._p(r) for r in zip(remover["colaborador_id"], remover["data"])],
+                ).rowcount + sum(1 for c in cortes if c[9])
+                res["inalterados"] += len(remover) - res["removidos"]
+            for r in zip(gravar["colaborador_id"], gravar["data"], gravar["status"],
+                         gravar["setor"], gravar["turno"]):
+                # updated_at só é preenchido na atualização: NULL no RETURNING = linha nova
+                row = cn.execute(
+                    """
+                    INSERT INTO presencas (colaborador_id, data, status, setor, turno, leader_nome)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (colaborador_id, data) DO UPDATE
+                      SET status = excluded.status, setor = excluded.setor, turno = excluded.turno,
+                          leader_nome = excluded.leader_nome, updated_at = current_timestamp
+                      WHERE presencas.status IS NOT excluded.status
+                         OR presencas.setor  IS NOT excluded.setor
+                         OR presencas.turno  IS NOT excluded.turno
+                    RETURNING updated_at IS NULL
+                    """,
+                    self._p(r) + [leader_nome],
+                ).fetchone()
+                if row is None:
+                    res["inalterados"] += 1
+                elif row[0]:
+                    res["inseridos"] += 1
+                else:
+                    res["atualizados"] += 1
+        _versoes_dados().marcar(celulas["data"].unique())
+        return res
+
+    def aplicar_periodo(self, colab_ids: List[int], inicio: date, fim: date, status: str,
+                        setor: str, turnos: List[str], leader_nome: str) -> Dict[str, int]:
+        if status not in STATUS_PERIODO:
+            raise ValueError(f"Status {status!r} não é gravado como período.")
+        if fim < inicio:
+            raise ValueError("O fim do período é anterior ao início.")
+        if not colab_ids:
+            return {"inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0}
+        if len(turnos) != len(colab_ids):
+            raise ValueError("'turnos' deve ter um turno por colaborador.")
+        with self._conexao() as cn:
+            try:
+                cn.executemany(
+                    "INSERT INTO presencas_periodos (colaborador_id, inicio, fim, status, setor, turno, leader_nome) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._p([cid, inicio, fim, status, setor, turno, leader_nome])
+                     for cid, turno in zip(colab_ids, turnos)],
+                )
+            except sqlite3.IntegrityError as e:
+                if "periodo_sobreposto" in str(e):
+                    raise ValueError(ERRO_PERIODO_SOBREPOSTO) from e
+                raise
+            removidos = cn.execute(
+                "DELETE FROM presencas WHERE colaborador_id IN (SELECT value FROM json_each(?)) "
+                "AND data BETWEEN ? AND ? AND status = ?",
+                [self._ids(colab_ids)] + self._p([inicio, fim, status]),
+            ).rowcount
+        _versoes_dados().marcar(datas_do_periodo(inicio, fim))
+        return {"inseridos": len(colab_ids), "atualizados": 0, "removidos": removidos, "inalterados": 0}
+
+    def listar_periodos_colaboradores(self, colab_ids: List[int], inicio: date, fim: date) -> pd.DataFrame:
+        if not colab_ids:
+            return pd.DataFrame(columns=["id", "colaborador_id", "inicio", "fim", "status"])
+        with self._conexao() as cn:
+            df = pd.read_sql(
+                """
+                SELECT id, colaborador_id, inicio, fim, status
+                  FROM presencas_periodos
+                 WHERE colaborador_id IN (SELECT value FROM json_each(?)) AND inicio <= ? AND fim >= ?
+                 ORDER BY colaborador_id, inicio
+                """,
+                cn,
+                params=[self._ids(colab_ids)] + self._p([fim, inicio]),
+            )
+        return self._datas(df, "inicio", "fim")
+
+    def remover_periodos(self, periodo_ids: List[int]) -> int:
+        if not periodo_ids:
+            return 0
+        with self._conexao() as cn:
+            intervalos = cn.execute(
+                "DELETE FROM presencas_periodos WHERE id IN (SELECT value FROM json_each(?)) RETURNING inicio, fim",
+                (self._ids(periodo_ids),),
+            ).fetchall()
+        for inicio, fim in intervalos:
+            _versoes_dados().marcar(datas_do_periodo(date.fromisoformat(inicio), date.fromisoformat(fim)))
+        return len(intervalos)
+
+    # --- relatórios e exportação -----------------------------------------------
+    def versao_dados(self, inicio: date, fim: date) -> Tuple[int, int]:
+        # sem feed de alterações: o carimbo do processo basta, o arquivo é de um processo só
+        return _versoes_dados().versao(inicio, fim), 0
+
+    def contar_relatorio(self, dt_ini: date, dt_fim: date, setor: str | None = None,
+                         turno: str | None = None) -> int:
+        where, params = _filtros_relatorio(dt_ini, dt_fim, setor, turno)
+        with self._conexao() as cn:
+            return int(cn.execute(
+                RESOLVIDAS_SQLITE + f"SELECT count(*) FROM p WHERE {self._sql(where)}",
+                self._p([dt_ini, dt_fim, dt_ini, dt_fim] + params),
+            ).fetchone()[0])
+
+    def relatorio_pagina(self, dt_ini: date, dt_fim: date, setor: str | None = None, turno: str | None = None,
+                         apos: Tuple | None = None, tamanho: int = 100) -> Tuple[pd.DataFrame, Tuple | None]:
+        where, params = _filtros_relatorio(dt_ini, dt_fim, setor, turno)
+        if apos is not None:
+            where += " AND (p.setor, p.turno, c.nome, p.colaborador_id, p.data) > (%s, %s, %s, %s, %s)"
+            params += list(apos)
+        with self._conexao() as cn:
+            df = pd.read_sql(
+                RESOLVIDAS_SQLITE + f"""
+                SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome,
+                       p.colaborador_id
+                  FROM p JOIN colaboradores c ON c.id = p.colaborador_id
+                 WHERE {self._sql(where)}
+                 ORDER BY p.setor, p.turno, c.nome, p.colaborador_id, p.data
+                 LIMIT ?
+                """,
+                cn,
+                params=self._p([dt_ini, dt_fim, dt_ini, dt_fim] + params + [int(tamanho) + 1]),
+            )
+        df = self._datas(df, "data")
+        proxima = None
+        if len(df) > tamanho:
+            df = df.iloc[:tamanho]
+            u = df.iloc[-1]
+            proxima = (u["setor"], u["turno"], u["colaborador"], int(u["colaborador_id"]), u["data"])
+        return df[COLUNAS_RELATORIO], proxima
+
+    def carregar_resumo(self, dt_ini: date, dt_fim: date, setor: str | None = None,
+                        turno: str | None = None) -> pd.DataFrame:
+        # sem tabela de resumo: agrega direto das presenças resolvidas
+        where, params = _filtros_relatorio(dt_ini, dt_fim, setor, turno)
+        with self._conexao() as cn:
+            df = pd.read_sql(
+                RESOLVIDAS_SQLITE + f"""
+                SELECT data, setor, turno, status, count(*) AS qtd
+                  FROM p
+                 WHERE {self._sql(where)}
+                 GROUP BY data, setor, turno, status
+                 ORDER BY data, setor, turno, status
+                """,
+                cn,
+                params=self._p([dt_ini, dt_fim, dt_ini, dt_fim] + params),
+            )
+        return self._datas(df, "data")
+
+    def iterar_blocos_presencas(self, inicio: date, fim: date, where: str = "true", params=(),
+                                ordem: str = "p.setor, p.turno, c.nome, p.colaborador_id, p.data",
+                                tamanho: int = TAMANHO_BLOCO_EXPORTACAO):
+        with self._conexao() as cn:
+            cur = cn.execute(
+                RESOLVIDAS_SQLITE + f"""
+                SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome
+                  FROM p JOIN colaboradores c ON c.id = p.colaborador_id
+                 WHERE {self._sql(where)}
+                 ORDER BY {ordem}
+                """,
+                self._p([inicio, fim, inicio, fim] + list(params)),
+            )
+            while True:
+                linhas = cur.fetchmany(tamanho)
+                if not linhas:
+                    break
+                yield [(r[0], date.fromisoformat(r[1])) + tuple(r[2:]) for r in linhas]
 
 # ------------------------------
 # Página de Lançamento Diário
@@ -1024,70 +4395,69 @@ def pagina_lancamento_diario():
         else:
             nome_preenchedor = st.text_input("Seu nome (opcional)", key="lan_nome")
 
-    if turno_sel == "Todos":
-        df_cols = listar_colaboradores_por_setor(setor, somente_ativos=True)
-    else:
-        df_cols = listar_colaboradores_setor_turno(setor, turno_sel, somente_ativos=True)
-
-    mask_terceiro = df_cols["nome"].str.contains(r"-\s*terceiro\s*$", case=False, na=False)
+    with fase("colaboradores"):
+        if turno_sel == "Todos":
+            df_cols = listar_colaboradores_por_setor(setor, somente_ativos=True)
+        else:
+            df_cols = listar_colaboradores_setor_turno(setor, turno_sel, somente_ativos=True)
 
-    escolha = set(filtro_st)
-    if escolha == {"SOMA"}:
-        df_cols = df_cols[~mask_terceiro]
-    elif escolha == {"TERCEIROS"}:
-        df_cols = df_cols[mask_terceiro]
-    else:
-        pass
+    with fase("filtro terceiros"):
+        df_cols = filtrar_terceiros(df_cols, filtro_st)
 
     if len(df_cols) == 0:
         st.warning("Nenhum colaborador cadastrado para este filtro.")
         st.stop()
 
     iso = data_dia.isoformat()
-    base = pd.DataFrame(
-        {
-            "Colaborador": df_cols["nome"].tolist(),
-            "Setor": df_cols["setor"].tolist(),
-            "Turno": df_cols["turno"].tolist(),
-            iso: ""
-        },
-        dtype="object"
-    )
-
-    pres = carregar_presencas(df_cols["id"].tolist(), data_dia, data_dia)
+    with fase("presenças do dia"):
+        pres = presencas_do_dia(setor, df_cols["id"].tolist(), data_dia)
     mapa = dict(zip(df_cols["nome"], df_cols["id"]))
-    base = aplicar_status_existentes(base, pres, mapa)
-
-    cfg = {
-        "Colaborador": st.column_config.TextColumn("Colaborador", disabled=True),
-        "Setor": st.column_config.TextColumn("Setor", disabled=True),
-        "Turno": st.column_config.TextColumn("Turno", disabled=True),
-        iso: st.column_config.SelectboxColumn(
-            label=data_dia.strftime("%d/%m"),
-            options=STATUS_OPCOES,
-            required=False,
-        ),
-    }
+    with fase("aplicar status"):
+        # o índice (oculto no editor) é o id do colaborador: nomes repetidos não colidem
+        base = MatrizPresencas.de_dict(df_cols["id"], data_dia, data_dia, pres).para_grade(df_cols)
+
+    with fase("column_config"):
+        cfg = {
+            "Colaborador": st.column_config.TextColumn("Colaborador", disabled=True),
+            "Setor": st.column_config.TextColumn("Setor", disabled=True),
+            "Turno": st.column_config.TextColumn("Turno", disabled=True),
+            iso: st.column_config.SelectboxColumn(
+                label=data_dia.strftime("%d/%m"),
+                options=STATUS_OPCOES,
+                required=False,
+            ),
+        }
 
     st.markdown("#### Tabela do dia")
     editor_key = f"editor_dia_{iso}_{setor}_{turno_sel}_{'-'.join(sorted(filtro_st) or ['TODOS'])}"
-    editado = st.data_editor(
-        base,
-        use_container_width=True,
-        hide_index=True,
-        num_rows="dynamic",
-        column_config=cfg,
-        key=editor_key,
-    )
+    with fase("data_editor"):
+        editado = st.data_editor(
+            base,
+            use_container_width=True,
+            hide_index=True,
+            num_rows="dynamic",
+            column_config=cfg,
+            key=editor_key,
+        )
 
-    # Quem já estava salvo como FÉRIAS no banco para este dia
-    ja_em_ferias = {nome for nome, cid in mapa.items() if pres.get((cid, iso)) == "FÉRIAS"}
+    # Diferença entre o editor e o que está salvo: só essas células vão para o banco
+    turno_gravacao = turno_sel if turno_sel != "Todos" else "-"
+    with fase("células alteradas"):
+        alteradas = celulas_alteradas(
+            _grade_para_celulas(editado, mapa, setor, turno_gravacao, ids=editado.index), pres
+        )
 
-    # Quem está marcado como FÉRIAS no editor agora
-    marcados_no_editor = editado.loc[editado[iso] == "FÉRIAS", "Colaborador"].tolist()
+    # Aplique somente para os RECÉM marcados como FÉRIAS (exclui quem já estava de férias)
+    nome_por_id = dict(zip(df_cols["id"], df_cols["nome"]))
+    recem_marcados = [
+        int(cid) for cid in alteradas.loc[alteradas["status"] == "FÉRIAS", "colaborador_id"]
+    ]
 
-    # Aplique somente para os RECÉM marcados (exclui quem já estava de férias)
-    recem_marcados = [n for n in marcados_no_editor if n not in ja_em_ferias]
+    ferias_rodando = acompanhar_job(
+        "job_ferias", "ferias",
+        lambda r: f"FÉRIAS aplicadas no período para {r['inseridos']} colaborador(es).",
+        ao_concluir=invalidar_cache_periodo,
+    )
 
     if recem_marcados:
         with st.expander("Aplicar FÉRIAS para um período", expanded=True):
@@ -1095,7 +4465,7 @@ def pagina_lancamento_diario():
             "Você marcou FÉRIAS em "
             + data_dia.strftime("%d/%m/%Y")
             + " para: "
-            + ", ".join(recem_marcados)
+            + ", ".join(nome_por_id[cid] for cid in recem_marcados)
         )
 
         ini_periodo_atual, fim_periodo_atual = periodo_por_data(data_dia)
@@ -1123,6 +4493,7 @@ def pagina_lancamento_diario():
             "Aplicar para:",
             options=recem_marcados,
             default=recem_marcados,
+            format_func=nome_por_id.get,
             key=f"sele_ferias_{editor_key}",
         )
 
@@ -1130,62 +4501,112 @@ def pagina_lancamento_diario():
             "Aplicar FÉRIAS no período para os colaboradores selecionados",
             type="primary",
             key=f"btn_aplicar_ferias_{editor_key}",
+            disabled=ferias_rodando,
         ):
-            aplicar_status_em_periodo(
-                nomes_colaboradores=selecionados,
+            st.session_state["job_ferias"] = _executor_jobs().submeter(
+                "ferias", st.session_state.get("user_email", ""),
+                aplicar_status_em_periodo,
+                colab_ids=selecionados,
                 df_cols=df_cols,
-                mapa_id_por_nome=mapa,
                 inicio=ferias_ini,
                 fim=ferias_fim,
                 status="FÉRIAS",
                 setor=setor,
-                turno_selecao=(turno_sel if turno_sel != "Todos" else "-"),
+                turno_selecao=turno_gravacao,
                 leader_nome=nome_preenchedor,
             )
-            st.success("FÉRIAS aplicadas no período selecionado!")
             st.rerun()
 
 
-    if st.button("Salvar dia"):
-        salvar_presencas(
-            editado,
-            mapa,
-            data_dia,
-            data_dia,
-            setor,
-            turno=(turno_sel if turno_sel != "Todos" else "-"),
-            leader_nome=nome_preenchedor or "",
-        )
-        st.success("Registros salvos/atualizados!")
-        st.session_state.pop(editor_key, None)
-        st.rerun()
+    with fase("afastamentos do dia"):
+        periodos = afastamentos_do_periodo(setor, df_cols["id"].tolist(), data_dia, data_dia)
+    if not periodos.empty:
+        with st.expander(f"Férias/afastamentos neste dia ({len(periodos)})", expanded=False):
+            periodos = periodos.assign(colaborador=periodos["colaborador_id"].map(nome_por_id))
+            st.dataframe(periodos[["colaborador", "status", "inicio", "fim"]],
+                         use_container_width=True, hide_index=True)
+            rotulos = {
+                int(r.id): f"{r.colaborador} — {r.status} de {r.inicio:%d/%m/%Y} a {r.fim:%d/%m/%Y}"
+                for r in periodos.itertuples()
+            }
+            remover = st.multiselect("Remover períodos", options=list(rotulos), format_func=rotulos.get,
+                                     key=f"rm_periodos_{editor_key}")
+            if remover and st.button("Remover selecionados", key=f"btn_rm_periodos_{editor_key}"):
+                remover_periodos(remover)
+                invalidar_cache_periodo()
+                st.rerun()
 
-    with st.expander("Exportar CSV do dia", expanded=False):
-        df = pd.read_sql(
-            """
-            SELECT c.nome AS colaborador, p.data, p.status, p.setor, p.turno, p.leader_nome
-              FROM public.presencas p JOIN public.colaboradores c ON c.id = p.colaborador_id
-             WHERE p.setor = %s AND p.data = %s
-             ORDER BY colaborador
-            """,
-            get_conn(),
-            params=(setor, iso),
-        )
-        if df.empty:
-            st.info("Sem dados salvos para esse dia.")
+    if alteradas.empty:
+        st.caption("Nenhuma alteração pendente.")
+    else:
+        st.caption(f"{len(alteradas)} célula(s) serão gravadas ao salvar.")
+        avisar_recortes(alteradas, nome_por_id)
+
+    if st.button("Salvar dia", disabled=alteradas.empty):
+        fila = _fila_gravacoes()
+        if fila is not None:
+            n = fila.enfileirar(alteradas, nome_preenchedor or "")
+            registrar_no_cache_periodo(setor, data_dia, alteradas)
+            st.success(f"{n} alteração(ões) salvas no servidor do app; o envio ao banco é automático.")
         else:
-            csv = df.to_csv(index=False).encode("utf-8-sig")
-            st.download_button(
-                "Baixar CSV",
-                data=csv,
-                file_name=f"presencas_{setor}_{iso}.csv",
-                mime="text/csv",
+            try:
+                res = salvar_celulas(alteradas, leader_nome=nome_preenchedor or "")
+            except Exception as e:
+                # uma transação só: nada foi gravado e a grade continua como estava
+                st.error(f"Não foi possível salvar (nada foi gravado). Tente de novo. Detalhe: {e}")
+                st.stop()
+            atualizar_cache_periodo(setor, data_dia, alteradas)
+            st.success(
+                f"Registros salvos/atualizados! {res['inseridos']} novos, {res['atualizados']} alterados, "
+                f"{res['removidos']} removidos."
             )
+        st.session_state.pop(editor_key, None)
+        st.session_state.pop("csv_dia_pedido", None)  # o CSV gerado antes não vale mais
+        st.rerun()
+
+    with fase("exportação do dia"), st.expander("Exportar CSV do dia", expanded=False):
+        # só consulta quando pedido: a versão (ida ao banco) é lida no clique, e o
+        # arquivo fica em cache até o dia ser gravado de novo
+        chave = st.session_state.get("csv_dia_pedido")
+        if chave is None or chave[:2] != (setor, data_dia):
+            chave = None
+        if st.button("Gerar CSV do dia" if chave is None else "Gerar de novo", key="btn_csv_dia"):
+            st.session_state["csv_dia_pedido"] = (setor, data_dia, versao_dados(data_dia, data_dia))
+            st.rerun()
+        if chave is not None:
+            payload, n = csv_do_dia(*chave)
+            if n == 0:
+                st.info("Sem dados salvos para esse dia.")
+            else:
+                st.download_button(
+                    "Baixar CSV",
+                    data=payload,
+                    file_name=f"presencas_{setor}_{iso}.csv",
+                    mime="text/csv",
+                )
 
 # ------------------------------
 # Página de Configuração do DB
 # ------------------------------
+def _pagina_db_sqlite():
+    st.markdown("### Armazenamento embutido (SQLite)")
+    caminho = os.path.abspath(ARQUIVO_SQLITE)
+    st.text_input("Arquivo (ARMAZENAMENTO_SQLITE)", value=caminho, disabled=True)
+    m1, m2 = st.columns(2)
+    m1.metric("Tamanho (MiB)", f"{os.path.getsize(caminho) / 2**20:.1f}" if os.path.exists(caminho) else "—")
+    cache = _cache_colaboradores().estatisticas()
+    m2.metric("Cache de colaboradores (acertos)", f"{cache['taxa_acerto']:.0%}")
+    st.dataframe(_armazenamento_sqlite().contagens(), use_container_width=True, hide_index=True)
+    st.caption(
+        "Modo offline (ARMAZENAMENTO=sqlite). Pool de conexões, migrações, planos de consulta, "
+        "tabela de resumo e feed de alterações existem só no Postgres."
+    )
+
+
 def pagina_db():
+    if embutido():
+        _pagina_db_sqlite()
+        return
     st.markdown("### Configuração do Banco (Postgres/Supabase)")
     cfg = get_config()
     col1, col2 = st.columns(2)
@@ -1208,69 +4629,338 @@ def pagina_db():
         except Exception as e:
             st.error(f"Falha ao conectar: {e}")
 
+    st.markdown("#### Pool de conexões")
+    stats = _pool().estatisticas()
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Em uso", f"{stats['em_uso']} / {stats['maximo']}")
+    m2.metric("Ociosas", stats["livres"])
+    m3.metric("Esperas por conexão", stats["esperas"])
+    m4.metric("Checkouts", stats["checkouts"])
+    m5, m6, m7, m8 = st.columns(4)
+    m5.metric("Checkout médio (ms)", f"{stats['checkout_medio_ms']:.1f}")
+    m6.metric("Checkout p95 (ms)", f"{stats['checkout_p95_ms']:.1f}")
+    m7.metric("Checkout máx. (ms)", f"{stats['checkout_max_ms']:.1f}")
+    m8.metric("Descartadas", stats["descartadas"])
+    st.caption(
+        "Ajuste via get_config(): POOL_MIN, POOL_MAX, POOL_IDLE_TIMEOUT (s), "
+        "POOL_HEALTH_CHECK (s de ociosidade antes do SELECT 1) e POOL_TIMEOUT (s)."
+    )
+    if st.button("Fechar conexões ociosas"):
+        _pool().fechar_tudo()
+        st.rerun()
+
+    fila = _fila_gravacoes()
+    if fila is not None:
+        st.markdown("#### Fila offline (FILA_OFFLINE)")
+        f1, f2, f3, f4 = st.columns(4)
+        f1.metric("Pendentes", fila.contar())
+        f2.metric("Enviadas (processo)", fila.enviadas)
+        f3.metric("Falhas seguidas", fila.falhas)
+        f4.metric("Último envio", f"{fila.ultimo_envio:%H:%M:%S}" if fila.ultimo_envio is not None else "—")
+        st.caption(f"Dispositivo {fila.dispositivo} · diário local em {os.path.abspath(fila.caminho)}")
+        if fila.ultimo_erro:
+            st.error(f"Última falha de envio: {fila.ultimo_erro}")
+        if st.button("Sincronizar agora"):
+            fila.sincronizar_agora()
+            st.rerun()
+        rejeitadas = fila.rejeitadas()
+        if not rejeitadas.empty:
+            st.warning(f"{len(rejeitadas)} alteração(ões) recusadas pelo banco; as demais seguiram normalmente.")
+            st.dataframe(rejeitadas, use_container_width=True, hide_index=True)
+            r1, r2 = st.columns(2)
+            if r1.button("Reenviar recusadas"):
+                fila.reenfileirar_rejeitadas()
+                st.rerun()
+            if r2.button("Descartar recusadas"):
+                fila.descartar_rejeitadas()
+                st.rerun()
+
+    st.markdown("#### Migrações de schema")
+    st.dataframe(listar_migracoes(), use_container_width=True, hide_index=True)
+
+    st.markdown("#### Planos das consultas quentes")
+    if st.button("Verificar planos (EXPLAIN)"):
+        planos = verificar_planos()
+        st.dataframe(planos, use_container_width=True, hide_index=True)
+        if (planos["situacao"] != "OK").any():
+            st.warning("Há consultas com Seq Scan; veja a coluna 'situacao'.")
+        else:
+            st.success("Todas as consultas quentes usam índice.")
+
+    st.markdown("#### Resumo de presenças")
+    st.caption("Tabela presencas_resumo (data × setor × turno × status), mantida por trigger a cada gravação.")
+    r1, r2, r3 = st.columns([1, 1, 1])
+    with r1:
+        rs_ini = st.date_input("Reconstruir de", value=None, key="resumo_ini", format="DD/MM/YYYY")
+    with r2:
+        rs_fim = st.date_input("até", value=None, key="resumo_fim", format="DD/MM/YYYY")
+    with r3:
+        st.write("")
+        if st.button("Reconstruir resumo"):
+            n = reconstruir_resumo(rs_ini, rs_fim)
+            st.success(f"Resumo reconstruído ({n} linhas).")
+
+    st.markdown("#### Feed de alterações")
+    st.caption(
+        "Inserções, alterações e exclusões de presenças e períodos, para sincronizar "
+        "só o delta. Guarde a próxima marca e use-a na próxima extração."
+    )
+    a1, a2 = st.columns([1, 1])
+    with a1:
+        marca = st.number_input("Marca d'água (0 = tudo)", min_value=0, value=0, step=1, key="feed_marca")
+        if st.button("Extrair alterações"):
+            df_alt, proxima = alteracoes_desde(int(marca))
+            st.caption(f"{len(df_alt)} alteração(ões). Próxima marca: {proxima}")
+            st.download_button(
+                "Baixar CSV de alterações",
+                data=df_alt.to_csv(index=False).encode("utf-8-sig"),
+                file_name=f"presencas_alteracoes_{int(marca)}_{proxima}.csv",
+                mime="text/csv",
+            )
+    with a2:
+        manter = st.number_input("Manter (dias)", min_value=1, value=90, step=1, key="feed_manter")
+        if st.button("Podar feed"):
+            st.success(f"{podar_alteracoes(int(manter))} alteração(ões) antigas removidas.")
+
+    st.markdown("#### Tarefas em segundo plano")
+    st.caption(f"{JOBS_WORKERS} worker(s) por processo (variável JOBS_WORKERS).")
+    st.dataframe(_executor_jobs().listar(), use_container_width=True, hide_index=True)
+
+    st.markdown("#### Cache de colaboradores")
+    cstats = _cache_colaboradores().estatisticas()
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Hits", cstats["hits"])
+    c2.metric("Misses", cstats["misses"])
+    c3.metric("Taxa de acerto", f"{cstats['taxa_acerto']:.0%}")
+    c4.metric("Entradas", cstats["entradas"])
+    c5.metric("Invalidações", cstats["invalidacoes"])
+    st.caption(f"TTL: {CACHE_COLABORADORES_TTL:.0f}s (variável CACHE_COLABORADORES_TTL).")
+    if st.button("Limpar cache de colaboradores"):
+        _cache_colaboradores().limpar()
+        st.rerun()
+
 # ------------------------------
-# Roteamento (com login)
+# Perfil de fases por rerun
 # ------------------------------
-if not st.session_state.get("auth", False):
-    show_login()
+# Com o perfil ligado (variável PERFIL_FASES=1 ou o toggle do Admin), cada
+# bloco "with fase(...)" da página registra início/fim e a barra lateral
+# mostra a cascata do rerun. O cProfile é opcional e vale para um rerun só.
+PERFIL_FASES_PADRAO = os.getenv("PERFIL_FASES", "").lower() in ("1", "true", "sim")
 
-if not st.session_state.get("seed_loaded", False):
-    # _try_auto_import_seed()  # opcional
-    st.session_state["seed_loaded"] = True
 
-# >>> ADICIONE ESTE BLOCO <<<
-if not st.session_state.get("db_inited"):
+@contextmanager
+def fase(nome: str):
+    fases = st.session_state.get("_fases")
+    if fases is None:  # perfil desligado
+        yield
+        return
+    t = time.perf_counter()
     try:
-        init_db()  # cria tabelas se não existirem; só roda depois do login
-        st.session_state["db_inited"] = True
-    except Exception as e:
-        st.error("Falha ao inicializar/abrir o banco. Verifique os Secrets (PGHOST/PGUSER/PGPASSWORD).")
-        st.caption(str(e))
-        st.stop()
+        yield
+    finally:
+        fases.append((nome, t, time.perf_counter()))
 
-st.sidebar.title("Menu")
-st.sidebar.caption(f"Usuário: {st.session_state.get('user_email','')}")
-if st.sidebar.button("Sair"):
-    for k in ("auth", "user_email"):
-        st.session_state.pop(k, None)
-    st.rerun()
-
-nav_opts = ["Lançamento diário"] + (["Colaboradores"] if is_admin() else []) + ["Relatórios"] + (["DB"] if is_admin() else [])
-escolha = st.sidebar.radio("Navegação", nav_opts, index=0)
-
-if is_admin():
-    with st.sidebar.expander("⚙️ Admin"):
-        coladm1, coladm2 = st.columns([1,1])
-        if coladm1.button("Carregar lista inicial de colaboradores"):
-            seed_colaboradores_iniciais(turno_default="1°")
-            st.success("Seed aplicado (somente adiciona quem não existe).")
-
-        up = st.file_uploader("Importar turnos (xlsx/csv)", type=["xlsx", "xls", "csv"], key="up_turnos")
-        setor_default = st.selectbox("Se o CSV não tiver coluna SETOR, aplicar a:",
-                                     ["(obrigatório se CSV sem SETOR)"] + OPCOES_SETORES, index=0)
-        if st.button("Aplicar turnos do arquivo"):
-            if up is None:
-                st.warning("Selecione um arquivo .xlsx ou .csv")
-            else:
-                try:
-                    n = importar_turnos_de_arquivo(up, setor_padrao=None if str(setor_default).startswith("(") else setor_default)
-                    st.success(f"Turnos aplicados/atualizados para {n} colaboradores.")
-                except Exception as e:
-                    st.error(f"Erro ao importar: {e}")
-
-if escolha == "Lançamento diário":
-    pagina_lancamento_diario()
-elif escolha == "Colaboradores":
-    if not is_admin():
-        st.error("Acesso restrito aos administradores.")
-        st.stop()
-    pagina_colaboradores()
-elif escolha == "Relatórios":
-    pagina_relatorios_globais()
-elif escolha == "DB":
-    if not is_admin():
-        st.error("Acesso restrito aos administradores.")
-        st.stop()
-    pagina_db()
+
+@contextmanager
+def perfil_do_rerun():
+    """Envolve um rerun inteiro: coleta as fases e, se pedido, um cProfile do rerun."""
+    cprof = None
+    if st.session_state.pop("cprofile_proximo", False):
+        import cProfile
+        cprof = cProfile.Profile()
+    if st.session_state.get("perfil_fases", PERFIL_FASES_PADRAO):
+        st.session_state["_fases"] = []
+    else:
+        st.session_state.pop("_fases", None)
+        st.session_state.pop("ultimo_perfil", None)
+    t0 = time.perf_counter()
+    if cprof is not None:
+        cprof.enable()
+    concluido = False
+    try:
+        yield
+        concluido = True
+    finally:
+        total = time.perf_counter() - t0
+        if cprof is not None:
+            cprof.disable()
+            # um arquivo por sessão: o cProfile seguinte sobrescreve o anterior
+            caminho = st.session_state.get("cprofile_arquivo") or arquivo_temporario(PREFIXO_PROF, ".prof")
+            cprof.dump_stats(caminho)
+            st.session_state["cprofile_arquivo"] = caminho
+        fases = st.session_state.pop("_fases", None)
+        if fases is not None:
+            st.session_state["ultimo_perfil"] = pd.DataFrame(
+                [(nome, (a - t0) * 1000, (b - t0) * 1000) for nome, a, b in fases]
+                + [("rerun (total)", 0.0, total * 1000)],
+                columns=["fase", "inicio_ms", "fim_ms"],
+            )
+    if concluido:
+        _mostrar_perfil()
+
+
+def _mostrar_perfil():
+    perfil = st.session_state.get("ultimo_perfil")
+    caminho = st.session_state.get("cprofile_arquivo")
+    if caminho and not os.path.exists(caminho):  # descartado ou varrido por idade
+        st.session_state.pop("cprofile_arquivo", None)
+        caminho = None
+    if perfil is None and caminho is None:
+        return
+    with st.sidebar.expander("⏱️ Perfil do rerun", expanded=True):
+        if perfil is not None:
+            import altair as alt
+
+            perfil = perfil.assign(duracao_ms=perfil["fim_ms"] - perfil["inicio_ms"])
+            st.altair_chart(
+                alt.Chart(perfil).mark_bar().encode(
+                    x=alt.X("inicio_ms:Q", title="ms desde o início do rerun"),
+                    x2="fim_ms:Q",
+                    y=alt.Y("fase:N", sort=perfil["fase"].tolist(), title=None),
+                    tooltip=["fase", alt.Tooltip("duracao_ms:Q", format=".1f")],
+                ),
+                use_container_width=True,
+            )
+            st.dataframe(perfil[["fase", "duracao_ms"]].round(1), hide_index=True, use_container_width=True)
+        if caminho and os.path.exists(caminho):
+            import pstats
+
+            texto = io.StringIO()
+            pstats.Stats(caminho, stream=texto).sort_stats("cumulative").print_stats(15)
+            st.caption(f"cProfile salvo em {caminho}")
+            st.code(texto.getvalue()[-4000:], language="text")
+            with open(caminho, "rb") as f:
+                st.download_button("Baixar .prof", data=f.read(), file_name="cadastro_hc.prof")
+            if st.button("Descartar cProfile", key="btn_descartar_prof"):
+                os.remove(caminho)
+                st.session_state.pop("cprofile_arquivo", None)
+                st.rerun()
+
+# ------------------------------
+# Página de desempenho (admin)
+# ------------------------------
+def pagina_perf():
+    st.markdown("### Desempenho da camada de dados")
+    registro = _registro_perf()
+    st.caption(
+        f"Últimas {TAMANHO_BUFFER_PERF} chamadas deste processo (variável PERF_BUFFER). "
+        f"Chamadas acima de {LIMIAR_LENTA_MS:.0f} ms (LIMIAR_CONSULTA_LENTA_MS) vão para o log "
+        "'cadastro_hc.perf' com os parâmetros mascarados."
+    )
+    st.dataframe(registro.percentis(), use_container_width=True, hide_index=True)
+
+    itens = registro.itens()
+    lentas = itens[itens["lenta"]]
+    st.markdown(f"#### Chamadas lentas ({len(lentas)})")
+    if not lentas.empty:
+        st.dataframe(lentas.sort_values("quando", ascending=False),
+                     use_container_width=True, hide_index=True)
+    if st.button("Limpar medições"):
+        registro.limpar()
+        st.rerun()
+
+# ------------------------------
+# Roteamento (com login)
+# ------------------------------
+def main():
+    _varredura_inicial()
+    if not st.session_state.get("auth", False):
+        show_login()
+
+    if not st.session_state.get("seed_loaded", False):
+        # _try_auto_import_seed()  # opcional
+        st.session_state["seed_loaded"] = True
+
+    # >>> ADICIONE ESTE BLOCO <<<
+    if not st.session_state.get("db_inited"):
+        try:
+            init_db()  # cria tabelas se não existirem; só roda depois do login
+            st.session_state["db_inited"] = True
+        except Exception as e:
+            st.error("Falha ao inicializar/abrir o banco. Verifique os Secrets (PGHOST/PGUSER/PGPASSWORD).")
+            st.caption(str(e))
+            st.stop()
+
+    st.sidebar.title("Menu")
+    st.sidebar.caption(f"Usuário: {st.session_state.get('user_email','')}")
+    if _fila_gravacoes() is not None:
+        with st.sidebar:
+            _status_sincronizacao()
+    if st.sidebar.button("Sair"):
+        for k in ("auth", "user_email"):
+            st.session_state.pop(k, None)
+        st.rerun()
+
+    nav_opts = ["Lançamento diário", "Período"] + (["Colaboradores"] if is_admin() else []) + ["Relatórios"] + (["DB", "Perf"] if is_admin() else [])
+    escolha = st.sidebar.radio("Navegação", nav_opts, index=0)
+
+    if is_admin():
+        with st.sidebar.expander("⚙️ Admin"):
+            usuario = st.session_state.get("user_email", "")
+            st.toggle("Perfil de fases do rerun", value=PERFIL_FASES_PADRAO, key="perfil_fases")
+            if st.button("cProfile do próximo rerun"):
+                st.session_state["cprofile_proximo"] = True
+                st.rerun()
+            coladm1, coladm2 = st.columns([1,1])
+            seed_rodando = acompanhar_job(
+                "job_seed", "seed_colaboradores",
+                lambda n: f"Seed aplicado: {n} colaboradores adicionados (somente quem não existia).",
+            )
+            if coladm1.button("Carregar lista inicial de colaboradores", disabled=seed_rodando):
+                st.session_state["job_seed"] = _executor_jobs().submeter(
+                    "seed_colaboradores", usuario, seed_colaboradores_iniciais, turno_default="1°"
+                )
+                st.rerun()
+
+            up = st.file_uploader("Importar turnos (xlsx/csv)", type=["xlsx", "xls", "csv"], key="up_turnos")
+            setor_default = st.selectbox("Se o CSV não tiver coluna SETOR, aplicar a:",
+                                         ["(obrigatório se CSV sem SETOR)"] + OPCOES_SETORES, index=0)
+            import_rodando = acompanhar_job(
+                "job_turnos", "importar_turnos",
+                lambda res: (
+                    f"Turnos aplicados: {res['inseridos']} novos, {res['atualizados']} atualizados, "
+                    f"{res['inalterados']} sem mudança, {res['rejeitados']} linhas rejeitadas."
+                ),
+            )
+            if st.button("Aplicar turnos do arquivo", disabled=import_rodando):
+                if up is None:
+                    st.warning("Selecione um arquivo .xlsx ou .csv")
+                else:
+                    # cópia em memória: o UploadedFile não sobrevive ao próximo rerun
+                    arquivo = io.BytesIO(up.getvalue())
+                    arquivo.name = up.name
+                    st.session_state["job_turnos"] = _executor_jobs().submeter(
+                        "importar_turnos", usuario, importar_turnos_de_arquivo, arquivo,
+                        setor_padrao=None if str(setor_default).startswith("(") else setor_default,
+                    )
+                    st.rerun()
+
+    if escolha == "Lançamento diário":
+        pagina_lancamento_diario()
+    elif escolha == "Período":
+        pagina_preenchimento()
+    elif escolha == "Colaboradores":
+        if not is_admin():
+            st.error("Acesso restrito aos administradores.")
+            st.stop()
+        pagina_colaboradores()
+    elif escolha == "Relatórios":
+        pagina_relatorios_globais()
+    elif escolha == "DB":
+        if not is_admin():
+            st.error("Acesso restrito aos administradores.")
+            st.stop()
+        pagina_db()
+    elif escolha == "Perf":
+        if not is_admin():
+            st.error("Acesso restrito aos administradores.")
+            st.stop()
+        pagina_perf()
+
+
+# só roda a interface quando executado pelo streamlit (importável pelos benchmarks em bench/)
+if __name__ == "__main__":
+    with perfil_do_rerun():
+        main()
 
 # Fim do arquivo